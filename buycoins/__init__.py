@@ -1,5 +1,53 @@
-from .client import BuyCoinsClient
-from .ngnt import NGNT
-from .p2p import P2P
-from .wallet import Wallet
-from .webhook import Webhook
+import importlib
+
+# Classes are imported from their submodule on first access, so importing the package doesn't load `requests`,
+# `aiohttp` or `numpy`, or read the `auth_key` setting.
+_exports = {
+    "BuyCoinsClient": "client",
+    "NGNT": "ngnt",
+    "P2P": "p2p",
+    "Quote": "p2p",
+    "Wallet": "wallet",
+    "Webhook": "webhook",
+    "AsyncBuyCoinsClient": "aio",
+    "AsyncNGNT": "aio",
+    "AsyncP2P": "aio",
+    "AsyncWallet": "aio",
+    "AddressPool": "addresses",
+    "Batch": "batch",
+    "BatchResult": "batch",
+    "BalanceCache": "cache",
+    "FeeCache": "cache",
+    "PriceCache": "cache",
+    "MarketBook": "marketbook",
+    "ClientPool": "pool",
+    "PayoutEngine": "payouts",
+    "Provisioner": "provision",
+    "LocalOrderBook": "orderbook",
+    "CircuitBreaker": "retry",
+    "RetryPolicy": "retry",
+    "FileTokenBucket": "ratelimit",
+    "RedisTokenBucket": "ratelimit",
+    "RequestScheduler": "ratelimit",
+    "TokenBucket": "ratelimit",
+}
+
+__all__ = list(_exports)
+
+
+def __getattr__(name):
+    if name in _exports:
+        value = getattr(importlib.import_module("." + _exports[name], __name__), name)
+    else:
+        try:
+            value = importlib.import_module("." + name, __name__)
+        except ModuleNotFoundError as e:
+            if e.name != "{}.{}".format(__name__, name):
+                raise
+            raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name)) from None
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
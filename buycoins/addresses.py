@@ -0,0 +1,227 @@
+import logging
+import sqlite3
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from buycoins import models
+from buycoins.exceptions import WalletError
+from buycoins.wallet import Wallet
+
+DEFAULT_TARGET = 20
+DEFAULT_LOW_WATERMARK = 5
+DEFAULT_BATCH_SIZE = 10
+DEFAULT_MAX_WORKERS = 2
+DEFAULT_RETRY_INTERVAL = 5.0
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS addresses (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        cryptocurrency TEXT NOT NULL,
+        address TEXT NOT NULL UNIQUE
+    )
+"""
+
+
+class AddressPool:
+    """The AddressPool class hands out wallet addresses created ahead of time, so checkout never waits on the API.
+
+    A stock of up to `target` fresh addresses is kept for each currency in a SQLite database, and in memory. `get`
+    takes the oldest address of a currency off its stock and deletes it from the database before returning it, so
+    an address is never handed out twice, even across restarts. When a stock falls to `low_watermark`, `on_low` is
+    called and a background thread refills it, creating addresses `batch_size` at a time as aliased `createAddress`
+    documents, with `max_workers` documents in flight.
+    """
+
+    def __init__(self, wallet: Wallet = None, path: str = None, currencies=None, target: int = DEFAULT_TARGET, low_watermark: int = DEFAULT_LOW_WATERMARK, batch_size: int = DEFAULT_BATCH_SIZE, max_workers: int = DEFAULT_MAX_WORKERS, on_low=None, background: bool = True, retry_interval: float = DEFAULT_RETRY_INTERVAL):
+        """
+
+        Args:
+            wallet (Wallet, optional): Client the addresses are created with. Defaults to a new `Wallet` client.
+            path (str, optional): Path of the SQLite database holding the stock. Defaults to memory only.
+            currencies (list, optional): Currencies stocked. Defaults to `Wallet.supported_cryptocurrencies`.
+            target (int): Number of addresses of each currency a refill stocks up to.
+            low_watermark (int): Stock at or under which a currency is refilled and `on_low` called.
+            batch_size (int): Number of addresses created per request.
+            max_workers (int): Number of requests in flight at once while refilling.
+            on_low (optional): Function called with the currency and its stock when it falls to `low_watermark`.
+            background (bool): Whether stocks are refilled by a background thread. Otherwise call `refill`.
+            retry_interval (float): Seconds the background thread waits after a refill that created no address.
+        """
+        self.wallet = wallet if wallet is not None else Wallet()
+        self.path = path
+        self.currencies = list(currencies or Wallet.supported_cryptocurrencies)
+        self.target = target
+        self.low_watermark = low_watermark
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.on_low = on_low
+        self.background = background
+        self.retry_interval = retry_interval
+        self._counters = dict.fromkeys(("handed_out", "misses", "created", "failed", "refills", "alerts"), 0)
+        self._condition = threading.Condition()
+        self._thread = None
+        self._closed = False
+
+        self._db = sqlite3.connect(path or ":memory:", check_same_thread=False, isolation_level=None)
+        self._db.execute(_SCHEMA)
+        self._stock = {currency: deque() for currency in self.currencies}
+        for currency, address in self._db.execute("SELECT cryptocurrency, address FROM addresses ORDER BY id"):
+            if currency in self._stock:
+                self._stock[currency].append(address)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def start(self):
+        """Starts the background thread, which first stocks every currency up to `target`, and returns the pool."""
+        with self._condition:
+            self._start()
+        return self
+
+    def get(self, currency: str = "bitcoin"):
+        """Hands out a fresh address for `currency`.
+
+        The address comes from the stock when there is one; only an empty stock makes the call wait on
+        `Wallet.create_address`.
+
+        Args:
+            currency (str): The cryptocurrency of the address.
+
+        Returns:
+            response: The address, as returned by `Wallet.create_address`.
+        """
+        if currency not in self._stock:
+            return self.wallet._reject(WalletError("Invalid or unsupported cryptocurrency", 400))
+
+        with self._condition:
+            stock = self._stock[currency]
+            address = stock.popleft() if stock else None
+            if address is not None:
+                self._db.execute("DELETE FROM addresses WHERE address = ?", (address,))
+                self._counters["handed_out"] += 1
+            else:
+                self._counters["misses"] += 1
+            remaining = len(stock)
+            alert = address is None or remaining == self.low_watermark
+            if remaining <= self.low_watermark and self.background:
+                self._start()
+                self._condition.notify_all()
+
+        if alert:
+            self._alert(currency, remaining)
+        if address is None:
+            return self.wallet.create_address(currency)
+        data = {"cryptocurrency": currency, "address": address}
+        return models.parse("createAddress", data) if self.wallet._typed else data
+
+    def stock(self, currency: str = None):
+        """Returns the number of addresses in stock for `currency`, or for each currency when none is given."""
+        with self._condition:
+            if currency is not None:
+                return len(self._stock[currency])
+            return {currency: len(stock) for currency, stock in self._stock.items()}
+
+    def stats(self):
+        """Returns the addresses handed out, the misses served by the API, the addresses created and failed, the
+        refills run, the alerts raised and the stock of each currency."""
+        with self._condition:
+            stats = dict(self._counters)
+        stats["stock"] = self.stock()
+        return stats
+
+    def refill(self, currencies=None, force: bool = False):
+        """Stocks each currency at or under `low_watermark` up to `target`, and returns the number of addresses added.
+
+        Args:
+            currencies (list, optional): Currencies to refill. Defaults to every stocked currency.
+            force (bool): Whether currencies above `low_watermark` are topped up too.
+        """
+        jobs = []
+        with self._condition:
+            for currency in currencies or self.currencies:
+                stocked = len(self._stock[currency])
+                if stocked > self.low_watermark and not force:
+                    continue
+                missing = self.target - stocked
+                while missing > 0:
+                    jobs.append((currency, min(missing, self.batch_size)))
+                    missing -= self.batch_size
+            if jobs:
+                self._counters["refills"] += 1
+        if not jobs:
+            return 0
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="buycoins-addresses") as executor:
+            return sum(executor.map(lambda job: self._create(*job), jobs))
+
+    def close(self):
+        """Stops the background thread and closes the database."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._db.close()
+
+    def _create(self, currency: str, count: int):
+        try:
+            with self.wallet.batch() as batch:
+                results = [batch.wallet.create_address(currency) for _ in range(count)]
+        except Exception:
+            logger.exception("Creating %s addresses failed", currency)
+            with self._condition:
+                self._counters["failed"] += count
+            return 0
+
+        addresses, failed = [], 0
+        for result in results:
+            response = result.result()
+            address = response.address if isinstance(response, models.Address) else (response or {}).get("address")
+            if address:
+                addresses.append(address)
+            else:
+                failed += 1
+                logger.warning("Creating a %s address failed: %s", currency, response)
+
+        with self._condition:
+            if not self._closed:
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO addresses (cryptocurrency, address) VALUES (?, ?)",
+                    [(currency, address) for address in addresses],
+                )
+                self._stock[currency].extend(addresses)
+            self._counters["created"] += len(addresses)
+            self._counters["failed"] += failed
+        return len(addresses)
+
+    def _alert(self, currency: str, remaining: int):
+        with self._condition:
+            self._counters["alerts"] += 1
+        logger.warning("Only %d %s addresses left in stock", remaining, currency)
+        if self.on_low is not None:
+            self.on_low(currency, remaining)
+
+    def _start(self):
+        if self._thread is None and not self._closed:
+            self._thread = threading.Thread(target=self._run, name="buycoins-address-pool", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        added = self.refill(force=True)
+        while True:
+            with self._condition:
+                if not added and not self._closed:
+                    # Don't hammer the API while it fails; stocks that stay low are retried after a pause.
+                    self._condition.wait(self.retry_interval)
+                while not self._closed and all(len(stock) > self.low_watermark for stock in self._stock.values()):
+                    self._condition.wait()
+                if self._closed:
+                    return
+            added = self.refill()
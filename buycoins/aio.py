@@ -0,0 +1,269 @@
+import asyncio
+import base64
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+from buycoins import client, queries
+from buycoins.client import BuyCoinsClient, DEFAULT_POOL_SIZE
+from buycoins.codec import get_codec
+from buycoins.exceptions import P2PError, QueryError, WalletError
+from buycoins.exceptions.utils import check_response, connection_error, status_error
+from buycoins.models import Order
+from buycoins.ngnt import NGNT
+from buycoins.ratelimit import classify
+from buycoins.p2p import P2P, Quote
+from buycoins.wallet import Wallet
+
+DEFAULT_MAX_CONCURRENCY = 100
+
+_pools = {}
+
+
+class _Pool:
+    """An aiohttp session and in-flight request limit shared by the clients of one event loop."""
+
+    def __init__(self, key: str, loop, pool_size: int, max_concurrency: int):
+        username, password = key.split(":")
+        credentials = base64.b64encode("{}:{}".format(username, password).encode("utf-8")).decode("ascii")
+        self.key = key
+        self.loop = loop
+        self.session = aiohttp.ClientSession(
+            headers={"Authorization": "Basic {}".format(credentials), "Content-Type": "application/json"},
+            connector=aiohttp.TCPConnector(limit=pool_size),
+        )
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.references = 0
+
+
+def _acquire_pool(key: str, loop, pool_size: int, max_concurrency: int):
+    pool = _pools.get((key, loop))
+    if pool is None:
+        pool = _pools[(key, loop)] = _Pool(key, loop, pool_size, max_concurrency)
+    pool.references += 1
+    return pool
+
+
+async def _release_pool(pool: _Pool):
+    pool.references -= 1
+    if pool.references <= 0:
+        _pools.pop((pool.key, pool.loop), None)
+        await pool.session.close()
+
+
+class AsyncBuyCoinsClient:
+    """The AsyncBuyCoinsClient class sends requests from an asyncio event loop.
+
+    Clients using the same credentials on the same loop share one aiohttp connection pool, and the number of
+    requests in flight at once is capped by `max_concurrency`.
+    """
+
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE, max_concurrency: int = DEFAULT_MAX_CONCURRENCY, typed: bool = False, persisted_queries: bool = False, json_codec=None, auth_key: str = None, scheduler=None):
+        """
+
+        Args:
+            pool_size (int): Maximum number of keep-alive connections pooled for these credentials.
+            max_concurrency (int): Maximum number of requests in flight at once.
+            typed (bool): Whether methods return the models in `buycoins.models` instead of JSON objects.
+            persisted_queries (bool): Whether documents are sent as Automatic Persisted Queries: by hash first,
+                and in full only if the server doesn't know the hash yet.
+            json_codec (str, Codec, optional): JSON codec for request and response bodies: "orjson", "ujson" or
+                "json". Defaults to the fastest one installed.
+            auth_key (str, optional): The `public key:private key` pair to authenticate with. Defaults to the
+                `auth_key` setting, read when the first request is sent.
+            scheduler (RequestScheduler, optional): Scheduler every request waits on before being sent. It can be
+                shared between clients, blocking or not.
+        """
+        if aiohttp is None:
+            raise ImportError("aiohttp is required for the asyncio client: pip install buycoins-python[async]")
+
+        self._typed = typed
+        self._codec = get_codec(json_codec)
+        self.__endpoint = client.ENDPOINT
+        self.__auth_key = auth_key
+        self.__pool_size = pool_size
+        self.__max_concurrency = max_concurrency
+        self.__persisted_queries = persisted_queries
+        self.__scheduler = scheduler
+        self.__pool = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def _initiate_client(self):
+        loop = asyncio.get_running_loop()
+        if self.__pool is None or self.__pool.loop is not loop:
+            self.__pool = _acquire_pool(self._credentials(), loop, self.__pool_size, self.__max_concurrency)
+        return self.__pool
+
+    def _credentials(self):
+        """Returns the key this client authenticates with, reading the `auth_key` setting if none was given."""
+        if self.__auth_key is None:
+            self.__auth_key = client.get_auth_key()
+        return self.__auth_key
+
+    async def warm_up(self, connections: int = 1):
+        """Opens keep-alive connections to the API so the first requests skip the TCP and TLS handshake.
+
+        Args:
+            connections (int): Number of connections to open concurrently.
+        """
+        pool = self._initiate_client()
+
+        async def ping():
+            try:
+                async with pool.session.head(self.__endpoint):
+                    pass
+            except aiohttp.ClientError:
+                pass
+
+        await asyncio.gather(*(ping() for _ in range(min(connections, self.__pool_size))))
+
+    async def close(self):
+        """Releases this client's hold on the shared pool. Connections are closed once no client uses them."""
+        if self.__pool is not None:
+            pool, self.__pool = self.__pool, None
+            await _release_pool(pool)
+
+    async def _execute_request(self, query: str, variables: dict = {}, idempotency_key: str = None):
+        if not query or query == "":
+            raise QueryError("Invalid query passed!", 400)
+
+        body = {"query": query}
+        if variables:
+            body["variables"] = variables
+
+        headers = {"Idempotency-Key": idempotency_key} if idempotency_key else None
+
+        if self.__scheduler is not None:
+            await self.__scheduler.acquire_async(classify(query))
+
+        if self.__persisted_queries:
+            persisted_body = queries.persisted(body)
+            result = await self._send(persisted_body, headers)
+            error = queries.persisted_query_error(result)
+            if error is None:
+                return result
+            if error == queries.PERSISTED_QUERY_NOT_FOUND:
+                return await self._send(dict(body, extensions=persisted_body["extensions"]), headers)
+            self.__persisted_queries = False
+        return await self._send(body, headers)
+
+    async def _send(self, body: dict, headers: dict = None):
+        pool = self._initiate_client()
+        try:
+            async with pool.semaphore:
+                async with pool.session.post(self.__endpoint, data=self._codec.dumps(body), headers=headers) as response:
+                    if response.status >= 400:
+                        json_response = None
+                        if str(response.status).startswith("4"):
+                            json_response = self._codec.loads(await response.read())
+                        return status_error(response.status, json_response)
+                    return self._codec.loads(await response.read())
+        except aiohttp.ClientConnectionError:
+            return connection_error()
+
+    async def _perform(self, query: str, variables: dict, field: str, exception, idempotency_key: str = None):
+        response = await self._execute_request(query=query, variables=variables, idempotency_key=idempotency_key)
+        return self._unpack(response, field, exception)
+
+    async def _reject(self, error):
+        return error.response
+
+    def batch(self):
+        """Not supported by the asyncio clients: use `asyncio.gather` to send calls concurrently instead."""
+        raise NotImplementedError("Batches are not supported by the asyncio clients, use asyncio.gather instead")
+
+    _unpack = BuyCoinsClient._unpack
+
+
+class AsyncP2P(AsyncBuyCoinsClient, P2P):
+    """Asynchronous version of the `P2P` class. Every method returns an awaitable, except `iter_orders` and
+    `iter_market_book`, which return asynchronous iterators. Streaming and batches are not supported."""
+
+    async def quote(self, order_side: str = "buy", currency: str = "bitcoin"):
+        return Quote._from_response(order_side, currency, await self.get_current_price(order_side, currency))
+
+    def stream_orders(self, status: str = "open", fields: list = None, chunk_size: int = None):
+        """Not supported by the asyncio client: use `iter_orders`, which is an asynchronous iterator here."""
+        raise NotImplementedError("Streaming is not supported by the asyncio client, use iter_orders instead")
+
+    def stream_market_book(self, fields: list = None, chunk_size: int = None):
+        """Not supported by the asyncio client: use `iter_market_book`, which is an asynchronous iterator here."""
+        raise NotImplementedError("Streaming is not supported by the asyncio client, use iter_market_book instead")
+
+    async def _fetch_page(self, query: str, variables: dict, field: str):
+        response = await self._execute_request(query=query, variables=variables)
+        check_response(response, P2PError)
+        return response["data"][field]["orders"]
+
+    async def _iter_pages(self, query: str, variables: dict, field: str, page_size: int, prefetch: bool):
+        """Follows the `orders` connection cursors of `query`, yielding each order node from an async generator."""
+        following = None
+        try:
+            page = await self._fetch_page(query, dict(variables, first=page_size, after=None), field)
+            while True:
+                page_info = page.get("pageInfo") or {}
+                cursor = page_info.get("endCursor") if page_info.get("hasNextPage") else None
+
+                following = None
+                if cursor and prefetch:
+                    following = asyncio.ensure_future(self._fetch_page(query, dict(variables, first=page_size, after=cursor), field))
+
+                for edge in page["edges"]:
+                    yield Order.from_dict(edge["node"]) if self._typed else edge["node"]
+
+                if not cursor:
+                    return
+                if following is not None:
+                    page, following = await following, None
+                else:
+                    page = await self._fetch_page(query, dict(variables, first=page_size, after=cursor), field)
+        finally:
+            if following is not None:
+                following.cancel()
+
+
+class AsyncWallet(AsyncBuyCoinsClient, Wallet):
+    """Asynchronous version of the `Wallet` class. Every method returns an awaitable. Batches and `send_payouts`
+    are not supported."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._quotes = {}
+
+    async def _trade(self, query: str, side: str, currency: str, coin_amount: float, quote: Quote = None, idempotency_key: str = None):
+        if quote is None or quote.expired():
+            quote = self._quotes.get((side, currency))
+            if quote is None or quote.expired():
+                quote = await self._fetch_quote(side, currency)
+                if not isinstance(quote, Quote):
+                    return quote
+                self._quotes[(side, currency)] = quote
+
+        _variables = {"price": quote.id, "coin_amount": coin_amount, "currency": currency}
+
+        return await self._perform(query, _variables, side, WalletError, idempotency_key)
+
+    async def _fetch_quote(self, side: str, currency: str):
+        _variables = {"side": side, "currency": currency}
+        response = await self._perform(queries.GET_CURRENT_PRICE.document, _variables, "getPrices", P2PError)
+        return Quote._from_response(side, currency, response)
+
+    def send_payouts(self, payouts, journal: str = None, batch_size: int = 20, max_concurrency: int = 2, max_fee: dict = None):
+        """Not supported by the asyncio client: use `Wallet.send_payouts`."""
+        raise NotImplementedError("Payouts are not supported by the asyncio client, use Wallet.send_payouts instead")
+
+
+class AsyncNGNT(AsyncBuyCoinsClient, NGNT):
+    """Asynchronous version of the `NGNT` class. Every method returns an awaitable. Batches and
+    `create_deposit_accounts` are not supported."""
+
+    def create_deposit_accounts(self, names, checkpoint: str = None, batch_size: int = 20, max_workers: int = 4, progress=None):
+        """Not supported by the asyncio client: use `NGNT.create_deposit_accounts`."""
+        raise NotImplementedError("Bulk provisioning is not supported by the asyncio client, use NGNT.create_deposit_accounts instead")
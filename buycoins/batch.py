@@ -0,0 +1,157 @@
+import re
+
+from buycoins.exceptions import QueryError
+from buycoins.ngnt import NGNT
+from buycoins.p2p import P2P
+from buycoins.wallet import Wallet
+
+_OPERATION = re.compile(r"^\s*(query|mutation)\b\s*\w*\s*(?:\((?P<variables>[^)]*)\))?\s*{", re.DOTALL)
+_VARIABLE = re.compile(r"\$(\w+)")
+_ROOT_FIELD = re.compile(r"^\s*(\w+)")
+
+_PENDING = object()
+
+
+class BatchResult:
+    """Holds the response of a call queued on a `Batch` until the batch is sent."""
+
+    def __init__(self, value=_PENDING):
+        self._value = value
+
+    @property
+    def done(self):
+        return self._value is not _PENDING
+
+    def result(self):
+        """Returns the response of the call, exactly as the non-batched method would have returned it.
+
+        Raises:
+            QueryError: If the batch hasn't been sent yet.
+        """
+        if not self.done:
+            raise QueryError("Batch has not been sent yet", 400)
+        return self._value
+
+
+class _Batched:
+    """Queues calls on the owning batch instead of sending them."""
+
+    def __init__(self, batch):
+        super().__init__(typed=batch._client._typed)
+        self._batch = batch
+
+    def _perform(self, query: str, variables: dict, field: str, exception, idempotency_key: str = None):
+        result = BatchResult()
+        self._batch._calls.append((self, query, variables, field, exception, result))
+        self._batch._results.append(result)
+        return result
+
+    def _reject(self, error):
+        result = BatchResult(error.response)
+        self._batch._results.append(result)
+        return result
+
+
+class _BatchP2P(_Batched, P2P):
+    pass
+
+
+class _BatchWallet(_Batched, Wallet):
+    def _fetch_quote(self, side: str, currency: str):
+        # A trade's document needs its price id, so the quote is fetched through the batch's client right away.
+        return Wallet._fetch_quote(self._batch._client, side, currency)
+
+
+class _BatchNGNT(_Batched, NGNT):
+    pass
+
+
+class Batch:
+    """The Batch class sends many calls in a single request, using an aliased GraphQL document.
+
+    Calls made through its `p2p`, `wallet` and `ngnt` attributes return a `BatchResult` instead of a response. Queries
+    and mutations are sent as two documents, each in a single round trip, when the batch is sent or its `with` block
+    exits.
+    """
+
+    def __init__(self, client):
+        """
+
+        Args:
+            client (BuyCoinsClient): Client the batched documents are sent with.
+        """
+        self._client = client
+        self._calls = []
+        self._results = []
+        self.p2p = _BatchP2P(self)
+        self.wallet = _BatchWallet(self)
+        self.ngnt = _BatchNGNT(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is None:
+            self.send()
+
+    def __len__(self):
+        return len(self._results)
+
+    def send(self):
+        """Sends every queued call and resolves their results.
+
+        Returns:
+            list: The response of each call, in the order the calls were made.
+        """
+        calls, self._calls = self._calls, []
+        results, self._results = self._results, []
+        operations = {}
+        for call in calls:
+            operation = _OPERATION.match(call[1])
+            if operation is None:
+                raise QueryError("Invalid query passed!", 400)
+            operations.setdefault(operation.group(1), []).append((operation, call))
+
+        for operation_type, group in operations.items():
+            self._send(operation_type, group)
+
+        return [result.result() for result in results]
+
+    def _send(self, operation_type: str, group: list):
+        definitions, selections, variables, aliases = [], [], {}, []
+
+        for index, (operation, (_, query, call_variables, field, _, _)) in enumerate(group):
+            alias = "b{}".format(index)
+            rename = lambda match: "${}_{}".format(alias, match.group(1))
+
+            if operation.group("variables"):
+                definitions.append(_VARIABLE.sub(rename, operation.group("variables").strip()))
+            body = query[operation.end():query.rindex("}")]
+            selections.append(_ROOT_FIELD.sub(r"{}:\1".format(alias), _VARIABLE.sub(rename, body), count=1).strip())
+            for name, value in (call_variables or {}).items():
+                variables["{}_{}".format(alias, name)] = value
+            aliases.append(alias)
+
+        document = "{} Batch{}{{{}}}".format(
+            operation_type,
+            "({})".format(",".join(definitions)) if definitions else "",
+            " ".join(selections),
+        )
+        response = self._client._execute_request(query=document, variables=variables)
+
+        for alias, (_, (instance, _, _, field, exception, result)) in zip(aliases, group):
+            result._value = instance._unpack(_split(response, alias, field), field, exception)
+
+
+def _split(response, alias: str, field: str):
+    """Returns the part of a batched response belonging to `alias`, shaped like a non-batched response."""
+    if not isinstance(response, dict):
+        return response
+
+    errors = [error for error in response.get("errors") or [] if not error.get("path") or error["path"][0] == alias]
+    data = response.get("data") or {}
+
+    split = {"data": {field: data.get(alias)}}
+    if errors:
+        split["errors"] = errors
+    return split
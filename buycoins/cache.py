@@ -0,0 +1,483 @@
+import json
+import logging
+import threading
+import time
+from collections import deque
+from decimal import ROUND_FLOOR, Decimal
+
+from buycoins.models import NetworkFee, Price
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    __slots__ = ("value", "valid_until", "loader", "used", "loaded_at")
+
+    def __init__(self, value, valid_until: float, loader):
+        self.value = value
+        self.valid_until = valid_until
+        self.loader = loader
+        self.used = False
+        self.loaded_at = time.time()
+
+
+def _expires_at(prices):
+    """Returns the earliest `expiresAt` of a `getPrices` result, or None if it can't be cached."""
+    if isinstance(prices, dict):
+        prices = [prices] if "expiresAt" in prices else []
+    elif isinstance(prices, Price):
+        prices = [prices]
+    expiries = [price.expires_at if isinstance(price, Price) else price.get("expiresAt") for price in prices or []]
+    if not expiries or None in expiries:
+        return None
+    return min(expiries)
+
+
+class PriceCache:
+    """The PriceCache class keeps `getPrices` results in memory until shortly before they expire.
+
+    Entries are keyed by `(side, currency)`, and by whatever else sets results apart, such as whether the client
+    asking is typed. Entries read since they were loaded are reloaded in a background thread
+    ahead of their expiry, but no sooner than halfway through the time they are served for, so hot prices are always
+    served from memory; entries nobody reads are dropped once they expire. The cache is safe to share between threads and `P2P` instances.
+    """
+
+    def __init__(self, margin: float = 1.0, refresh_ahead: float = 5.0, background: bool = True):
+        """
+
+        Args:
+            margin (float): Seconds before `expiresAt` at which an entry stops being served.
+            refresh_ahead (float): Seconds before an entry stops being served at which it is reloaded.
+            background (bool): Whether entries are reloaded by a background thread.
+        """
+        self.margin = margin
+        self.refresh_ahead = refresh_ahead
+        self.background = background
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self._entries = {}
+        self._condition = threading.Condition()
+        self._thread = None
+        self._closed = False
+
+    def get(self, key: tuple, loader):
+        """Returns the cached prices for `key`, calling `loader` to fetch them on a miss.
+
+        Args:
+            key (tuple): The `(side, currency)` pair the prices are for, optionally followed by other parts such as
+                whether they are typed.
+            loader (callable): Fetches the prices from the API.
+
+        Returns:
+            response: The prices, as returned by `loader`.
+        """
+        with self._condition:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() < entry.valid_until:
+                if not entry.used:
+                    entry.used = True
+                    # The entry is now due for a reload ahead of its expiry, not for removal at it.
+                    self._condition.notify_all()
+                self.hits += 1
+                return entry.value
+            self.misses += 1
+
+        value = loader()
+        self._store(key, value, loader)
+        return value
+
+    def invalidate(self, key: tuple = None):
+        """Drops the entry for `key`, or every entry when no key is given."""
+        with self._condition:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def refresh(self):
+        """Reloads every read entry within `refresh_ahead` seconds of no longer being served, and drops every unread
+        entry no longer served. Entries whose reload raises are dropped and the error is logged."""
+        now = time.time()
+        with self._condition:
+            due = [(key, entry) for key, entry in self._entries.items() if self._due_at(entry) <= now]
+            for key, entry in due:
+                if not entry.used:
+                    del self._entries[key]
+
+        for key, entry in due:
+            if entry.used:
+                self.refreshes += 1
+                try:
+                    value = entry.loader()
+                except Exception:
+                    logger.exception("Reloading the prices cached for %s failed", key)
+                    with self._condition:
+                        if self._entries.get(key) is entry:
+                            del self._entries[key]
+                    continue
+                self._store(key, value, entry.loader)
+
+    def close(self):
+        """Stops the background refresh thread."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _store(self, key: tuple, value, loader):
+        expires_at = _expires_at(value)
+        with self._condition:
+            if expires_at is None:
+                self._entries.pop(key, None)
+                return
+            self._entries[key] = _Entry(value, expires_at - self.margin, loader)
+            if self.background and self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name="buycoins-price-cache", daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+
+    def _due_at(self, entry: _Entry):
+        if not entry.used:
+            return entry.valid_until
+        # Prices served for less than `refresh_ahead` are reloaded halfway through, not as soon as they are read.
+        return max(entry.valid_until - self.refresh_ahead, (entry.loaded_at + entry.valid_until) / 2)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if self._closed:
+                    return
+                if self._entries:
+                    timeout = min(self._due_at(entry) for entry in self._entries.values()) - time.time()
+                else:
+                    timeout = None
+                if timeout is None or timeout > 0:
+                    self._condition.wait(timeout)
+                    continue
+            self.refresh()
+
+
+def _fee_of(value):
+    """Returns the estimated fee and total of a `getEstimatedNetworkFee` result, or None if it failed."""
+    if isinstance(value, NetworkFee):
+        return value.estimated_fee, value.total
+    if isinstance(value, dict) and value.get("estimatedFee") is not None and value.get("total") is not None:
+        return value["estimatedFee"], value["total"]
+    return None
+
+
+def _like(value, like):
+    """Returns the decimal `value` as the same type as `like`."""
+    if isinstance(like, str):
+        return str(value)
+    if isinstance(like, float):
+        return float(value)
+    return value
+
+
+def _fee_result(template, amount: Decimal, fee: Decimal):
+    """Returns a result shaped like `template` for sending `amount` with `fee`."""
+    if isinstance(template, NetworkFee):
+        return NetworkFee.from_dict({"estimatedFee": fee, "total": amount + fee})
+    estimated_fee, total = template["estimatedFee"], template["total"]
+    return dict(template, estimatedFee=_like(fee, estimated_fee), total=_like(amount + fee, total))
+
+
+class _FeeEntry:
+    __slots__ = ("value", "amount", "fee", "valid_until")
+
+    def __init__(self, value, amount: Decimal, fee: Decimal, valid_until: float):
+        self.value = value
+        self.amount = amount
+        self.fee = fee
+        self.valid_until = valid_until
+
+
+class FeeCache:
+    """The FeeCache class answers `getEstimatedNetworkFee` from memory for amounts close to recent estimates.
+
+    Estimates are cached for `ttl` seconds, keyed by currency, amount bucket and whether they are typed: with a `bucket_size` of 0.001, every
+    amount from 0.010 up to 0.011 gets the fee estimated for the first of them, with the total recomputed for the
+    amount asked for. Without a bucket size, only identical amounts share an estimate.
+
+    With `model` set, the fees of each currency's last `window` estimates, within `model_ttl` seconds, are also fitted
+    to a straight line of the amount. Amounts missing from the cache, but within the range of those estimates, are
+    answered from the line, as long as it is within `tolerance` of every estimate it was fitted to.
+    """
+
+    def __init__(self, ttl: float = 15.0, bucket_size=None, model: bool = False, tolerance: float = 0.02, window: int = 16, min_observations: int = 3, model_ttl: float = 60.0):
+        """
+
+        Args:
+            ttl (float): Seconds an estimate is served for.
+            bucket_size (float, dict, optional): Width of the amount buckets, or a dict of widths by currency.
+                Defaults to exact amounts.
+            model (bool): Whether fees are answered from a fitted fee curve when the cache misses.
+            tolerance (float): Largest relative error of the fee curve on the estimates it was fitted to.
+            window (int): Number of recent estimates of each currency the curve is fitted to.
+            min_observations (int): Number of distinct amounts needed to fit a curve.
+            model_ttl (float): Seconds an estimate is used to fit the curve for.
+        """
+        self.ttl = ttl
+        self.bucket_size = bucket_size
+        self.model = model
+        self.tolerance = tolerance
+        self.window = window
+        self.min_observations = min_observations
+        self.model_ttl = model_ttl
+        self.hits = 0
+        self.model_hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._observations = {}
+        self._curves = {}
+        self._lock = threading.Lock()
+
+    def _key(self, currency: str, amount: Decimal, typed: bool):
+        size = self.bucket_size.get(currency) if isinstance(self.bucket_size, dict) else self.bucket_size
+        if not size:
+            return currency, amount, typed
+        return currency, (amount / Decimal(str(size))).to_integral_value(ROUND_FLOOR), typed
+
+    def get(self, currency: str, amount, loader, typed: bool = False):
+        """Returns the fee estimate for sending `amount` of `currency`, calling `loader` to fetch it on a miss.
+
+        Args:
+            currency (str): The cryptocurrency sent.
+            amount: The amount sent.
+            loader (callable): Fetches the estimate from the API.
+            typed (bool): Whether `loader` returns a `NetworkFee`. Typed and untyped estimates are cached apart.
+
+        Returns:
+            response: The estimate, as returned by `loader`.
+        """
+        amount = Decimal(str(amount))
+        key = self._key(currency, amount, typed)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now < entry.valid_until:
+                self.hits += 1
+                if entry.amount == amount:
+                    return entry.value
+                return _fee_result(entry.value, amount, entry.fee)
+
+            series = (currency, typed)
+            fee = self._predict(series, amount, now)
+            if fee is not None:
+                self.model_hits += 1
+                return _fee_result(self._observations[series][-1][2], amount, fee)
+            self.misses += 1
+
+        value = loader()
+        self._store(key, series, amount, value)
+        return value
+
+    def invalidate(self, currency: str = None):
+        """Drops the estimates and fee curve of `currency`, or of every currency when none is given."""
+        with self._lock:
+            if currency is None:
+                self._entries.clear()
+                self._observations.clear()
+                self._curves.clear()
+                return
+            for key in [key for key in self._entries if key[0] == currency]:
+                del self._entries[key]
+            for typed in (False, True):
+                self._observations.pop((currency, typed), None)
+                self._curves.pop((currency, typed), None)
+
+    def stats(self):
+        """Returns the cache and fee curve hits, the misses, the share of lookups answered locally and the number of
+        cached estimates."""
+        with self._lock:
+            lookups = self.hits + self.model_hits + self.misses
+            return {
+                "hits": self.hits,
+                "model_hits": self.model_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.model_hits) / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+            }
+
+    def _store(self, key: tuple, series: tuple, amount: Decimal, value):
+        fee = _fee_of(value)
+        if fee is None:
+            return
+        fee = Decimal(str(fee[0]))
+        now = time.monotonic()
+        with self._lock:
+            for stale in [key for key, entry in self._entries.items() if entry.valid_until <= now]:
+                del self._entries[stale]
+            self._entries[key] = _FeeEntry(value, amount, fee, now + self.ttl)
+            if self.model:
+                observations = self._observations.setdefault(series, deque(maxlen=self.window))
+                observations.append((now, amount, value, fee))
+                self._curves.pop(series, None)
+
+    def _predict(self, series: tuple, amount: Decimal, now: float):
+        """Returns the fee of `amount` on the fitted curve of a `(currency, typed)` series of estimates, or None if it
+        can't be trusted."""
+        if not self.model:
+            return None
+        observations = self._observations.get(series)
+        if not observations:
+            return None
+        while observations and observations[0][0] <= now - self.model_ttl:
+            observations.popleft()
+            self._curves.pop(series, None)
+
+        curve = self._curves.get(series)
+        if curve is None:
+            curve = self._curves[series] = self._fit(observations)
+        if curve is False:
+            return None
+        intercept, slope, low, high = curve
+        if not low <= amount <= high:
+            return None
+        return max(intercept + slope * amount, Decimal(0)).quantize(Decimal("1e-8"))
+
+    def _fit(self, observations):
+        """Returns the least squares line through the observations and their amount range, or False if it doesn't
+        fit them within `tolerance`."""
+        points = {amount: fee for _, amount, _, fee in observations}
+        if len(points) < self.min_observations:
+            return False
+        count = len(points)
+        mean_amount = sum(points) / count
+        mean_fee = sum(points.values()) / count
+        spread = sum((amount - mean_amount) ** 2 for amount in points)
+        slope = sum((amount - mean_amount) * (fee - mean_fee) for amount, fee in points.items()) / spread
+        intercept = mean_fee - slope * mean_amount
+        for amount, fee in points.items():
+            if abs(intercept + slope * amount - fee) > abs(fee) * Decimal(str(self.tolerance)):
+                return False
+        return intercept, slope, min(points), max(points)
+
+
+BALANCE_EVENTS = ("coins.incoming", "coins.outgoing")
+
+
+class BalanceCache:
+    """The BalanceCache class keeps `getBalances` results in memory, by account and currency.
+
+    Balances are served while they are younger than `max_staleness` seconds, a limit each read can lower. `Wallet`
+    drops an account's balances when one of its trades or transfers succeeds, and `invalidate_event` drops them when a
+    deposit or transfer event arrives, so only changes made elsewhere can go unseen, and only for `max_staleness`.
+    """
+
+    def __init__(self, max_staleness: float = 30.0, events=BALANCE_EVENTS):
+        """
+
+        Args:
+            max_staleness (float): Seconds a balance is served for.
+            events (tuple): Webhook events that change balances.
+        """
+        self.max_staleness = max_staleness
+        self.events = events
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._generations = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    def _generation(self, account: str):
+        return self._epoch, self._generations.get(account, 0)
+
+    def get(self, key: tuple, loader, max_staleness: float = None, refresh: bool = False):
+        """Returns the cached balances for `key`, calling `loader` to fetch them on a miss.
+
+        Args:
+            key (tuple): The `(account, currency)` pair the balances are for, currency being None for all of them,
+                optionally followed by other parts such as the selected fields.
+            loader (callable): Fetches the balances from the API.
+            max_staleness (float, optional): Largest age in seconds of balances served for this read. Defaults to
+                the cache's.
+            refresh (bool): Whether to fetch the balances even if they are cached.
+
+        Returns:
+            response: The balances, as returned by `loader`.
+        """
+        if max_staleness is None:
+            max_staleness = self.max_staleness
+        with self._lock:
+            entry = self._entries.get(key)
+            if not refresh and entry is not None and time.monotonic() - entry[1] < max_staleness:
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            generation = self._generation(key[0])
+            loaded_at = time.monotonic()
+
+        value = loader()
+        if isinstance(value, dict) and value.get("status") == "error":
+            return value
+        with self._lock:
+            # Balances loaded while the account was invalidated may predate the change.
+            if self._generation(key[0]) == generation:
+                self._entries[key] = (value, loaded_at)
+        return value
+
+    def invalidate(self, account: str = None, currency: str = None):
+        """Drops the balances of `account`, or of every account when none is given.
+
+        Args:
+            account (str, optional): Public key of the account.
+            currency (str, optional): The only currency whose balance changed. Balances of all currencies are
+                dropped too. Defaults to every currency.
+        """
+        with self._lock:
+            if account is None:
+                self._entries.clear()
+                self._epoch += 1
+                return
+            self._generations[account] = self._generations.get(account, 0) + 1
+            for key in list(self._entries):
+                if key[0] == account and (currency is None or key[1] in (None, currency)):
+                    del self._entries[key]
+
+    def invalidate_event(self, event: dict, account: str = None):
+        """Drops the balances changed by a verified webhook event, and returns whether it changes balances.
+
+        Args:
+            event (dict): The event, as parsed from the request body.
+            account (str, optional): Public key of the account the webhook belongs to. Defaults to every account.
+        """
+        payload = event.get("payload") or {}
+        if payload.get("event") not in self.events:
+            return False
+        currency = (payload.get("data") or {}).get("cryptocurrency")
+        self.invalidate(account, currency if account is not None else None)
+        return True
+
+    def handle_webhook(self, webhook, account: str = None):
+        """Verifies a `Webhook` request and drops the balances its event changes.
+
+        Returns:
+            Bool: `True` if the request originated from BuyCoins or `False` if it didn't, in which case nothing is
+            dropped.
+        """
+        if not webhook.verify_request():
+            return False
+        body = webhook.body
+        try:
+            event = json.loads(body if isinstance(body, (str, bytes)) else bytes(body))
+        except ValueError:
+            return False
+        self.invalidate_event(event, account)
+        return True
+
+    def stats(self):
+        """Returns the hits, the misses, the share of reads served from memory and the number of cached balances."""
+        with self._lock:
+            reads = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / reads if reads else 0.0,
+                "entries": len(self._entries),
+            }
@@ -1,47 +1,336 @@
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+import requests
 from decouple import config
-from python_graphql_client import GraphqlClient
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
-from requests.exceptions import HTTPError, ConnectionError
+from requests.exceptions import HTTPError, ConnectionError, RequestException, Timeout
 
-from buycoins.exceptions import QueryError
+from buycoins import models, queries
+from buycoins.codec import DEFAULT_CHUNK_SIZE, NodeStream, get_codec
+from buycoins.exceptions import QueryError, ClientError, ServerError
+from buycoins.exceptions.utils import check_response, connection_error, timeout_error
+from buycoins.ratelimit import classify
 
 ENDPOINT = "https://backend.buycoins.tech/api/graphql"
-auth_key = config("auth_key")
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = 30.0
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_auth_key():
+    """Returns the `auth_key` setting, read from the environment or a `.env` or `settings.ini` file.
+
+    Raises:
+        UndefinedValueError: If the setting isn't defined.
+    """
+    return config("auth_key")
+
+
+def __getattr__(name):
+    # `auth_key` used to be read when this module was imported; it is now read when first accessed.
+    if name == "auth_key":
+        return get_auth_key()
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+def _acquire_session(key: str, pool_size: int = DEFAULT_POOL_SIZE, max_concurrency: int = None):
+    """Returns the keep-alive session shared by every client authenticated with `key`, and the semaphore capping
+    their requests in flight.
+
+    The session is created on first use; its connection pool is sized by the first caller, and its semaphore by the
+    first caller asking for one.
+
+    Args:
+        key (str): The `public key:private key` pair the session authenticates with.
+        pool_size (int): Maximum number of pooled connections kept alive to the API.
+        max_concurrency (int, optional): Maximum number of requests in flight at once. Defaults to no limit.
+
+    Returns:
+        tuple: A `requests.Session` instance and a `threading.BoundedSemaphore`, or None.
+    """
+    with _sessions_lock:
+        entry = _sessions.get(key)
+        if entry is None:
+            username, password = key.split(":")
+            session = requests.Session()
+            session.auth = HTTPBasicAuth(username, password)
+            session.headers["Content-Type"] = "application/json"
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            entry = _sessions[key] = [session, 0, None]
+        if entry[2] is None and max_concurrency is not None:
+            entry[2] = threading.BoundedSemaphore(max_concurrency)
+        entry[1] += 1
+        return entry[0], entry[2]
+
+
+def _release_session(key: str):
+    """Drops a reference to the session for `key`, closing its connections once no client uses it."""
+    with _sessions_lock:
+        entry = _sessions.get(key)
+        if entry is None:
+            return
+        entry[1] -= 1
+        if entry[1] <= 0:
+            del _sessions[key]
+            entry[0].close()
 
 
 class BuyCoinsClient:
-    def __init__(self):
+    _typed = False
+
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE, prewarm: int = 0, typed: bool = False, retry=None, circuit_breaker=None, scheduler=None, persisted_queries: bool = False, json_codec=None, auth_key: str = None, timeout: float = DEFAULT_TIMEOUT, max_concurrency: int = None):
+        """
+
+        Args:
+            pool_size (int): Maximum number of keep-alive connections pooled for these credentials.
+            prewarm (int): Number of connections to open ahead of the first request.
+            typed (bool): Whether methods return the models in `buycoins.models` instead of JSON objects.
+            retry (RetryPolicy, optional): Policy for retrying failed requests.
+            circuit_breaker (CircuitBreaker, optional): Breaker failing requests fast while the API is down. It can
+                be shared between clients.
+            scheduler (RequestScheduler, optional): Scheduler every request waits on before being sent. It can be
+                shared between clients.
+            persisted_queries (bool): Whether documents are sent as Automatic Persisted Queries: by hash first,
+                and in full only if the server doesn't know the hash yet.
+            json_codec (str, Codec, optional): JSON codec for request and response bodies: "orjson", "ujson" or
+                "json". Defaults to the fastest one installed.
+            auth_key (str, optional): The `public key:private key` pair to authenticate with. Defaults to the
+                `auth_key` setting, read when the first request is sent.
+            timeout (float, tuple, optional): Seconds to wait for the API to connect and to answer, or a
+                `(connect, read)` pair, after which the request fails with a retryable 504. None waits forever.
+            max_concurrency (int, optional): Maximum number of requests in flight at once, shared by the clients
+                using these credentials. Streams count until they are closed. Defaults to no limit.
+        """
+        self._typed = typed
+        self._codec = get_codec(json_codec)
         self.__endpoint = ENDPOINT
-        self.__username = ""
-        self.__password = ""
         self.__auth_key = auth_key
+        self.__pool_size = pool_size
+        self.__retry = retry
+        self.__circuit_breaker = circuit_breaker
+        self.__scheduler = scheduler
+        self.__persisted_queries = persisted_queries
+        self.__timeout = timeout
+        self.__max_concurrency = max_concurrency
+        self.__session = None
+        self.__semaphore = None
+        self.__finalizer = None
+
+        if prewarm:
+            self.warm_up(prewarm)
+
+    def __enter__(self):
+        return self
 
-    def _split_auth_key(self):
-        self.__username, self.__password = self.__auth_key.split(":")
+    def __exit__(self, *exc_info):
+        self.close()
 
     def _initiate_client(self):
-        self._split_auth_key()
-        try:
-            self.__auth = HTTPBasicAuth(self.__username, self.__password)
-            self.__client = GraphqlClient(self.__endpoint, auth=self.__auth)
-        except (HTTPError, ConnectionError) as e:
-            return e
-        else:
-            return self.__client
+        if self.__session is None:
+            self.__session, self.__semaphore = _acquire_session(self._credentials(), self.__pool_size, self.__max_concurrency)
+            self.__finalizer = weakref.finalize(self, _release_session, self.__auth_key)
+        return self.__session
+
+    def _credentials(self):
+        """Returns the key this client authenticates with, reading the `auth_key` setting if none was given."""
+        if self.__auth_key is None:
+            self.__auth_key = get_auth_key()
+        return self.__auth_key
+
+    def warm_up(self, connections: int = 1):
+        """Opens keep-alive connections to the API so the first requests skip the TCP and TLS handshake.
+
+        Args:
+            connections (int): Number of connections to open concurrently.
+        """
+        session = self._initiate_client()
+        connections = min(connections, self.__pool_size)
+
+        def ping(_):
+            try:
+                session.head(self.__endpoint, timeout=self.__timeout)
+            except RequestException:
+                pass
+
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            list(executor.map(ping, range(connections)))
+
+    def close(self):
+        """Releases this client's hold on the shared session. Connections are closed once no client uses them."""
+        if self.__finalizer is not None:
+            self.__finalizer()
+        self.__session = None
+        self.__finalizer = None
+
+    def batch(self):
+        """Returns a `Batch` whose queued calls are sent through this client in a single request.
 
-    def _execute_request(self, query: str, variables: dict = {}):
+        Returns:
+            Batch: A batch, usable as a context manager.
+        """
+        from buycoins.batch import Batch
+
+        return Batch(self)
+
+    def _execute_request(self, query: str, variables: dict = {}, idempotency_key: str = None):
         if not query or query == "":
             raise QueryError("Invalid query passed!", 400)
 
+        body = {"query": query}
+        if variables:
+            body["variables"] = variables
+
+        headers = {"Idempotency-Key": idempotency_key} if idempotency_key else None
+
+        retry = self.__retry
+        if retry is not None and not retry.allows(query, idempotency_key):
+            retry = None
+
+        attempt = 0
+        while True:
+            # The scheduler is waited on first: a half-open breaker's trial must be followed by a request it records.
+            if self.__scheduler is not None:
+                self.__scheduler.acquire(classify(query))
+
+            if self.__circuit_breaker is not None:
+                if not self.__circuit_breaker.allow():
+                    return self.__circuit_breaker.error()
+
+            result = None
+            try:
+                if self.__persisted_queries:
+                    result = self._send_persisted(body, headers)
+                else:
+                    result = self._send(body, headers)
+            except Exception as e:
+                # Unexpected errors count as failures, or a half-open breaker would wait on its trial forever.
+                result = e
+                raise
+            finally:
+                if self.__circuit_breaker is not None:
+                    self.__circuit_breaker.record(result)
+
+            attempt += 1
+            if retry is None or attempt >= retry.max_attempts or not retry.retryable(result):
+                return result
+            time.sleep(retry.delay(attempt - 1, result))
+
+    def _send(self, body: dict, headers: dict = None):
         try:
-            self._initiate_client()
-            request = self.__client.execute(query=query, variables=variables)
+            session = self._initiate_client()
+            with self.__semaphore or nullcontext():
+                response = session.post(self.__endpoint, data=self._codec.dumps(body), headers=headers, timeout=self.__timeout)
+                response.raise_for_status()
+                request = self._codec.loads(response.content)
 
         except HTTPError as e:
             return e
         except QueryError as e:
             return e.response
-        except ConnectionError as e:
+        except (ConnectionError, Timeout) as e:
             return e
         else:
             return request
+
+    def _stream(self, query: str, variables: dict = {}, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        """Executes `query` and returns a `NodeStream` over the `edges[].node` items of its response, which must be
+        closed once read to give its connection back to the pool.
+
+        The request waits on the scheduler and is refused while the circuit breaker is open, but it is not retried
+        and persisted queries aren't used.
+
+        Raises:
+            ClientError, ServerError: If the request fails before the body starts arriving.
+        """
+        if not query:
+            raise QueryError("Invalid query passed!", 400)
+
+        body = {"query": query}
+        if variables:
+            body["variables"] = variables
+
+        if self.__scheduler is not None:
+            self.__scheduler.acquire(classify(query))
+        if self.__circuit_breaker is not None and not self.__circuit_breaker.allow():
+            raise self.__circuit_breaker.error()
+
+        semaphore = None
+        try:
+            session = self._initiate_client()
+            if self.__semaphore is not None:
+                self.__semaphore.acquire()
+                semaphore = self.__semaphore
+            response = session.post(self.__endpoint, data=self._codec.dumps(body), stream=True, timeout=self.__timeout)
+            response.raise_for_status()
+        except Exception as e:
+            if semaphore is not None:
+                semaphore.release()
+            if self.__circuit_breaker is not None:
+                self.__circuit_breaker.record(e)
+            if isinstance(e, Timeout):
+                raise timeout_error()
+            if isinstance(e, ConnectionError):
+                raise connection_error()
+            if isinstance(e, HTTPError):
+                check_response(e, QueryError)
+            raise
+        if self.__circuit_breaker is not None:
+            self.__circuit_breaker.record(None)
+
+        def close():
+            response.close()
+            if semaphore is not None:
+                semaphore.release()
+
+        return NodeStream(response.iter_content(chunk_size), self._codec, close)
+
+    def _send_persisted(self, body: dict, headers: dict = None):
+        """Sends the hash of the document, then the document with its hash if the server reports it as unknown."""
+        persisted_body = queries.persisted(body)
+        result = self._send(persisted_body, headers)
+        error = queries.persisted_query_error(result)
+        if error is None:
+            return result
+        if error == queries.PERSISTED_QUERY_NOT_SUPPORTED:
+            self.__persisted_queries = False
+            return self._send(body, headers)
+        return self._send(dict(body, extensions=persisted_body["extensions"]), headers)
+
+    def _perform(self, query: str, variables: dict, field: str, exception, idempotency_key: str = None):
+        """Executes `query` and returns the `field` entry of its data, or the error response.
+
+        Args:
+            query (str): GraphQL document to execute.
+            variables (dict): Variables for the document.
+            field (str): Root field whose data is returned.
+            exception (): Exception class raised for GraphQL errors: WalletError, P2PError, AccountError
+            idempotency_key (str, optional): Key sent with mutations, allowing them to be retried.
+
+        Returns:
+            response: A JSON object containing response from the request.
+        """
+        response = self._execute_request(query=query, variables=variables, idempotency_key=idempotency_key)
+        return self._unpack(response, field, exception)
+
+    def _reject(self, error):
+        """Returns the response for a request that failed validation before being sent."""
+        return error.response
+
+    def _unpack(self, response, field: str, exception):
+        try:
+            check_response(response, exception)
+        except (exception, ClientError, ServerError) as e:
+            return e.response
+        else:
+            if self._typed:
+                return models.parse(field, response["data"][field])
+            return response["data"][field]
@@ -0,0 +1,174 @@
+import json
+import re
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import ujson
+except ImportError:  # pragma: no cover
+    ujson = None
+
+from buycoins.exceptions import QueryError
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+class Codec:
+    """A JSON encoder and decoder pair used for request and response bodies."""
+
+    __slots__ = ("name", "dumps", "loads")
+
+    def __init__(self, name: str, dumps, loads):
+        """
+
+        Args:
+            name (str): Name of the codec.
+            dumps: Function encoding an object to `bytes`.
+            loads: Function decoding `bytes` to an object.
+        """
+        self.name = name
+        self.dumps = dumps
+        self.loads = loads
+
+    def __repr__(self):
+        return "Codec({!r})".format(self.name)
+
+
+CODECS = {"json": Codec("json", lambda value: json.dumps(value, separators=(",", ":")).encode("utf-8"), json.loads)}
+if ujson is not None:
+    CODECS["ujson"] = Codec("ujson", lambda value: ujson.dumps(value).encode("utf-8"), ujson.loads)
+if orjson is not None:
+    CODECS["orjson"] = Codec("orjson", orjson.dumps, orjson.loads)
+
+
+def get_codec(codec=None):
+    """Returns the codec called `codec`, or the fastest one installed: orjson, then ujson, then the standard library.
+
+    Args:
+        codec (str, Codec, optional): Name of an installed codec, or a codec, returned as is.
+
+    Raises:
+        QueryError: If no codec with that name is installed.
+    """
+    if isinstance(codec, Codec):
+        return codec
+    if codec is None:
+        return CODECS.get("orjson") or CODECS.get("ujson") or CODECS["json"]
+    if codec not in CODECS:
+        raise QueryError("JSON codec {!r} is not installed".format(codec), 400)
+    return CODECS[codec]
+
+
+_EDGES = re.compile(rb'"edges"\s*:\s*\[')
+_STRUCTURE = re.compile(rb'[{}\[\]"]')
+_STRING_END = re.compile(rb'["\\]')
+_SEPARATORS = b" \t\r\n,"
+
+
+class NodeStream:
+    """Decodes the `edges[].node` items of a connection while its response body is still arriving.
+
+    Each edge is decoded as soon as its closing brace is received, and its bytes are then dropped, so memory use is
+    bounded by the largest edge rather than the whole body. The rest of the response is decoded once the body ends
+    and is available as `document`, with an empty `edges` list.
+    """
+
+    def __init__(self, chunks, codec=None, close=None):
+        """
+
+        Args:
+            chunks: Iterable of `bytes` chunks of the response body.
+            codec (Codec, optional): Codec decoding the edges. Defaults to the fastest one installed.
+            close (optional): Function releasing the response, called by `close`.
+        """
+        self.chunks = chunks
+        self.codec = get_codec(codec)
+        self._close = close
+        self.document = None
+        self._buffer = bytearray()
+        self._prefix = None
+        self._searched = 0
+        self._done = False
+        self._position = 0
+        self._start = None
+        self._depth = 0
+        self._in_string = False
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            yield from self._feed(chunk)
+        if self._prefix is None:
+            self.document = self.codec.loads(bytes(self._buffer))
+        else:
+            self.document = self.codec.loads(self._prefix + b"[" + bytes(self._buffer))
+        self._buffer = bytearray()
+
+    def close(self):
+        """Releases the response, whether or not its body was read to the end."""
+        if self._close is not None:
+            close, self._close = self._close, None
+            close()
+
+    def _feed(self, chunk: bytes):
+        buffer = self._buffer
+        buffer += chunk
+        if self._done:
+            return
+        if self._prefix is None:
+            match = _EDGES.search(buffer, self._searched)
+            if match is None:
+                self._searched = max(len(buffer) - 32, 0)
+                return
+            self._prefix = bytes(buffer[:match.end() - 1])
+            del buffer[:match.end()]
+
+        position = self._position
+        while True:
+            if self._start is None:
+                while position < len(buffer) and buffer[position] in _SEPARATORS:
+                    position += 1
+                if position >= len(buffer):
+                    break
+                if buffer[position] == ord("]"):
+                    del buffer[:position]
+                    position = 0
+                    self._done = True
+                    break
+                self._start = position
+
+            if self._in_string:
+                match = _STRING_END.search(buffer, position)
+                if match is None:
+                    position = max(position, len(buffer))
+                    break
+                if match.group() == b"\\":
+                    position = match.end() + 1
+                    if position > len(buffer):
+                        break
+                    continue
+                self._in_string = False
+                position = match.end()
+                continue
+
+            match = _STRUCTURE.search(buffer, position)
+            if match is None:
+                position = len(buffer)
+                break
+            position = match.end()
+            token = match.group()
+            if token == b'"':
+                self._in_string = True
+            elif token in (b"{", b"["):
+                self._depth += 1
+            else:
+                self._depth -= 1
+                if self._depth == 0:
+                    edge = self.codec.loads(bytes(buffer[self._start:position]))
+                    del buffer[:position]
+                    position = 0
+                    self._start = None
+                    yield edge.get("node")
+        self._position = position
@@ -1,8 +1,51 @@
-from requests.exceptions import HTTPError, ConnectionError
+from requests.exceptions import HTTPError, ConnectionError, Timeout
 
 from buycoins.exceptions import ClientError, ServerError
 
 
+def connection_error():
+    """Returns the exception raised when the BuyCoins API can't be reached.
+
+    Returns:
+        ServerError: Exception with a 503 status code.
+
+    """
+
+    message = "{} Failed to establish a connection".format(ConnectionError.__doc__)
+    return ServerError(message, 503)
+
+
+def timeout_error():
+    """Returns the exception raised when the BuyCoins API doesn't answer in time.
+
+    Returns:
+        ServerError: Exception with a 504 status code.
+
+    """
+
+    return ServerError("The request to the BuyCoins API timed out", 504)
+
+
+def status_error(status_code, json_response=None):
+    """Returns the exception raised for an unsuccessful HTTP status code.
+
+    Args:
+        status_code (int): HTTP status code of the response.
+        json_response (dict): Decoded body of the response, read for client errors.
+
+    Returns:
+        ClientError for 4xx status codes, ServerError otherwise.
+
+    """
+
+    if str(status_code).startswith("4"):
+        error_message = json_response["errors"]
+        return ClientError(error_message, status_code)
+    else:
+        error_message = HTTPError.__doc__
+        return ServerError(error_message, status_code)
+
+
 def check_response(response, exception):
     """Checks the request"s response to raise any possible exception.
 
@@ -18,18 +61,18 @@ def check_response(response, exception):
     if not exception:
         exception = Exception
 
-    if type(response) == ConnectionError:
-        message = "{} Failed to establish a connection".format(response.__doc__)
-        raise ServerError(message, 503)
-    elif type(response) == HTTPError:
+    if isinstance(response, Timeout):
+        raise timeout_error()
+    elif isinstance(response, ConnectionError):
+        raise connection_error()
+    elif isinstance(response, HTTPError):
         status_code = response.response.status_code
         if str(status_code).startswith("4"):
-            json_response = response.response.json()
-            error_message = json_response["errors"]
-            raise ClientError(error_message, status_code)
+            raise status_error(status_code, response.response.json())
         else:
-            error_message = response.__doc__
-            raise ServerError(error_message, status_code)
+            raise status_error(status_code)
+    elif isinstance(response, (ClientError, ServerError)):
+        raise response
     elif "errors" in response:
         error = response["errors"][0]
         error_message = error["message"]
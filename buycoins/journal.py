@@ -0,0 +1,70 @@
+import os
+
+from buycoins.codec import get_codec
+
+
+class JournalFile:
+    """An append-only file of JSON lines, recording the progress of a bulk operation so a later run can resume it.
+
+    `records` reads back what previous runs wrote. Records are appended between `open` and `close`, or in a `with`
+    block. Without a path, nothing is read and appended records are discarded.
+    """
+
+    def __init__(self, path: str = None, codec=None):
+        """
+
+        Args:
+            path (str, optional): Path of the file. Defaults to none, nothing being read or kept.
+            codec (Codec, optional): JSON codec of the records. Defaults to the fastest one installed.
+        """
+        self.path = path
+        self._codec = codec if codec is not None else get_codec()
+        self._file = None
+        self._torn = False
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def records(self):
+        """Yields the records in the file, skipping a last line left incomplete by a run killed while writing it."""
+        if self.path is None or not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as file:
+            for line in file:
+                self._torn = not line.endswith(b"\n")
+                try:
+                    record = self._codec.loads(line)
+                except ValueError:
+                    # The last line is cut short if the previous run was killed while writing it.
+                    continue
+                yield record
+
+    def open(self):
+        """Opens the file for appending and returns the journal."""
+        self._file = open(self.path or os.devnull, "ab")
+        if self._torn:
+            # Ends the torn line, so the next record isn't appended to it.
+            self._file.write(b"\n")
+            self._torn = False
+        return self
+
+    def append(self, *records, sync: bool = False):
+        """Appends `records`, one line each, and flushes them.
+
+        Args:
+            records (dict): The records to append.
+            sync (bool): Whether they are synced to disk before returning.
+        """
+        self._file.write(b"".join(self._codec.dumps(record) + b"\n" for record in records))
+        self._file.flush()
+        if sync and self.path is not None:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        """Closes the file."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
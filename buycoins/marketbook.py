@@ -0,0 +1,166 @@
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from buycoins.models import Orders
+
+SIDES = ("buy", "sell")
+
+
+def _value(order, name: str, attribute: str):
+    return order[name] if isinstance(order, dict) else getattr(order, attribute)
+
+
+class MarketBook:
+    """The MarketBook class stores market book orders in columnar NumPy arrays for vectorized analytics.
+
+    Prices and amounts are held as float64. Buy orders are the bids and sell orders the asks; analytics such as
+    `best_bid` or `vwap` are only meaningful on a book holding a single cryptocurrency, see `filter`.
+    """
+
+    def __init__(self, ids, price, amount, side, currency, created_at, currencies: tuple):
+        """
+
+        Args:
+            ids (ndarray): Order ids.
+            price (ndarray): Price per coin of each order.
+            amount (ndarray): Coin amount of each order.
+            side (ndarray): Index of each order's side in `SIDES`.
+            currency (ndarray): Index of each order's cryptocurrency in `currencies`.
+            created_at (ndarray): Creation timestamp of each order.
+            currencies (tuple): Names of the cryptocurrencies the `currency` codes refer to.
+        """
+        if np is None:
+            raise ImportError("numpy is required for MarketBook: pip install buycoins-python[analytics]")
+
+        self.ids = ids
+        self.price = price
+        self.amount = amount
+        self.side = side
+        self.currency = currency
+        self.created_at = created_at
+        self.currencies = currencies
+
+    @classmethod
+    def from_orders(cls, orders):
+        """Builds a book from order JSON objects or `Order` models, e.g. from `P2P.iter_market_book`."""
+        if np is None:
+            raise ImportError("numpy is required for MarketBook: pip install buycoins-python[analytics]")
+
+        ids, price, amount, side, currency, created_at = [], [], [], [], [], []
+        currencies = {}
+        for order in orders:
+            ids.append(_value(order, "id", "id"))
+            price.append(float(_value(order, "pricePerCoin", "price_per_coin")))
+            amount.append(float(_value(order, "coinAmount", "coin_amount")))
+            side.append(SIDES.index(_value(order, "side", "side")))
+            currency.append(currencies.setdefault(_value(order, "cryptocurrency", "cryptocurrency"), len(currencies)))
+            created_at.append(_value(order, "createdAt", "created_at") or 0)
+
+        return cls(
+            np.array(ids, dtype=object),
+            np.array(price, dtype=np.float64),
+            np.array(amount, dtype=np.float64),
+            np.array(side, dtype=np.int8),
+            np.array(currency, dtype=np.int16),
+            np.array(created_at, dtype=np.int64),
+            tuple(currencies),
+        )
+
+    @classmethod
+    def from_response(cls, response):
+        """Builds a book from the result of `P2P.get_market_book`, typed or not."""
+        if isinstance(response, Orders):
+            return cls.from_orders(response.orders or [])
+        return cls.from_orders(edge["node"] for edge in response["orders"]["edges"])
+
+    def __len__(self):
+        return len(self.price)
+
+    def _select(self, mask):
+        return MarketBook(
+            self.ids[mask],
+            self.price[mask],
+            self.amount[mask],
+            self.side[mask],
+            self.currency[mask],
+            self.created_at[mask],
+            self.currencies,
+        )
+
+    def filter(self, currency: str = None, side: str = None):
+        """Returns the book of the orders matching `currency` and `side`.
+
+        Args:
+            currency (str, optional): Cryptocurrency to keep.
+            side (str, optional): Order side to keep, `buy` or `sell`.
+
+        Returns:
+            MarketBook: A new book.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if currency is not None:
+            code = self.currencies.index(currency) if currency in self.currencies else -1
+            mask &= self.currency == code
+        if side is not None:
+            mask &= self.side == SIDES.index(side)
+        return self._select(mask)
+
+    def best_bid(self):
+        """Returns the highest buy price, or None if there are no buy orders."""
+        bids = self.price[self.side == 0]
+        return float(bids.max()) if len(bids) else None
+
+    def best_ask(self):
+        """Returns the lowest sell price, or None if there are no sell orders."""
+        asks = self.price[self.side == 1]
+        return float(asks.min()) if len(asks) else None
+
+    def spread(self):
+        """Returns the difference between the best ask and the best bid, or None if either side is empty."""
+        bid, ask = self.best_bid(), self.best_ask()
+        if bid is None or ask is None:
+            return None
+        return ask - bid
+
+    def depth(self, levels: int = None):
+        """Aggregates the coin amount available at each price level.
+
+        Args:
+            levels (int, optional): Maximum number of price levels returned per side.
+
+        Returns:
+            dict: `(prices, amounts)` arrays per side, bids from the highest price and asks from the lowest.
+        """
+        depth = {}
+        for code, side in enumerate(SIDES):
+            mask = self.side == code
+            prices, inverse = np.unique(self.price[mask], return_inverse=True)
+            amounts = np.bincount(inverse, weights=self.amount[mask], minlength=len(prices))
+            if side == "buy":
+                prices, amounts = prices[::-1], amounts[::-1]
+            depth[side] = (prices[:levels], amounts[:levels])
+        return depth
+
+    def cumulative_depth(self, levels: int = None):
+        """Returns `depth` with the amounts accumulated from the best price outwards."""
+        return {side: (prices, np.cumsum(amounts)) for side, (prices, amounts) in self.depth(levels).items()}
+
+    def vwap(self, amount: float, side: str = "buy"):
+        """Returns the volume-weighted average price of filling `amount` coins against the book.
+
+        Args:
+            amount (float): Coin amount to fill.
+            side (str): `buy` to fill against the asks, `sell` to fill against the bids.
+
+        Returns:
+            float: The average price, or None if the book can't fill `amount`.
+        """
+        prices, amounts = self.depth()["sell" if side == "buy" else "buy"]
+        if amount <= 0 or amounts.sum() < amount:
+            return None
+
+        before = np.cumsum(amounts) - amounts
+        filled = np.clip(amount - before, 0, amounts)
+        return float(np.dot(filled, prices) / amount)
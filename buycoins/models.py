@@ -0,0 +1,221 @@
+"""
+Typed response models, returned instead of JSON objects by clients created with `typed=True`.
+
+Numeric fields are parsed once into `Decimal` (amounts and prices) or `int` (timestamps). Each model declares
+`__slots__`, and a map from the GraphQL field names it is built from to its attributes and their parsers.
+"""
+
+from decimal import Decimal
+
+
+def _decimal(value):
+    return Decimal(value if isinstance(value, str) else str(value))
+
+
+def _int(value):
+    return int(value)
+
+
+def _same(value):
+    return value
+
+
+def _field_map(**fields):
+    """Returns the `_fields` map for `attribute=(graphql_name, parser)` pairs."""
+    return {name: (attribute, parser) for attribute, (name, parser) in fields.items()}
+
+
+class Model:
+    """Base class of the response models."""
+
+    __slots__ = ()
+    _fields = {}
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        """Builds the model from a JSON object returned by the API. Missing fields are set to None."""
+        model = cls.__new__(cls)
+        for name, (attribute, parser) in cls._fields.items():
+            value = data.get(name)
+            setattr(model, attribute, None if value is None else parser(value))
+        return model
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(getattr(self, attribute) == getattr(other, attribute) for attribute in self.__slots__)
+
+    def __repr__(self):
+        return "{}({})".format(
+            type(self).__name__,
+            ", ".join("{}={!r}".format(attribute, getattr(self, attribute)) for attribute in self.__slots__),
+        )
+
+
+class Price(Model):
+    __slots__ = (
+        "id",
+        "cryptocurrency",
+        "buy_price_per_coin",
+        "sell_price_per_coin",
+        "min_buy",
+        "max_buy",
+        "min_sell",
+        "max_sell",
+        "min_coin_amount",
+        "status",
+        "expires_at",
+    )
+    _fields = _field_map(
+        id=("id", _same),
+        cryptocurrency=("cryptocurrency", _same),
+        buy_price_per_coin=("buyPricePerCoin", _decimal),
+        sell_price_per_coin=("sellPricePerCoin", _decimal),
+        min_buy=("minBuy", _decimal),
+        max_buy=("maxBuy", _decimal),
+        min_sell=("minSell", _decimal),
+        max_sell=("maxSell", _decimal),
+        min_coin_amount=("minCoinAmount", _decimal),
+        status=("status", _same),
+        expires_at=("expiresAt", _int),
+    )
+
+
+class Order(Model):
+    __slots__ = (
+        "id",
+        "cryptocurrency",
+        "coin_amount",
+        "side",
+        "status",
+        "created_at",
+        "price_per_coin",
+        "price_type",
+        "static_price",
+        "dynamic_exchange_rate",
+    )
+    _fields = _field_map(
+        id=("id", _same),
+        cryptocurrency=("cryptocurrency", _same),
+        coin_amount=("coinAmount", _decimal),
+        side=("side", _same),
+        status=("status", _same),
+        created_at=("createdAt", _int),
+        price_per_coin=("pricePerCoin", _decimal),
+        price_type=("priceType", _same),
+        static_price=("staticPrice", _decimal),
+        dynamic_exchange_rate=("dynamicExchangeRate", _decimal),
+    )
+
+
+def _orders(connection):
+    return [Order.from_dict(edge["node"]) for edge in connection.get("edges") or []]
+
+
+class Orders(Model):
+    """The result of `get_orders`, `get_market_book` and `get_dynamic_price_expiry`."""
+
+    __slots__ = ("dynamic_price_expiry", "orders")
+    _fields = _field_map(
+        dynamic_price_expiry=("dynamicPriceExpiry", _int),
+        orders=("orders", _orders),
+    )
+
+
+class Balance(Model):
+    __slots__ = ("id", "cryptocurrency", "confirmed_balance")
+    _fields = _field_map(
+        id=("id", _same),
+        cryptocurrency=("cryptocurrency", _same),
+        confirmed_balance=("confirmedBalance", _decimal),
+    )
+
+
+class NetworkFee(Model):
+    __slots__ = ("estimated_fee", "total")
+    _fields = _field_map(
+        estimated_fee=("estimatedFee", _decimal),
+        total=("total", _decimal),
+    )
+
+
+class Trade(Model):
+    """The result of `buy_crypto` and `sell_crypto`."""
+
+    __slots__ = ("id", "cryptocurrency", "status", "total_coin_amount", "side")
+    _fields = _field_map(
+        id=("id", _same),
+        cryptocurrency=("cryptocurrency", _same),
+        status=("status", _same),
+        total_coin_amount=("totalCoinAmount", _decimal),
+        side=("side", _same),
+    )
+
+
+class Transaction(Model):
+    __slots__ = ("txhash", "id")
+    _fields = _field_map(
+        txhash=("txhash", _same),
+        id=("id", _same),
+    )
+
+
+class SendResult(Model):
+    __slots__ = ("id", "address", "amount", "cryptocurrency", "fee", "status", "transaction")
+    _fields = _field_map(
+        id=("id", _same),
+        address=("address", _same),
+        amount=("amount", _decimal),
+        cryptocurrency=("cryptocurrency", _same),
+        fee=("fee", _decimal),
+        status=("status", _same),
+        transaction=("transaction", Transaction.from_dict),
+    )
+
+
+class Address(Model):
+    __slots__ = ("cryptocurrency", "address")
+    _fields = _field_map(
+        cryptocurrency=("cryptocurrency", _same),
+        address=("address", _same),
+    )
+
+
+class DepositAccount(Model):
+    __slots__ = ("account_number", "account_name", "account_type", "bank_name", "account_reference")
+    _fields = _field_map(
+        account_number=("accountNumber", _same),
+        account_name=("accountName", _same),
+        account_type=("accountType", _same),
+        bank_name=("bankName", _same),
+        account_reference=("accountReference", _same),
+    )
+
+
+MODELS = {
+    "getPrices": Price,
+    "getOrders": Orders,
+    "getMarketBook": Orders,
+    "postLimitOrder": Order,
+    "postMarketOrder": Order,
+    "getBalances": Balance,
+    "getEstimatedNetworkFee": NetworkFee,
+    "buy": Trade,
+    "sell": Trade,
+    "send": SendResult,
+    "createAddress": Address,
+    "createDepositAccount": DepositAccount,
+}
+
+
+def parse(field: str, data):
+    """Returns the model, or list of models, for the data of the root field `field`.
+
+    Data of fields without a model is returned unchanged.
+    """
+    model = MODELS.get(field)
+    if model is None or data is None:
+        return data
+    if isinstance(data, list):
+        return [model.from_dict(item) for item in data]
+    return model.from_dict(data)
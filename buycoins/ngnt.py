@@ -1,6 +1,6 @@
+from buycoins import queries
 from buycoins.client import BuyCoinsClient
-from buycoins.exceptions import AccountError, ClientError, ServerError
-from buycoins.exceptions.utils import check_response
+from buycoins.exceptions import AccountError
 
 
 class NGNT(BuyCoinsClient):
@@ -19,25 +19,27 @@ class NGNT(BuyCoinsClient):
         try:
             if not account_name:
                 raise AccountError("Invalid account name passed", 400)
+        except AccountError as e:
+            return self._reject(e)
 
-            self.account_name = account_name
-
-            _variables = {"accountName": self.account_name}
-
-            self._query = """
-                mutation createDepositAccount($accountName: String!) {
-                    createDepositAccount(accountName: $accountName) {
-                        accountNumber
-                        accountName
-                        accountType
-                        bankName
-                        accountReference
-                  }
-                }
-            """
-            response = self._execute_request(query=self._query, variables=_variables)
-            check_response(response, AccountError)
-        except (AccountError, ClientError, ServerError) as e:
-            return e.response
-        else:
-            return response["data"]["createDepositAccount"]
+        _variables = {"accountName": account_name}
+
+        return self._perform(queries.CREATE_DEPOSIT_ACCOUNT, _variables, "createDepositAccount", AccountError)
+
+    def create_deposit_accounts(self, names, checkpoint: str = None, batch_size: int = 20, max_workers: int = 4, progress=None):
+        """Creates a virtual deposit account for every name, in concurrent batches, skipping names already created.
+
+        Args:
+            names: Iterable of account names, such as `buycoins.provision.read_names(path)` for a CSV file.
+            checkpoint (str, optional): Path of the append-only file results are recorded in, and read from to resume.
+            batch_size (int): Number of accounts created per request.
+            max_workers (int): Number of requests in flight at once.
+            progress (optional): Function called with the progress stats every few seconds.
+
+        Returns:
+            dict: The created, failed, in doubt and skipped counts, the seconds elapsed and the accounts processed per
+            second.
+        """
+        from buycoins.provision import Provisioner
+
+        return Provisioner(self, checkpoint, batch_size, max_workers, progress=progress).run(names)
@@ -0,0 +1,121 @@
+from bisect import bisect_left, insort
+from collections import namedtuple
+from decimal import Decimal
+
+from buycoins.models import Orders
+
+Delta = namedtuple("Delta", ["added", "removed", "changed"])
+Delta.__doc__ = """The orders added to, removed from and changed in a `LocalOrderBook` by a snapshot."""
+
+
+def _field(order, name: str, attribute: str):
+    return order.get(name) if isinstance(order, dict) else getattr(order, attribute)
+
+
+def _level(order):
+    """Returns the `(cryptocurrency, side)` level and price an order is indexed under."""
+    price = _field(order, "pricePerCoin", "price_per_coin")
+    price = price if isinstance(price, Decimal) else Decimal(str(price))
+    return (_field(order, "cryptocurrency", "cryptocurrency"), _field(order, "side", "side")), price
+
+
+def _orders(snapshot):
+    if isinstance(snapshot, Orders):
+        return snapshot.orders or []
+    if isinstance(snapshot, dict):
+        return (edge["node"] for edge in snapshot["orders"]["edges"])
+    return snapshot
+
+
+class LocalOrderBook:
+    """The LocalOrderBook class keeps a local copy of the market book, updated from successive snapshots.
+
+    Orders are indexed by id, and by price within each `(cryptocurrency, side)` level. Applying a snapshot takes time
+    proportional to its size and the previous book's, and the resulting `Delta` is passed to every subscriber.
+    """
+
+    def __init__(self):
+        self._orders = {}
+        self._levels = {}
+        self._subscribers = []
+
+    def __len__(self):
+        return len(self._orders)
+
+    def __contains__(self, order_id):
+        return order_id in self._orders
+
+    def get(self, order_id: str):
+        """Returns the order with id `order_id`, or None."""
+        return self._orders.get(order_id)
+
+    def subscribe(self, callback):
+        """Registers `callback` to be called with the `Delta` of every snapshot that changes the book.
+
+        Returns:
+            callable: Unregisters the callback.
+        """
+        self._subscribers.append(callback)
+        return lambda: self._subscribers.remove(callback)
+
+    def apply(self, snapshot):
+        """Replaces the book with `snapshot` and returns what changed.
+
+        Args:
+            snapshot: The result of `P2P.get_market_book`, typed or not, or an iterable of orders such as
+                `P2P.iter_market_book`.
+
+        Returns:
+            Delta: The added, removed and changed orders.
+        """
+        added, changed = [], []
+        seen = set()
+
+        for order in _orders(snapshot):
+            order_id = _field(order, "id", "id")
+            seen.add(order_id)
+            previous = self._orders.get(order_id)
+            if previous is None:
+                added.append(order)
+                self._insert(order_id, order)
+            elif previous != order:
+                changed.append(order)
+                self._remove(order_id, previous)
+                self._insert(order_id, order)
+
+        removed = [self._orders[order_id] for order_id in self._orders.keys() - seen]
+        for order in removed:
+            self._remove(_field(order, "id", "id"), order)
+
+        delta = Delta(added, removed, changed)
+        if added or removed or changed:
+            for callback in list(self._subscribers):
+                callback(delta)
+        return delta
+
+    def best_bid(self, currency: str):
+        """Returns the buy order with the highest price for `currency`, or None."""
+        level = self._levels.get((currency, "buy"))
+        return self._orders[level[-1][1]] if level else None
+
+    def best_ask(self, currency: str):
+        """Returns the sell order with the lowest price for `currency`, or None."""
+        level = self._levels.get((currency, "sell"))
+        return self._orders[level[0][1]] if level else None
+
+    def orders(self, currency: str, side: str):
+        """Returns the orders of a level, from the lowest price to the highest."""
+        return [self._orders[order_id] for _, order_id in self._levels.get((currency, side), [])]
+
+    def _insert(self, order_id: str, order):
+        level, price = _level(order)
+        self._orders[order_id] = order
+        insort(self._levels.setdefault(level, []), (price, order_id))
+
+    def _remove(self, order_id: str, order):
+        level, price = _level(order)
+        del self._orders[order_id]
+        entries = self._levels[level]
+        del entries[bisect_left(entries, (price, order_id))]
+        if not entries:
+            del self._levels[level]
@@ -1,6 +1,59 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from buycoins import queries
 from buycoins.client import BuyCoinsClient
-from buycoins.exceptions import P2PError, ClientError, ServerError
+from buycoins.codec import DEFAULT_CHUNK_SIZE
+from buycoins.exceptions import P2PError
 from buycoins.exceptions.utils import check_response
+from buycoins.models import Order, Price
+
+DEFAULT_PAGE_SIZE = 50
+
+
+class Quote:
+    """A price returned by `P2P.quote`, which buy and sell trades can reuse until it expires."""
+
+    __slots__ = ("id", "side", "currency", "price_per_coin", "expires_at", "price")
+
+    def __init__(self, side: str, currency: str, price: dict):
+        """
+
+        Args:
+            side (str): The order side the price is for, `buy` or `sell`.
+            currency (str): The cryptocurrency the price is for.
+            price (dict, Price): The price, as returned by `P2P.get_current_price`.
+        """
+        self.side = side
+        self.currency = currency
+        self.price = price
+        if isinstance(price, Price):
+            self.id = price.id
+            self.price_per_coin = getattr(price, "{}_price_per_coin".format(side))
+            self.expires_at = price.expires_at
+        else:
+            self.id = price["id"]
+            self.price_per_coin = price.get("{}PricePerCoin".format(side))
+            self.expires_at = price.get("expiresAt")
+
+    def __repr__(self):
+        return "Quote(side={!r}, currency={!r}, price_per_coin={!r}, expires_at={!r})".format(
+            self.side, self.currency, self.price_per_coin, self.expires_at
+        )
+
+    @classmethod
+    def _from_response(cls, side: str, currency: str, response):
+        """Returns a quote for a `get_current_price` response, or the response itself if the request failed."""
+        if isinstance(response, list):
+            return cls(side, currency, response[0])
+        if isinstance(response, Price) or (isinstance(response, dict) and "id" in response):
+            return cls(side, currency, response)
+        return response
+
+    def expired(self, margin: float = 1.0):
+        """Returns whether the quote expires within `margin` seconds. Quotes without an expiry are always expired."""
+        return self.expires_at is None or time.time() >= self.expires_at - margin
 
 
 class P2P(BuyCoinsClient):
@@ -9,42 +62,43 @@ class P2P(BuyCoinsClient):
     supported_cryptocurrencies = ["bitcoin", "ethereum", "litecoin", "naira_token", "usd_coin", "usd_tether"]
     side = ["buy", "sell"]
     status = ["open", "completed"]
+    _price_cache = None
+
+    def __init__(self, *args, price_cache=None, **kwargs):
+        """
 
-    def get_prices(self):
+        Args:
+            price_cache (PriceCache, optional): Cache serving `get_prices` and `get_current_price` until the prices
+                expire.
+        """
+        super().__init__(*args, **kwargs)
+        self._price_cache = price_cache
+
+    def get_prices(self, fields: list = None):
         """Returns the current price for supported cryptocurrencies on BuyCoins
 
+        Args:
+            fields (list, optional): Price fields to retrieve, from `queries.PRICE_FIELDS`. Defaults to the id,
+                cryptocurrency, buy prices and expiry.
+
         Returns:
             response: An array of cryptocurrency data.
 
         """
-
         try:
-            self._query = """
-                query {
-                  getPrices {
-                    id
-                    cryptocurrency
-                    buyPricePerCoin
-                    minBuy
-                    maxBuy
-                    expiresAt
-                  }
-                }    
-            """
-
-            response = self._execute_request(query=self._query)
-            check_response(response, P2PError)
-        except (P2PError, ClientError, ServerError) as e:
-            return e.response
-        else:
-            return response["data"]["getPrices"]
+            queries.GET_PRICES.validate(fields, P2PError)
+        except P2PError as e:
+            return self._reject(e)
+
+        return self._perform_cached((None, None), queries.GET_PRICES, {}, fields)
 
-    def get_current_price(self, order_side: str = "buy", currency: str = "bitcoin"):
+    def get_current_price(self, order_side: str = "buy", currency: str = "bitcoin", fields: list = None):
         """Retrieves the current `side` price for the supplied cryptocurrency.
 
         Args:
             order_side (str):  The order side which can either be buy or sell.
             currency (str): The cryptocurrency whose current price is to be retrieved.
+            fields (list, optional): Price fields to retrieve, from `queries.PRICE_FIELDS`. Defaults to all of them.
 
         Returns:
             response: A JSON object containing response from the request.
@@ -56,31 +110,39 @@ class P2P(BuyCoinsClient):
             if order_side not in self.side:
                 raise P2PError("Invalid order side", 400)
 
-            self._query = """
-                query GetBuyCoinsPrices($side: OrderSide, $currency: Cryptocurrency) {
-                  getPrices(side: $side, cryptocurrency: $currency){
-                    buyPricePerCoin
-                    cryptocurrency
-                    id
-                    maxBuy
-                    maxSell
-                    minBuy
-                    minCoinAmount
-                    minSell
-                    sellPricePerCoin
-                    status
-                  }
-                }
-            """
-
-            _variables = {"side": order_side, "currency": currency}
-
-            response = self._execute_request(query=self._query, variables=_variables)
-            check_response(response, P2PError)
-        except (P2PError, ClientError, ServerError) as e:
-            return e.response
-        else:
-            return response["data"]["getPrices"]
+            queries.GET_CURRENT_PRICE.validate(fields, P2PError)
+        except P2PError as e:
+            return self._reject(e)
+
+        _variables = {"side": order_side, "currency": currency}
+
+        return self._perform_cached((order_side, currency), queries.GET_CURRENT_PRICE, _variables, fields)
+
+    def quote(self, order_side: str = "buy", currency: str = "bitcoin"):
+        """Retrieves the current `side` price for the supplied cryptocurrency as a reusable quote.
+
+        Args:
+            order_side (str):  The order side which can either be buy or sell.
+            currency (str): The cryptocurrency whose current price is to be retrieved.
+
+        Returns:
+            Quote: The price and its expiry, or a JSON object containing the error if the request failed.
+        """
+        return Quote._from_response(order_side, currency, self.get_current_price(order_side, currency))
+
+    def _perform_cached(self, key: tuple, selection: queries.Selection, variables: dict, fields: list = None):
+        """Executes a `getPrices` query, serving it from the price cache when one is configured.
+
+        Cached selections always include `expiresAt`, and are cached apart from other selections of the same price,
+        and from the results of clients that aren't typed the same way.
+        """
+        if self._price_cache is None:
+            return self._perform(selection.select(fields), variables, "getPrices", P2PError)
+        key += (self._typed,)
+        if fields is not None:
+            fields = frozenset(fields) | {"expiresAt"}
+            key += (fields,)
+        return self._price_cache.get(key, partial(self._perform, selection.select(fields), variables, "getPrices", P2PError))
 
     def get_dynamic_price_expiry(self, status: str = "open", side: str = "buy", currency: str = "bitcoin"):
         """Retrieves the dynamic prices for available cryptocurrencies.
@@ -103,27 +165,16 @@ class P2P(BuyCoinsClient):
 
             if currency not in self.supported_cryptocurrencies:
                 raise P2PError("Invalid or unsupported cryptocurrency", 400)
+        except P2PError as e:
+            return self._reject(e)
 
-            self._query = """
-                query GetOrders($status: GetOrdersStatus!){
-                    getOrders(status: $status) {
-                        dynamicPriceExpiry    
-                    }
-                }
-            """
-
-            _variables = {
-                "status": status,
-            }
-
-            response = self._execute_request(query=self._query, variables=_variables)
-            check_response(response, P2PError)
-        except (P2PError, ClientError, ServerError) as e:
-            return e.response
-        else:
-            return response["data"]["getOrders"]
+        _variables = {
+            "status": status,
+        }
+
+        return self._perform(queries.GET_DYNAMIC_PRICE_EXPIRY, _variables, "getOrders", P2PError)
 
-    def place_limit_order(self, order_side: str = "buy", coin_amount: float = 0.01, currency: str = "bitcoin", static_price: int = 100000, price_type: str = "static"):
+    def place_limit_order(self, order_side: str = "buy", coin_amount: float = 0.01, currency: str = "bitcoin", static_price: int = 100000, price_type: str = "static", idempotency_key: str = None):
         """Places limit order for the supplied cryptocurrency.
 
         Args:
@@ -132,6 +183,7 @@ class P2P(BuyCoinsClient):
             currency (str): The cryptocurrency involved in the limit order.
             static_price (str, optional): Static price for the cryptocurrency in Naira.
             price_type (str): Static or dynamic price for the cryptocurrency.
+            idempotency_key (str, optional): Key identifying this order, allowing it to be retried safely.
 
         Returns:
             response: A JSON object containing the result from the request.
@@ -144,40 +196,21 @@ class P2P(BuyCoinsClient):
 
             if currency not in self.supported_cryptocurrencies:
                 raise P2PError("Invalid or unsupported cryptocurrency", 400)
+        except P2PError as e:
+            return self._reject(e)
 
-            self._query = """
-                mutation PostLimitOrder($orderSide: OrderSide!, $coinAmount: BigDecimal!, $cryptocurrency: Cryptocurrency, $staticPrice: BigDecimal, $priceType: PriceType!){
-                    postLimitOrder(orderSide: $orderSide, coinAmount: $coinAmount, cryptocurrency: $cryptocurrency, staticPrice: $staticPrice, priceType: $priceType) {
-                        id
-                        cryptocurrency
-                        coinAmount
-                        side
-                        status 
-                        createdAt
-                        pricePerCoin
-                        priceType
-                        staticPrice
-                        dynamicExchangeRate
-                    }
-                }
-           """
-
-            _variables = {"orderSide": order_side, "coinAmount": coin_amount, "cryptocurrency": currency, "staticPrice": static_price, "priceType": price_type}
-
-            response = self._execute_request(query=self._query, variables=_variables)
-            check_response(response, P2PError)
-        except (P2PError, ClientError, ServerError) as e:
-            return e.response
-        else:
-            return response["data"]["postLimitOrder"]
+        _variables = {"orderSide": order_side, "coinAmount": coin_amount, "cryptocurrency": currency, "staticPrice": static_price, "priceType": price_type}
+
+        return self._perform(queries.POST_LIMIT_ORDER, _variables, "postLimitOrder", P2PError, idempotency_key)
 
-    def post_market_order(self, order_side: str = "buy", coin_amount: float = 0.01, currency: str = "bitcoin"):
+    def post_market_order(self, order_side: str = "buy", coin_amount: float = 0.01, currency: str = "bitcoin", idempotency_key: str = None):
         """Posts a market order for the supplied cryptocurrency.
 
         Args:
             order_side (str): The type of order to be placed. It could either be `buy` or `sell`.
             coin_amount (float): Amount of coin to be sold.
             currency (str): Cryptocurrency involved in the market order.
+            idempotency_key (str, optional): Key identifying this order, allowing it to be retried safely.
 
         Returns:
             response: A JSON object containing the response from the request.
@@ -190,42 +223,23 @@ class P2P(BuyCoinsClient):
 
             if currency not in self.supported_cryptocurrencies:
                 raise P2PError("Invalid or unsupported cryptocurrency", 400)
+        except P2PError as e:
+            return self._reject(e)
 
-            self._query = """
-                mutation PostMarketOrder($orderSide: OrderSide!, $coinAmount: BigDecimal!, $cryptocurrency: Cryptocurrency){
-                    postMarketOrder(orderSide: $orderSide, coinAmount: $coinAmount, cryptocurrency: $cryptocurrency){
-                        id
-                        cryptocurrency
-                        coinAmount
-                        side
-                        status 
-                        createdAt
-                        pricePerCoin
-                        priceType
-                        staticPrice
-                        dynamicExchangeRate
-                    }
-                }
-            """
-
-            _variables = {
-                "orderSide": order_side,
-                "coinAmount": coin_amount,
-                "cryptocurrency": currency,
-            }
-
-            response = self._execute_request(query=self._query, variables=_variables)
-            check_response(response, P2PError)
-        except (P2PError, ClientError, ServerError) as e:
-            return e.response
-        else:
-            return response["data"]["postMarketOrder"]
+        _variables = {
+            "orderSide": order_side,
+            "coinAmount": coin_amount,
+            "cryptocurrency": currency,
+        }
+
+        return self._perform(queries.POST_MARKET_ORDER, _variables, "postMarketOrder", P2PError, idempotency_key)
 
-    def get_orders(self, status: str = "open"):
+    def get_orders(self, status: str = "open", fields: list = None):
         """Retrieves orders based on their status.
 
         Args:
             status (str): Status of the order which could either be `open` or `completed`.
+            fields (list, optional): Order fields to retrieve, from `queries.ORDER_FIELDS`. Defaults to all of them.
 
         Returns:
             response: A JSON object containing the response from the request.
@@ -235,74 +249,148 @@ class P2P(BuyCoinsClient):
             if status not in self.status:
                 raise P2PError("Invalid status passed", 400)
 
-            self._query = """
-                query GetOrders($status: GetOrdersStatus!){
-                    getOrders(status: $status) {
-                        dynamicPriceExpiry
-                        orders {
-                          edges {
-                            node {
-                              id
-                              cryptocurrency
-                              coinAmount
-                              side
-                              status
-                              createdAt
-                              pricePerCoin
-                              priceType
-                              staticPrice
-                              dynamicExchangeRate
-                            }
-                          }
-                        }
-                    }
-                }
-            """
-
-            _variables = {"status": status}
-
-            response = self._execute_request(query=self._query, variables=_variables)
-            check_response(response, P2PError)
-        except (P2PError, ClientError, ServerError) as e:
-            return e.response
-        else:
-            return response["data"]["getOrders"]
+            queries.GET_ORDERS.validate(fields, P2PError)
+        except P2PError as e:
+            return self._reject(e)
 
-    def get_market_book(self):
+        _variables = {"status": status}
+
+        return self._perform(queries.GET_ORDERS.select(fields), _variables, "getOrders", P2PError)
+
+    def get_market_book(self, fields: list = None):
         """Retrieves market history.
 
+        Args:
+            fields (list, optional): Order fields to retrieve, from `queries.ORDER_FIELDS`. Defaults to all of them.
+
         Returns:
             response: A JSON object containing response from the request.
 
         """
+        try:
+            queries.GET_MARKET_BOOK.validate(fields, P2PError)
+        except P2PError as e:
+            return self._reject(e)
+
+        return self._perform(queries.GET_MARKET_BOOK.select(fields), {}, "getMarketBook", P2PError)
+
+    def iter_orders(self, status: str = "open", page_size: int = DEFAULT_PAGE_SIZE, prefetch: bool = False, fields: list = None):
+        """Yields orders based on their status, fetching them page by page.
+
+        Args:
+            status (str): Status of the order which could either be `open` or `completed`.
+            page_size (int): Number of orders fetched per request.
+            prefetch (bool): Whether the next page is fetched while the current one is being consumed.
+            fields (list, optional): Order fields to retrieve, from `queries.ORDER_FIELDS`. Defaults to all of them.
+
+        Yields:
+            order: A JSON object containing an order, or an `Order` when the client is typed.
+
+        Raises:
+            P2PError, ClientError, ServerError: If the status or fields are invalid or a request fails.
+        """
+        if status not in self.status:
+            raise P2PError("Invalid status passed", 400)
+        queries.ITER_ORDERS.validate(fields, P2PError)
+
+        return self._iter_pages(queries.ITER_ORDERS.select(fields), {"status": status}, "getOrders", page_size, prefetch)
+
+    def iter_market_book(self, page_size: int = DEFAULT_PAGE_SIZE, prefetch: bool = False, fields: list = None):
+        """Yields the orders in the market book, fetching them page by page.
+
+        Args:
+            page_size (int): Number of orders fetched per request.
+            prefetch (bool): Whether the next page is fetched while the current one is being consumed.
+            fields (list, optional): Order fields to retrieve, from `queries.ORDER_FIELDS`. Defaults to all of them.
+
+        Yields:
+            order: A JSON object containing an order, or an `Order` when the client is typed.
+
+        Raises:
+            P2PError, ClientError, ServerError: If the fields are invalid or a request fails.
+        """
+        queries.ITER_MARKET_BOOK.validate(fields, P2PError)
+
+        return self._iter_pages(queries.ITER_MARKET_BOOK.select(fields), {}, "getMarketBook", page_size, prefetch)
+
+    def stream_orders(self, status: str = "open", fields: list = None, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        """Yields orders based on their status while the response is still arriving.
+
+        Orders are decoded one at a time as the body is received, so the whole response is never held in memory.
+
+        Args:
+            status (str): Status of the order which could either be `open` or `completed`.
+            fields (list, optional): Order fields to retrieve, from `queries.ORDER_FIELDS`. Defaults to all of them.
+            chunk_size (int): Number of bytes read from the response at a time.
+
+        Yields:
+            order: A JSON object containing an order, or an `Order` when the client is typed.
+
+        Raises:
+            P2PError, ClientError, ServerError: If the status or fields are invalid or the request fails.
+        """
+        if status not in self.status:
+            raise P2PError("Invalid status passed", 400)
+        queries.GET_ORDERS.validate(fields, P2PError)
 
+        return self._stream_orders(queries.GET_ORDERS.select(fields), {"status": status}, chunk_size)
+
+    def stream_market_book(self, fields: list = None, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        """Yields the orders in the market book while the response is still arriving.
+
+        Orders are decoded one at a time as the body is received, so the whole response is never held in memory.
+
+        Args:
+            fields (list, optional): Order fields to retrieve, from `queries.ORDER_FIELDS`. Defaults to all of them.
+            chunk_size (int): Number of bytes read from the response at a time.
+
+        Yields:
+            order: A JSON object containing an order, or an `Order` when the client is typed.
+
+        Raises:
+            P2PError, ClientError, ServerError: If the fields are invalid or the request fails.
+        """
+        queries.GET_MARKET_BOOK.validate(fields, P2PError)
+
+        return self._stream_orders(queries.GET_MARKET_BOOK.select(fields), {}, chunk_size)
+
+    def _stream_orders(self, query: str, variables: dict, chunk_size: int):
+        stream = self._stream(query, variables, chunk_size)
+        try:
+            for node in stream:
+                yield Order.from_dict(node) if self._typed else node
+        finally:
+            # Also runs when the caller stops early, so the connection goes back to the pool.
+            stream.close()
+        check_response(stream.document, P2PError)
+
+    def _fetch_page(self, query: str, variables: dict, field: str):
+        response = self._execute_request(query=query, variables=variables)
+        check_response(response, P2PError)
+        return response["data"][field]["orders"]
+
+    def _iter_pages(self, query: str, variables: dict, field: str, page_size: int, prefetch: bool):
+        """Follows the `orders` connection cursors of `query`, yielding each order node."""
+        executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
         try:
-            self._query = """
-                query {
-                  getMarketBook {
-                    dynamicPriceExpiry
-                    orders {
-                      edges {
-                        node {
-                          id
-                          cryptocurrency
-                          coinAmount
-                          side
-                          status 
-                          createdAt
-                          pricePerCoin
-                          priceType
-                          staticPrice
-                          dynamicExchangeRate
-                        }
-                      }
-                    }
-                  }
-                }
-            """
-
-            response = self._execute_request(query=self._query)
-            check_response(response, P2PError)
-        except (P2PError, ClientError, ServerError) as e:
-            return e.response
-        return response["data"]["getMarketBook"]
+            page = self._fetch_page(query, dict(variables, first=page_size, after=None), field)
+            while True:
+                page_info = page.get("pageInfo") or {}
+                cursor = page_info.get("endCursor") if page_info.get("hasNextPage") else None
+
+                following = None
+                if cursor and executor is not None:
+                    following = executor.submit(self._fetch_page, query, dict(variables, first=page_size, after=cursor), field)
+
+                for edge in page["edges"]:
+                    yield Order.from_dict(edge["node"]) if self._typed else edge["node"]
+
+                if not cursor:
+                    return
+                if following is not None:
+                    page = following.result()
+                else:
+                    page = self._fetch_page(query, dict(variables, first=page_size, after=cursor), field)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False)
@@ -0,0 +1,322 @@
+import csv
+import hashlib
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from decimal import Decimal, InvalidOperation
+
+from buycoins import models
+from buycoins.exceptions import WalletError
+from buycoins.journal import JournalFile
+from buycoins.wallet import Wallet
+
+DEFAULT_BATCH_SIZE = 20
+DEFAULT_MAX_CONCURRENCY = 2
+
+SENT = "sent"
+FAILED = "failed"
+IN_DOUBT = "in_doubt"
+SKIPPED = "skipped"
+
+_SENDING = "sending"
+
+logger = logging.getLogger(__name__)
+
+
+class Payout:
+    """A transfer of `amount` of `currency` to `address`.
+
+    Its `id` identifies it in the journal, and is sent as the idempotency key of the transfer if the `PayoutEngine`
+    is told to. It defaults to a hash of
+    the transfer and the number of identical transfers before it in the same input, so the same input gives the same
+    ids on every run.
+    """
+
+    __slots__ = ("address", "currency", "amount", "id")
+
+    def __init__(self, address: str, currency: str, amount, id: str = None):
+        self.address = address
+        self.currency = currency
+        self.amount = amount
+        self.id = id
+
+    def __repr__(self):
+        return "Payout({!r}, {!r}, {!r}, id={!r})".format(self.address, self.currency, self.amount, self.id)
+
+
+class PayoutResult:
+    """The outcome of a payout.
+
+    `status` is `SENT`, `FAILED` when it was rejected before or by the API and can be tried again, `IN_DOUBT` when the
+    request failed in a way that may have let the transfer through, or `SKIPPED` when the journal shows it was sent
+    or is in doubt already. `response` is the response of `send_crypto`, or of the check that rejected the payout,
+    and `latency` the seconds `send_crypto` took, or None if it wasn't called.
+    """
+
+    __slots__ = ("payout", "status", "response", "fee", "latency")
+
+    def __init__(self, payout: Payout, status: str, response=None, fee=None, latency: float = None):
+        self.payout = payout
+        self.status = status
+        self.response = response
+        self.fee = fee
+        self.latency = latency
+
+    def __repr__(self):
+        return "PayoutResult({!r}, {!r})".format(self.payout, self.status)
+
+
+def read_payouts(path: str, address: str = "address", currency: str = "currency", amount: str = "amount", id: str = None, encoding: str = "utf-8"):
+    """Yields the payouts of a CSV file with a header row, one row at a time.
+
+    Args:
+        path (str): Path of the CSV file.
+        address (str): Header of the address column.
+        currency (str): Header of the currency column.
+        amount (str): Header of the amount column.
+        id (str, optional): Header of a column holding payout ids. Defaults to ids derived from the rows.
+        encoding (str): Encoding of the file.
+    """
+    with open(path, newline="", encoding=encoding) as file:
+        for row in csv.DictReader(file):
+            yield Payout(row[address].strip(), row[currency].strip(), row[amount].strip(), row[id] if id else None)
+
+
+class PayoutEngine:
+    """The PayoutEngine class sends many payouts with `Wallet.send_crypto`, never sending one twice.
+
+    Payouts are read lazily, `batch_size` at a time. Each batch is validated locally, and the network fees of its
+    payouts are estimated with one aliased `getEstimatedNetworkFee` document; payouts the API rejects, or whose fee is
+    over `max_fee`, are not sent. The rest are sent on one thread pool per currency, `max_concurrency` at a time.
+
+    Every payout is recorded in the write-ahead journal, and synced to disk, before it is sent, and again once it is
+    answered. On the next run, payouts sent or in doubt in the journal are skipped; in-doubt payouts, including ones
+    whose run stopped while they were being sent, must be reconciled by hand. Failed ones are tried again.
+    """
+
+    def __init__(self, wallet: Wallet = None, journal: str = None, batch_size: int = DEFAULT_BATCH_SIZE, max_concurrency: int = DEFAULT_MAX_CONCURRENCY, max_fee: dict = None, estimate_fees: bool = True, fsync: bool = True, idempotency_keys: bool = False):
+        """
+
+        Args:
+            wallet (Wallet, optional): Client the payouts are sent with. Defaults to a new `Wallet` client.
+            journal (str, optional): Path of the write-ahead journal. Defaults to none, payouts then being sent with
+                no protection against resending them on another run.
+            batch_size (int): Number of payouts validated and estimated per request.
+            max_concurrency (int): Number of transfers of each currency in flight at once.
+            max_fee (dict, optional): Highest estimated fee accepted for each currency. Defaults to no limit.
+            estimate_fees (bool): Whether fees are estimated before sending.
+            fsync (bool): Whether journal records are synced to disk before the transfer they record is sent.
+            idempotency_keys (bool): Whether payout ids are sent as idempotency keys. Only enable it if the API
+                deduplicates transfers by key: it lets the wallet's `RetryPolicy` send a transfer again after a
+                failure that may have let it through, which is otherwise reported as in doubt.
+        """
+        self.wallet = wallet if wallet is not None else Wallet(pool_size=max(max_concurrency * 2, 10))
+        self.journal = journal
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.max_fee = max_fee or {}
+        self.estimate_fees = estimate_fees
+        self.fsync = fsync
+        self.idempotency_keys = idempotency_keys
+        self._file = JournalFile(journal)
+        self._lock = threading.Lock()
+        self._states = {record["id"]: record["state"] for record in self._file.records()}
+        self._counters = dict.fromkeys((SENT, FAILED, IN_DOUBT, SKIPPED), 0)
+        self._sends = 0
+        self._latency = 0.0
+        self._max_latency = 0.0
+        self._started_at = None
+
+    def state(self, payout_id: str):
+        """Returns the last journaled state of a payout: `SENT`, `FAILED`, `IN_DOUBT`, "sending" or None."""
+        return self._states.get(payout_id)
+
+    def stats(self):
+        """Returns the count of each result status, the seconds elapsed, the payouts sent per second and the mean and
+        maximum seconds spent sending one."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["mean_latency"] = self._latency / self._sends if self._sends else 0.0
+            stats["max_latency"] = self._max_latency
+        elapsed = time.monotonic() - self._started_at if self._started_at is not None else 0.0
+        stats["elapsed"] = elapsed
+        stats["throughput"] = stats[SENT] / elapsed if elapsed else 0.0
+        return stats
+
+    def process(self, payouts):
+        """Sends every payout not sent yet, yielding a `PayoutResult` for each of them as they complete.
+
+        Args:
+            payouts: Iterable of `Payout` objects or `(address, currency, amount)` tuples, such as `read_payouts`.
+        """
+        self._started_at = time.monotonic()
+        executors, pending = {}, set()
+        with self._file:
+            try:
+                for batch in self._batches(payouts):
+                    for payout, estimate in batch.items():
+                        result, fee = self._check(payout, estimate)
+                        if result is not None:
+                            yield self._finish(result)
+                            continue
+                        executor = executors.get(payout.currency)
+                        if executor is None:
+                            executor = executors[payout.currency] = ThreadPoolExecutor(
+                                max_workers=self.max_concurrency, thread_name_prefix="buycoins-payouts-" + payout.currency,
+                            )
+                        pending.add(executor.submit(self._send, payout, fee))
+                    # Bound the payouts read ahead of those being sent.
+                    while len(pending) > self.max_concurrency * max(len(executors), 1) * 2:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            yield self._finish(future.result())
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield self._finish(future.result())
+            finally:
+                for executor in executors.values():
+                    executor.shutdown()
+        stats = self.stats()
+        logger.info(
+            "Sent %d payouts (%d failed, %d in doubt, %d skipped) in %.1fs, %.1f/s",
+            stats[SENT], stats[FAILED], stats[IN_DOUBT], stats[SKIPPED], stats["elapsed"], stats["throughput"],
+        )
+
+    def run(self, payouts):
+        """Sends every payout not sent yet and returns the final `stats()`."""
+        for _ in self.process(payouts):
+            pass
+        return self.stats()
+
+    def _batches(self, payouts):
+        """Yields dicts of up to `batch_size` payouts, each mapped to its fee estimate or to the error rejecting it."""
+        occurrences = Counter()
+        batch = []
+        for payout in payouts:
+            if not isinstance(payout, Payout):
+                payout = Payout(*payout)
+            if payout.id is None:
+                key = "{}:{}:{}".format(payout.address, payout.currency, payout.amount)
+                occurrences[key] += 1
+                payout.id = "{}-{}".format(hashlib.sha256(key.encode("utf-8")).hexdigest()[:32], occurrences[key])
+            batch.append(payout)
+            if len(batch) == self.batch_size:
+                yield self._estimate(batch)
+                batch = []
+        if batch:
+            yield self._estimate(batch)
+
+    def _estimate(self, payouts: list):
+        estimates = {}
+        checked = []
+        for payout in payouts:
+            error = self._validate(payout)
+            if error is not None:
+                estimates[payout] = error
+            elif self._states.get(payout.id) in (SENT, IN_DOUBT, _SENDING):
+                estimates[payout] = None
+            else:
+                checked.append(payout)
+
+        if not self.estimate_fees or not checked:
+            estimates.update((payout, None) for payout in checked)
+            return estimates
+
+        # Payouts of the same currency and amount share one estimate.
+        with self.wallet.batch() as batch:
+            fees = {}
+            for payout in checked:
+                key = (payout.currency, str(payout.amount))
+                if key not in fees:
+                    fees[key] = batch.wallet.get_network_fee(payout.currency, key[1])
+        for payout in checked:
+            estimates[payout] = fees[(payout.currency, str(payout.amount))].result()
+        return estimates
+
+    def _validate(self, payout: Payout):
+        try:
+            if payout.currency not in Wallet.supported_cryptocurrencies:
+                raise WalletError("Invalid or unsupported cryptocurrency", 400)
+            if not payout.address:
+                raise WalletError("Invalid address", 400)
+            try:
+                amount = Decimal(str(payout.amount))
+            except InvalidOperation:
+                amount = None
+            if amount is None or not amount.is_finite() or amount <= 0:
+                raise WalletError("Invalid amount", 400)
+        except WalletError as e:
+            return e.response
+        return None
+
+    def _check(self, payout: Payout, estimate):
+        """Returns the result of a payout that won't be sent, or None, and its estimated fee."""
+        if self._states.get(payout.id) in (SENT, IN_DOUBT, _SENDING):
+            return PayoutResult(payout, SKIPPED), None
+        if _is_error(estimate):
+            self._journal(payout, FAILED, estimate)
+            return PayoutResult(payout, FAILED, estimate), None
+
+        fee = None
+        if estimate is not None:
+            fee = estimate.estimated_fee if isinstance(estimate, models.NetworkFee) else estimate.get("estimatedFee")
+            limit = self.max_fee.get(payout.currency)
+            if limit is not None and fee is not None and Decimal(str(fee)) > Decimal(str(limit)):
+                response = WalletError("Estimated fee {} is over the limit of {}".format(fee, limit), 400).response
+                self._journal(payout, FAILED, response)
+                return PayoutResult(payout, FAILED, response, fee), fee
+        return None, fee
+
+    def _send(self, payout: Payout, fee):
+        self._journal(payout, _SENDING)
+        started = time.monotonic()
+        # Without an idempotency key the transfer is never retried, so a failure that may have let it through is seen.
+        idempotency_key = payout.id if self.idempotency_keys else None
+        # Amounts are sent as BigDecimal strings, which neither loses precision nor trips the codecs over decimals.
+        response = self.wallet.send_crypto(payout.address, payout.currency, str(payout.amount), idempotency_key=idempotency_key)
+        latency = time.monotonic() - started
+
+        if not _is_error(response):
+            status = SENT
+        elif response.get("name") == "ServerError":
+            # Connection failures and 5xx responses may come after the transfer went through.
+            status = IN_DOUBT
+        else:
+            status = FAILED
+        self._journal(payout, status, response)
+        return PayoutResult(payout, status, response, fee, latency)
+
+    def _journal(self, payout: Payout, state: str, response=None):
+        record = {"id": payout.id, "state": state, "address": payout.address, "currency": payout.currency, "amount": str(payout.amount)}
+        if response is not None:
+            record["response"] = _plain(response)
+        with self._lock:
+            self._states[payout.id] = state
+            self._file.append(record, sync=self.fsync and state == _SENDING)
+
+    def _finish(self, result: PayoutResult):
+        with self._lock:
+            self._counters[result.status] += 1
+            if result.latency is not None:
+                self._sends += 1
+                self._latency += result.latency
+                self._max_latency = max(self._max_latency, result.latency)
+        if result.status == IN_DOUBT:
+            logger.warning("Payout %s may have been sent: %s", result.payout.id, result.response)
+        return result
+
+
+def _plain(value):
+    """Returns `value` with its models turned back into JSON objects and its decimals into strings."""
+    if isinstance(value, models.Model):
+        return {field: _plain(getattr(value, attribute)) for field, (attribute, _) in value._fields.items()}
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _is_error(response):
+    return isinstance(response, dict) and response.get("status") == "error"
@@ -0,0 +1,249 @@
+import asyncio
+import inspect
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from buycoins.client import DEFAULT_POOL_SIZE
+from buycoins.ngnt import NGNT
+from buycoins.p2p import P2P
+from buycoins.ratelimit import RequestScheduler, TokenBucket
+from buycoins.wallet import Wallet
+
+DEFAULT_MAX_CONCURRENCY = 4
+
+_ASYNC_OPTIONS = ("pool_size", "typed", "persisted_queries", "json_codec")
+
+
+class Account:
+    """The clients of one account of a `ClientPool`.
+
+    The `p2p`, `wallet` and `ngnt` clients, and their asyncio counterparts, are created on first use. They share the
+    account's connection pool, request scheduler and cap on requests in flight, which holds for calls made directly
+    on them as well as through `ClientPool.map`.
+    """
+
+    def __init__(self, name: str, auth_key: str, scheduler=None, max_concurrency: int = DEFAULT_MAX_CONCURRENCY, **options):
+        """
+
+        Args:
+            name (str): Name the account's results are keyed by.
+            auth_key (str): The `public key:private key` pair of the account.
+            scheduler (RequestScheduler, optional): Scheduler the account's requests wait on.
+            max_concurrency (int): Maximum number of calls and requests in flight for the account at once.
+            **options: Other arguments for the account's clients. Only `pool_size`, `typed`, `persisted_queries` and
+                `json_codec` are passed to the asyncio clients.
+        """
+        self.name = name
+        self.auth_key = auth_key
+        self.scheduler = scheduler
+        self.max_concurrency = max_concurrency
+        self._options = options
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._async_semaphores = {}
+
+    def __repr__(self):
+        return "Account({!r})".format(self.name)
+
+    def _client(self, cls, asynchronous: bool = False):
+        with self._lock:
+            client = self._clients.get(cls)
+            if client is None:
+                if asynchronous:
+                    options = {name: value for name, value in self._options.items() if name in _ASYNC_OPTIONS}
+                    client = cls(auth_key=self.auth_key, scheduler=self.scheduler, max_concurrency=self.max_concurrency, **options)
+                else:
+                    options = dict(self._options, pool_size=max(self.max_concurrency, self._options.get("pool_size", DEFAULT_POOL_SIZE)))
+                    client = cls(auth_key=self.auth_key, scheduler=self.scheduler, max_concurrency=self.max_concurrency, **options)
+                self._clients[cls] = client
+            return client
+
+    @property
+    def p2p(self):
+        return self._client(P2P)
+
+    @property
+    def wallet(self):
+        return self._client(Wallet)
+
+    @property
+    def ngnt(self):
+        return self._client(NGNT)
+
+    @property
+    def async_p2p(self):
+        from buycoins.aio import AsyncP2P
+
+        return self._client(AsyncP2P, asynchronous=True)
+
+    @property
+    def async_wallet(self):
+        from buycoins.aio import AsyncWallet
+
+        return self._client(AsyncWallet, asynchronous=True)
+
+    @property
+    def async_ngnt(self):
+        from buycoins.aio import AsyncNGNT
+
+        return self._client(AsyncNGNT, asynchronous=True)
+
+    def _async_semaphore(self):
+        loop = asyncio.get_running_loop()
+        semaphore = self._async_semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._async_semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+
+    def close(self):
+        """Closes the account's blocking clients."""
+        with self._lock:
+            clients = [client for client in self._clients.values() if not inspect.iscoroutinefunction(client.close)]
+            for client in clients:
+                client.close()
+                del self._clients[type(client)]
+
+    async def aclose(self):
+        """Closes the account's asyncio clients."""
+        with self._lock:
+            clients = [client for client in self._clients.values() if inspect.iscoroutinefunction(client.close)]
+            for client in clients:
+                del self._clients[type(client)]
+        for client in clients:
+            await client.close()
+
+
+class ClientPool:
+    """The ClientPool class holds the clients of many BuyCoins accounts, keyed by account.
+
+    Each account gets its own keep-alive connection pool, request rate budget and cap on calls in flight, so a busy
+    account can't starve the others. `map` and `amap` run a function against every account in parallel, on threads
+    or on the running event loop, and return the results keyed by account name.
+    """
+
+    def __init__(self, accounts, rate: float = None, capacity: float = None, bucket=None, max_concurrency: int = DEFAULT_MAX_CONCURRENCY, **options):
+        """
+
+        Args:
+            accounts (dict, iterable): Account names mapped to their `public key:private key` pairs, or the pairs
+                alone, each account then being named by its public key.
+            rate (float, optional): Requests per second allowed for each account. Defaults to no limit.
+            capacity (float, optional): Burst size of each account's budget. Defaults to `rate`.
+            bucket (optional): Function returning the token bucket of an account, given its name, for budgets shared
+                with other processes such as `FileTokenBucket`. Overrides `rate` and `capacity`.
+            max_concurrency (int): Maximum number of calls and requests in flight for each account at once.
+            **options: Other arguments for every account's clients, such as `typed` or `retry`.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.bucket = bucket
+        self.max_concurrency = max_concurrency
+        self._options = options
+        self._accounts = {}
+
+        if not isinstance(accounts, dict):
+            accounts = {auth_key.split(":")[0]: auth_key for auth_key in accounts}
+        for name, auth_key in accounts.items():
+            self.add(name, auth_key)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    def __getitem__(self, name: str):
+        return self._accounts[name]
+
+    def __iter__(self):
+        return iter(self._accounts.values())
+
+    def __len__(self):
+        return len(self._accounts)
+
+    def __contains__(self, name: str):
+        return name in self._accounts
+
+    def add(self, name: str, auth_key: str):
+        """Adds an account to the pool and returns it."""
+        if self.bucket is not None:
+            scheduler = RequestScheduler(self.bucket(name))
+        elif self.rate is not None:
+            scheduler = RequestScheduler(TokenBucket(self.rate, self.capacity))
+        else:
+            scheduler = None
+        account = self._accounts[name] = Account(name, auth_key, scheduler, self.max_concurrency, **self._options)
+        return account
+
+    def map(self, fn, accounts=None, max_workers: int = None, return_exceptions: bool = False):
+        """Calls `fn(account)` for every account on a thread pool.
+
+        Args:
+            fn: Function called with an `Account`.
+            accounts (iterable, optional): Names of the accounts to call `fn` for. Defaults to all of them.
+            max_workers (int, optional): Number of threads. Defaults to one per account.
+            return_exceptions (bool): Whether exceptions raised by `fn` are returned as results instead of raised.
+
+        Returns:
+            dict: The result of `fn` for each account name, in the order of the accounts.
+        """
+        selected = self._select(accounts)
+        if not selected:
+            return {}
+
+        def call(account):
+            with account._semaphore:
+                return fn(account)
+
+        with ThreadPoolExecutor(max_workers=max_workers or len(selected), thread_name_prefix="buycoins-pool") as executor:
+            futures = {account.name: executor.submit(call, account) for account in selected}
+
+        results = {}
+        for name, future in futures.items():
+            error = future.exception()
+            if error is not None and not return_exceptions:
+                raise error
+            results[name] = error if error is not None else future.result()
+        return results
+
+    async def amap(self, fn, accounts=None, return_exceptions: bool = False):
+        """Awaits `fn(account)` for every account concurrently on the running event loop.
+
+        Args:
+            fn: Function called with an `Account` and returning an awaitable, usually using its `async_` clients.
+            accounts (iterable, optional): Names of the accounts to call `fn` for. Defaults to all of them.
+            return_exceptions (bool): Whether exceptions raised by `fn` are returned as results instead of raised.
+
+        Returns:
+            dict: The result of `fn` for each account name, in the order of the accounts.
+        """
+        selected = self._select(accounts)
+
+        async def call(account):
+            async with account._async_semaphore():
+                return await fn(account)
+
+        results = await asyncio.gather(*(call(account) for account in selected), return_exceptions=return_exceptions)
+        return {account.name: result for account, result in zip(selected, results)}
+
+    def _select(self, accounts=None):
+        if accounts is None:
+            return list(self._accounts.values())
+        return [self._accounts[name] for name in accounts]
+
+    def close(self):
+        """Closes the blocking clients of every account."""
+        for account in self._accounts.values():
+            account.close()
+
+    async def aclose(self):
+        """Closes the asyncio clients of every account."""
+        for account in self._accounts.values():
+            await account.aclose()
@@ -0,0 +1,196 @@
+import csv
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from buycoins.journal import JournalFile
+from buycoins.models import Model
+from buycoins.ngnt import NGNT
+
+DEFAULT_BATCH_SIZE = 20
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_REPORT_INTERVAL = 10.0
+
+CREATED = "created"
+FAILED = "failed"
+IN_DOUBT = "in_doubt"
+
+_PENDING = "pending"
+
+logger = logging.getLogger(__name__)
+
+
+def read_names(path: str, column: str = None, encoding: str = "utf-8"):
+    """Yields the account names of a CSV file, one row at a time.
+
+    Args:
+        path (str): Path of the CSV file.
+        column (str, optional): Header of the column holding the names. Defaults to the first column of a file
+            without a header row.
+        encoding (str): Encoding of the file.
+    """
+    with open(path, newline="", encoding=encoding) as file:
+        if column is None:
+            rows = (row[0] for row in csv.reader(file) if row)
+        else:
+            rows = (row.get(column) for row in csv.DictReader(file))
+        for name in rows:
+            name = (name or "").strip()
+            if name:
+                yield name
+
+
+class Provisioner:
+    """The Provisioner class creates NGNT deposit accounts in bulk, resuming where a previous run stopped.
+
+    Names are read lazily from any iterable, such as `read_names`, and sent `batch_size` at a time as one aliased
+    `createDepositAccount` document, with up to `max_workers` documents in flight. Every batch is recorded in the
+    checkpoint file, and synced to disk, before it is sent, and every result is appended as one JSON line as soon as
+    its batch returns, so a run stopped at any point can be started again with the same input.
+
+    `createDepositAccount` is not idempotent, so only names that failed are tried again. Names created, names the API
+    answered with a server error, which may have been created anyway, and names whose run stopped while they were
+    being created are skipped; the last two are in doubt and must be checked by hand.
+    """
+
+    def __init__(self, client: NGNT = None, checkpoint: str = None, batch_size: int = DEFAULT_BATCH_SIZE, max_workers: int = DEFAULT_MAX_WORKERS, report_interval: float = DEFAULT_REPORT_INTERVAL, progress=None):
+        """
+
+        Args:
+            client (NGNT, optional): Client the accounts are created with. Defaults to a new `NGNT` client.
+            checkpoint (str, optional): Path of the append-only checkpoint file. Defaults to none, nothing being
+                skipped or recorded.
+            batch_size (int): Number of accounts created per request.
+            max_workers (int): Number of requests in flight at once.
+            report_interval (float): Seconds between progress reports, logged and passed to `progress`.
+            progress (optional): Function called with `stats()` at every report.
+        """
+        self.client = client if client is not None else NGNT(pool_size=max(max_workers, 10))
+        self.checkpoint = checkpoint
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.report_interval = report_interval
+        self.progress = progress
+        self._file = JournalFile(checkpoint)
+        self._lock = threading.Lock()
+        self._states = self._load()
+        self._counters = dict.fromkeys((CREATED, FAILED, IN_DOUBT, "skipped"), 0)
+        self._started_at = None
+        self._reported_at = None
+
+    def _load(self):
+        states = {}
+        for record in self._file.records():
+            # Records written before states were journaled only say whether the account was created.
+            states[record["name"]] = record.get("state") or (CREATED if record.get("created") else FAILED)
+        return states
+
+    def state(self, name: str):
+        """Returns the last recorded state of an account: `CREATED`, `FAILED`, `IN_DOUBT`, "pending" or None."""
+        return self._states.get(name)
+
+    def completed(self, name: str):
+        """Returns whether an account named `name` was created by this or a previous run."""
+        return self._states.get(name) == CREATED
+
+    def stats(self):
+        """Returns the created, failed, in doubt and skipped counts, the seconds elapsed and the accounts processed per
+        second."""
+        with self._lock:
+            stats = dict(self._counters)
+        elapsed = time.monotonic() - self._started_at if self._started_at is not None else 0.0
+        stats["elapsed"] = elapsed
+        stats["throughput"] = (stats[CREATED] + stats[FAILED] + stats[IN_DOUBT]) / elapsed if elapsed else 0.0
+        return stats
+
+    def provision(self, names):
+        """Creates an account for every name not created yet, yielding each name and its response as batches return.
+
+        Args:
+            names: Iterable of account names. Repeated names are created once.
+
+        Yields:
+            tuple: The account name and the response of `NGNT.create_deposit_account`.
+        """
+        self._started_at = self._reported_at = time.monotonic()
+        pending = set()
+        batches = self._batches(iter(names))
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="buycoins-provision") as executor:
+            with self._file as checkpoint:
+                for batch in batches:
+                    # Journaled first, so a batch whose run stops before it returns is not sent again.
+                    checkpoint.append(*({"name": name, "state": _PENDING} for name in batch), sync=True)
+                    for name in batch:
+                        self._states[name] = _PENDING
+                    pending.add(executor.submit(self._create, batch))
+                    if len(pending) >= self.max_workers:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        yield from self._record(done, checkpoint)
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    yield from self._record(done, checkpoint)
+        self._report()
+
+    def run(self, names):
+        """Creates an account for every name not created yet and returns the final `stats()`."""
+        for _ in self.provision(names):
+            pass
+        return self.stats()
+
+    def _batches(self, names):
+        seen = set()
+        while True:
+            batch = []
+            for name in names:
+                if self._states.get(name) not in (None, FAILED) or name in seen:
+                    with self._lock:
+                        self._counters["skipped"] += 1
+                    continue
+                seen.add(name)
+                batch.append(name)
+                if len(batch) == self.batch_size:
+                    break
+            if not batch:
+                return
+            yield batch
+
+    def _create(self, names: list):
+        with self.client.batch() as batch:
+            results = [batch.ngnt.create_deposit_account(name) for name in names]
+        return [(name, result.result()) for name, result in zip(names, results)]
+
+    def _record(self, futures, checkpoint):
+        for future in futures:
+            results = future.result()
+            records = []
+            for name, response in results:
+                if isinstance(response, Model):
+                    response = {field: getattr(response, attribute) for field, (attribute, _) in response._fields.items()}
+                if response is not None and not (isinstance(response, dict) and response.get("status") == "error"):
+                    state = CREATED
+                elif isinstance(response, dict) and response.get("name") == "ServerError":
+                    # Connection failures and 5xx responses may come after the account was created.
+                    state = IN_DOUBT
+                    logger.warning("Account %r may have been created: %s", name, response)
+                else:
+                    state = FAILED
+                with self._lock:
+                    self._counters[state] += 1
+                self._states[name] = state
+                records.append({"name": name, "state": state, "created": state == CREATED, "response": response})
+            checkpoint.append(*records)
+            yield from results
+        if time.monotonic() - self._reported_at >= self.report_interval:
+            self._report()
+
+    def _report(self):
+        self._reported_at = time.monotonic()
+        stats = self.stats()
+        logger.info(
+            "Provisioned %d accounts (%d failed, %d in doubt, %d skipped) in %.1fs, %.1f/s",
+            stats[CREATED], stats[FAILED], stats[IN_DOUBT], stats["skipped"], stats["elapsed"], stats["throughput"],
+        )
+        if self.progress is not None:
+            self.progress(stats)
+
@@ -0,0 +1,314 @@
+"""GraphQL documents sent by the clients, minified and hashed once at import.
+
+Documents are registered with `register`, which returns the minified document. The SHA-256 hash used by Automatic
+Persisted Queries is computed at the same time and looked up with `sha256`: clients created with
+`persisted_queries=True` send that hash first, and the full document only when the server doesn't know it yet.
+"""
+
+import hashlib
+import re
+from functools import lru_cache
+
+_WHITESPACE = re.compile(r"\s+")
+_PUNCTUATION = re.compile(r" ?([{}()\[\]:,!=@$]) ?")
+
+_hashes = {}
+
+
+def minify(document: str):
+    """Returns `document` without insignificant whitespace. Documents must not contain string literals."""
+    return _PUNCTUATION.sub(r"\1", _WHITESPACE.sub(" ", document).strip())
+
+
+def register(document: str):
+    """Minifies `document`, records its hash and returns the minified document."""
+    document = minify(document)
+    _hashes[document] = hashlib.sha256(document.encode("utf-8")).hexdigest()
+    return document
+
+
+@lru_cache(maxsize=256)
+def _hash(document: str):
+    return hashlib.sha256(document.encode("utf-8")).hexdigest()
+
+
+def sha256(document: str):
+    """Returns the hex SHA-256 hash of `document`, precomputed for registered documents."""
+    digest = _hashes.get(document)
+    return digest if digest is not None else _hash(document)
+
+
+PERSISTED_QUERY_NOT_FOUND = "PersistedQueryNotFound"
+PERSISTED_QUERY_NOT_SUPPORTED = "PersistedQueryNotSupported"
+
+_PERSISTED_QUERY_CODES = {
+    "PERSISTED_QUERY_NOT_FOUND": PERSISTED_QUERY_NOT_FOUND,
+    "PERSISTED_QUERY_NOT_SUPPORTED": PERSISTED_QUERY_NOT_SUPPORTED,
+}
+
+
+def persisted(body: dict):
+    """Returns the Automatic Persisted Query request body for `body`: its hash, without the document."""
+    persisted_body = {"extensions": {"persistedQuery": {"version": 1, "sha256Hash": sha256(body["query"])}}}
+    if "variables" in body:
+        persisted_body["variables"] = body["variables"]
+    return persisted_body
+
+
+def persisted_query_error(response):
+    """Returns `PERSISTED_QUERY_NOT_FOUND` or `PERSISTED_QUERY_NOT_SUPPORTED` if `response` reports it, else None."""
+    if not isinstance(response, dict):
+        return None
+    for error in response.get("errors") or []:
+        if error.get("message") in (PERSISTED_QUERY_NOT_FOUND, PERSISTED_QUERY_NOT_SUPPORTED):
+            return error["message"]
+        code = (error.get("extensions") or {}).get("code")
+        if code in _PERSISTED_QUERY_CODES:
+            return _PERSISTED_QUERY_CODES[code]
+    return None
+
+
+class Selection:
+    """A query whose fields can be chosen by the caller from a known set.
+
+    The document for each distinct selection is generated, registered and cached on first use. Fields are always
+    selected in the order of `known`, so selections of the same fields share one document.
+    """
+
+    def __init__(self, template: str, fields: tuple, known: tuple = None):
+        """
+
+        Args:
+            template (str): Document with a `%s` placeholder for the selected fields.
+            fields (tuple): Fields selected by default.
+            known (tuple, optional): Fields that can be selected. Defaults to `fields`.
+        """
+        self.template = template
+        self.fields = fields
+        self.known = known or fields
+        self._known = frozenset(self.known)
+        self._documents = {}
+        self.document = self.select()
+
+    def validate(self, fields, exception):
+        """Raises `exception` unless `fields` is None or a non-empty selection of known fields."""
+        if fields is None:
+            return
+        if isinstance(fields, str) or not fields:
+            raise exception("Invalid fields passed", 400)
+        unknown = [field for field in fields if field not in self._known]
+        if unknown:
+            raise exception("Invalid fields passed: {}".format(", ".join(unknown)), 400)
+
+    def select(self, fields=None):
+        """Returns the registered document selecting `fields`, or the default fields if None."""
+        key = frozenset(fields) if fields is not None else None
+        document = self._documents.get(key)
+        if document is None:
+            selected = self.fields if key is None else [field for field in self.known if field in key]
+            document = self._documents[key] = register(self.template % " ".join(selected))
+        return document
+
+
+PRICE_FIELDS = (
+    "buyPricePerCoin", "cryptocurrency", "id", "maxBuy", "maxSell", "minBuy", "minCoinAmount", "minSell",
+    "sellPricePerCoin", "status", "expiresAt",
+)
+ORDER_FIELDS = (
+    "id", "cryptocurrency", "coinAmount", "side", "status", "createdAt", "pricePerCoin", "priceType", "staticPrice",
+    "dynamicExchangeRate",
+)
+BALANCE_FIELDS = ("id", "cryptocurrency", "confirmedBalance")
+NETWORK_FEE_FIELDS = ("estimatedFee", "total")
+
+GET_PRICES = Selection("""
+    query {
+      getPrices {
+        %s
+      }
+    }
+""", ("id", "cryptocurrency", "buyPricePerCoin", "minBuy", "maxBuy", "expiresAt"), PRICE_FIELDS)
+
+GET_CURRENT_PRICE = Selection("""
+    query GetBuyCoinsPrices($side: OrderSide, $currency: Cryptocurrency) {
+      getPrices(side: $side, cryptocurrency: $currency) {
+        %s
+      }
+    }
+""", PRICE_FIELDS)
+
+GET_DYNAMIC_PRICE_EXPIRY = register("""
+    query GetOrders($status: GetOrdersStatus!) {
+      getOrders(status: $status) {
+        dynamicPriceExpiry
+      }
+    }
+""")
+
+POST_LIMIT_ORDER = register("""
+    mutation PostLimitOrder($orderSide: OrderSide!, $coinAmount: BigDecimal!, $cryptocurrency: Cryptocurrency, $staticPrice: BigDecimal, $priceType: PriceType!) {
+      postLimitOrder(orderSide: $orderSide, coinAmount: $coinAmount, cryptocurrency: $cryptocurrency, staticPrice: $staticPrice, priceType: $priceType) {
+        %s
+      }
+    }
+""" % " ".join(ORDER_FIELDS))
+
+POST_MARKET_ORDER = register("""
+    mutation PostMarketOrder($orderSide: OrderSide!, $coinAmount: BigDecimal!, $cryptocurrency: Cryptocurrency) {
+      postMarketOrder(orderSide: $orderSide, coinAmount: $coinAmount, cryptocurrency: $cryptocurrency) {
+        %s
+      }
+    }
+""" % " ".join(ORDER_FIELDS))
+
+GET_ORDERS = Selection("""
+    query GetOrders($status: GetOrdersStatus!) {
+      getOrders(status: $status) {
+        dynamicPriceExpiry
+        orders {
+          edges {
+            node {
+              %s
+            }
+          }
+        }
+      }
+    }
+""", ORDER_FIELDS)
+
+GET_MARKET_BOOK = Selection("""
+    query {
+      getMarketBook {
+        dynamicPriceExpiry
+        orders {
+          edges {
+            node {
+              %s
+            }
+          }
+        }
+      }
+    }
+""", ORDER_FIELDS)
+
+ITER_ORDERS = Selection("""
+    query GetOrders($status: GetOrdersStatus!, $first: Int, $after: String) {
+      getOrders(status: $status) {
+        orders(first: $first, after: $after) {
+          pageInfo {
+            hasNextPage
+            endCursor
+          }
+          edges {
+            node {
+              %s
+            }
+          }
+        }
+      }
+    }
+""", ORDER_FIELDS)
+
+ITER_MARKET_BOOK = Selection("""
+    query GetMarketBook($first: Int, $after: String) {
+      getMarketBook {
+        orders(first: $first, after: $after) {
+          pageInfo {
+            hasNextPage
+            endCursor
+          }
+          edges {
+            node {
+              %s
+            }
+          }
+        }
+      }
+    }
+""", ORDER_FIELDS)
+
+BUY = register("""
+    mutation BuyCoin($price: ID!, $coin_amount: BigDecimal!, $currency: Cryptocurrency) {
+      buy(price: $price, coin_amount: $coin_amount, cryptocurrency: $currency) {
+        id
+        cryptocurrency
+        status
+        totalCoinAmount
+        side
+      }
+    }
+""")
+
+SELL = register("""
+    mutation SellCoin($price: ID!, $coin_amount: BigDecimal!, $currency: Cryptocurrency) {
+      sell(price: $price, coin_amount: $coin_amount, cryptocurrency: $currency) {
+        id
+        cryptocurrency
+        status
+        totalCoinAmount
+        side
+      }
+    }
+""")
+
+GET_NETWORK_FEE = Selection("""
+    query NetworkFee($currency: Cryptocurrency, $amount: BigDecimal!) {
+      getEstimatedNetworkFee(cryptocurrency: $currency, amount: $amount) {
+        %s
+      }
+    }
+""", NETWORK_FEE_FIELDS)
+
+CREATE_ADDRESS = register("""
+    mutation CreateWalletAddress($currency: Cryptocurrency) {
+      createAddress(cryptocurrency: $currency) {
+        cryptocurrency
+        address
+      }
+    }
+""")
+
+SEND = register("""
+    mutation SendCrypto($amount: BigDecimal!, $currency: Cryptocurrency, $address: String!) {
+      send(cryptocurrency: $currency, amount: $amount, address: $address) {
+        id
+        address
+        amount
+        cryptocurrency
+        fee
+        status
+        transaction {
+          txhash
+          id
+        }
+      }
+    }
+""")
+
+GET_BALANCES = Selection("""
+    query {
+      getBalances {
+        %s
+      }
+    }
+""", BALANCE_FIELDS)
+
+GET_BALANCE = Selection("""
+    query($currency: Cryptocurrency) {
+      getBalances(cryptocurrency: $currency) {
+        %s
+      }
+    }
+""", BALANCE_FIELDS)
+
+CREATE_DEPOSIT_ACCOUNT = register("""
+    mutation createDepositAccount($accountName: String!) {
+      createDepositAccount(accountName: $accountName) {
+        accountNumber
+        accountName
+        accountType
+        bankName
+        accountReference
+      }
+    }
+""")
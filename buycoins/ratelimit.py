@@ -0,0 +1,311 @@
+import asyncio
+import heapq
+import itertools
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+from buycoins.retry import is_mutation
+
+TRADING = 0
+POLLING = 1
+ANALYTICS = 2
+
+PRIORITY_NAMES = {TRADING: "trading", POLLING: "polling", ANALYTICS: "analytics"}
+
+_TRADING_FIELDS = re.compile(r"\b(buy|sell|send|postMarketOrder|postLimitOrder)\s*[({]")
+_POLLING_FIELDS = re.compile(r"\b(getBalances|getPrices|getEstimatedNetworkFee)\b")
+
+
+def classify(query: str):
+    """Returns the priority class of a GraphQL document.
+
+    Trades, transfers and orders are `TRADING`, balance, price and fee reads are `POLLING`, and every other document,
+    including mutations creating addresses or deposit accounts in bulk, is `ANALYTICS`.
+    """
+    if is_mutation(query) and _TRADING_FIELDS.search(query):
+        return TRADING
+    if _POLLING_FIELDS.search(query):
+        return POLLING
+    return ANALYTICS
+
+
+class TokenBucket:
+    """The TokenBucket class allows `rate` requests per second on average, in bursts of up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float = None):
+        """
+
+        Args:
+            rate (float): Tokens added per second.
+            capacity (float, optional): Maximum number of tokens held. Defaults to `rate`.
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Takes a token if one is available.
+
+        Returns:
+            float: 0 if a token was taken, else the seconds until one will be available.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+
+class RequestScheduler:
+    """The RequestScheduler class queues requests for tokens from a bucket, serving them by priority.
+
+    Waiting requests are granted tokens in priority order, `TRADING` first and `ANALYTICS` last, and in arrival order
+    within a class. Requests are never rejected, only delayed. Queue depth and wait times are recorded per class.
+    """
+
+    def __init__(self, bucket):
+        """
+
+        Args:
+            bucket (TokenBucket): Bucket the request budget is taken from: a `TokenBucket` for a per-process budget,
+                or a `FileTokenBucket` or `RedisTokenBucket` for one shared by processes.
+        """
+        self.bucket = bucket
+        self._waiting = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._stats = {priority: {"requests": 0, "wait_time": 0.0, "max_wait_time": 0.0} for priority in PRIORITY_NAMES}
+
+    @property
+    def queue_depth(self):
+        """Number of requests waiting for a token."""
+        return len(self._waiting)
+
+    def stats(self):
+        """Returns the number of requests, their total and maximum wait time in seconds, per priority class."""
+        with self._condition:
+            stats = {PRIORITY_NAMES[priority]: dict(values) for priority, values in self._stats.items()}
+            stats["queue_depth"] = len(self._waiting)
+        return stats
+
+    def acquire(self, priority: int = ANALYTICS):
+        """Blocks until the request may be sent.
+
+        Args:
+            priority (int): `TRADING`, `POLLING` or `ANALYTICS`.
+
+        Returns:
+            float: The seconds spent waiting.
+        """
+        started = time.monotonic()
+        with self._condition:
+            entry = (priority, next(self._counter))
+            heapq.heappush(self._waiting, entry)
+            try:
+                while True:
+                    if self._waiting[0] is entry:
+                        delay = self.bucket.reserve()
+                        if delay <= 0:
+                            heapq.heappop(self._waiting)
+                            self._condition.notify_all()
+                            break
+                        self._condition.wait(delay)
+                    else:
+                        self._condition.wait()
+            except BaseException:
+                # A request leaving the queue without a token, e.g. when a shared bucket is unreachable, must not
+                # hold up the ones behind it.
+                if entry in self._waiting:
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+                    self._condition.notify_all()
+                raise
+
+            return self._record(priority, started)
+
+    async def acquire_async(self, priority: int = ANALYTICS, poll_interval: float = 0.005):
+        """Waits until the request may be sent without blocking the event loop.
+
+        Coroutines share the queue with threads calling `acquire`, but check it every `poll_interval` seconds at
+        most instead of being woken up.
+
+        Args:
+            priority (int): `TRADING`, `POLLING` or `ANALYTICS`.
+            poll_interval (float): Seconds between checks while other requests are ahead in the queue.
+
+        Returns:
+            float: The seconds spent waiting.
+        """
+        started = time.monotonic()
+        with self._condition:
+            entry = (priority, next(self._counter))
+            heapq.heappush(self._waiting, entry)
+        try:
+            while True:
+                with self._condition:
+                    delay = poll_interval
+                    if self._waiting[0] is entry:
+                        delay = self.bucket.reserve()
+                        if delay <= 0:
+                            heapq.heappop(self._waiting)
+                            self._condition.notify_all()
+                            return self._record(priority, started)
+                await asyncio.sleep(delay)
+        except BaseException:
+            with self._condition:
+                if entry in self._waiting:
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+                    self._condition.notify_all()
+            raise
+
+    def _record(self, priority: int, started: float):
+        waited = time.monotonic() - started
+        stats = self._stats[priority]
+        stats["requests"] += 1
+        stats["wait_time"] += waited
+        stats["max_wait_time"] = max(stats["max_wait_time"], waited)
+        return waited
+
+
+class FileTokenBucket:
+    """The FileTokenBucket class is a `TokenBucket` whose state lives in a memory-mapped file shared by processes.
+
+    Every process opening the same `path`, such as the gunicorn or Celery workers of a deployment using one set of
+    credentials, draws from a single budget. Updates are serialized with an exclusive `flock` on the file, so the
+    bucket only works on POSIX systems and local filesystems. The file is reopened after a fork, as processes sharing
+    an open file would also share its lock.
+    """
+
+    _STATE = struct.Struct("dd")
+
+    def __init__(self, path: str, rate: float, capacity: float = None):
+        """
+
+        Args:
+            path (str): File holding the bucket state, created if missing. Use one file per set of credentials.
+            rate (float): Tokens added per second, across all processes.
+            capacity (float, optional): Maximum number of tokens held. Defaults to `rate`.
+        """
+        if fcntl is None:
+            raise ImportError("FileTokenBucket requires the fcntl module, which is only available on POSIX systems")
+
+        self.path = path
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._lock = threading.Lock()
+        self._pid = None
+        self._file = None
+        self._map = None
+
+    def _open(self):
+        if self._pid == os.getpid():
+            return
+        self._file = open(self.path, "a+b")
+        self._pid = os.getpid()
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._file.fileno()).st_size < self._STATE.size:
+                self._file.truncate(0)
+                self._file.write(self._STATE.pack(self.capacity, time.time()))
+                self._file.flush()
+            self._map = mmap.mmap(self._file.fileno(), self._STATE.size)
+        finally:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+
+    def reserve(self):
+        """Takes a token from the shared budget if one is available.
+
+        Returns:
+            float: 0 if a token was taken, else the seconds until one will be available.
+        """
+        with self._lock:
+            self._open()
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+            try:
+                tokens, updated = self._STATE.unpack_from(self._map)
+                now = time.time()
+                tokens = min(self.capacity, tokens + max(now - updated, 0.0) * self.rate)
+                delay = 0.0
+                if tokens >= 1:
+                    tokens -= 1
+                else:
+                    delay = (1 - tokens) / self.rate
+                self._STATE.pack_into(self._map, 0, tokens, now)
+            finally:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+        return delay
+
+    def close(self):
+        """Unmaps and closes the state file. The bucket reopens it on the next `reserve`."""
+        with self._lock:
+            if self._pid == os.getpid():
+                self._map.close()
+                self._file.close()
+            self._pid = self._file = self._map = None
+
+
+class RedisTokenBucket:
+    """The RedisTokenBucket class is a `TokenBucket` whose state is kept in a Redis-compatible server.
+
+    The bucket is refilled and drawn from atomically by a Lua script using the server's clock, so processes on any
+    number of hosts share one budget. Any client exposing `eval(script, numkeys, *keys_and_args)`, such as
+    `redis.Redis` or a compatible stand-in, can be used.
+    """
+
+    SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local time = redis.call("TIME")
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call("HMGET", KEYS[1], "tokens", "updated")
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(now - updated, 0) * rate)
+local delay = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    delay = (1 - tokens) / rate
+end
+redis.call("HSET", KEYS[1], "tokens", tostring(tokens), "updated", tostring(now))
+redis.call("EXPIRE", KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(delay)
+"""
+
+    def __init__(self, client, key: str, rate: float, capacity: float = None):
+        """
+
+        Args:
+            client: Redis-compatible client.
+            key (str): Key holding the bucket state. Use one key per set of credentials.
+            rate (float): Tokens added per second, across all processes.
+            capacity (float, optional): Maximum number of tokens held. Defaults to `rate`.
+        """
+        self.client = client
+        self.key = key
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+
+    def reserve(self):
+        """Takes a token from the shared budget if one is available.
+
+        Returns:
+            float: 0 if a token was taken, else the seconds until one will be available.
+        """
+        delay = self.client.eval(self.SCRIPT, 1, self.key, self.rate, self.capacity)
+        return float(delay.decode() if isinstance(delay, bytes) else delay)
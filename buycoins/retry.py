@@ -0,0 +1,151 @@
+import random
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from requests.exceptions import HTTPError, ConnectionError, Timeout
+
+from buycoins.exceptions import ServerError
+
+_MUTATION = re.compile(r"^\s*mutation\b")
+
+
+def is_mutation(query: str):
+    """Returns whether the GraphQL document `query` is a mutation."""
+    return bool(_MUTATION.match(query))
+
+
+def status_code(result):
+    """Returns the HTTP status code of a failed `_execute_request` result, 503 for connection errors and 504 for
+    timeouts, else None."""
+    if isinstance(result, Timeout):
+        return 504
+    if isinstance(result, ConnectionError):
+        return 503
+    if isinstance(result, HTTPError) and result.response is not None:
+        return result.response.status_code
+    if isinstance(result, ServerError):
+        return result.code
+    return None
+
+
+def retry_after(result):
+    """Returns the seconds to wait requested by the `Retry-After` header of a failed result, or None."""
+    if not isinstance(result, HTTPError) or result.response is None:
+        return None
+    value = result.response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """The RetryPolicy class decides whether, and after how long, a failed request is sent again.
+
+    Queries are retried on connection errors, timeouts and the `retry_statuses` HTTP status codes, with exponential backoff
+    and full jitter, or after the delay requested by a `Retry-After` header. Mutations are only retried when they
+    are sent with an idempotency key.
+    """
+
+    def __init__(self, max_attempts: int = 3, backoff: float = 0.5, max_backoff: float = 10.0, jitter: bool = True, retry_statuses: tuple = (429, 502, 503, 504)):
+        """
+
+        Args:
+            max_attempts (int): Maximum number of times a request is sent, including the first.
+            backoff (float): Delay before the first retry, doubled for every following one.
+            max_backoff (float): Maximum delay between two attempts.
+            jitter (bool): Whether delays are drawn uniformly between zero and the backoff.
+            retry_statuses (tuple): HTTP status codes that are retried.
+        """
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.retry_statuses = retry_statuses
+
+    def allows(self, query: str, idempotency_key: str = None):
+        """Returns whether `query` may be retried at all."""
+        return idempotency_key is not None or not is_mutation(query)
+
+    def retryable(self, result):
+        """Returns whether a request that returned `result` should be retried."""
+        code = status_code(result)
+        return isinstance(result, (ConnectionError, Timeout)) or code in self.retry_statuses
+
+    def delay(self, attempt: int, result=None):
+        """Returns the seconds to wait before retrying after the failed attempt number `attempt`, from zero."""
+        requested = retry_after(result)
+        if requested is not None:
+            return min(requested, self.max_backoff)
+        delay = min(self.backoff * 2 ** attempt, self.max_backoff)
+        return random.uniform(0, delay) if self.jitter else delay
+
+
+class CircuitBreaker:
+    """The CircuitBreaker class stops requests from being sent while the BuyCoins API is failing.
+
+    After `failure_threshold` consecutive server or connection failures the circuit opens and requests fail fast with
+    a 503 `ServerError`. Once `reset_timeout` seconds have passed a single trial request is let through: the circuit
+    closes again if it succeeds and reopens if it fails.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+
+        Args:
+            failure_threshold (int): Consecutive failures that open the circuit.
+            reset_timeout (float): Seconds the circuit stays open before a trial request.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Returns whether a request may be sent now."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial = False
+            if self.state == self.HALF_OPEN and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record(self, result):
+        """Records the outcome of a request that returned `result`, or raised it if it is an unexpected exception."""
+        code = status_code(result)
+        if code is None:
+            failed = isinstance(result, Exception) and not isinstance(result, HTTPError)
+        else:
+            failed = code >= 500
+        with self._lock:
+            if not failed:
+                self.state = self.CLOSED
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def error(self):
+        """Returns the error requests fail with while the circuit is open."""
+        return ServerError("Circuit breaker is open: the BuyCoins API is unavailable", 503)
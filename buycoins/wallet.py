@@ -1,7 +1,9 @@
+from functools import partial
+
+from buycoins import queries
 from buycoins.client import BuyCoinsClient
-from buycoins.exceptions import WalletError, ClientError, ServerError
-from buycoins.p2p import P2P
-from buycoins.exceptions.utils import check_response
+from buycoins.exceptions import P2PError, WalletError
+from buycoins.p2p import Quote
 
 
 class Wallet(BuyCoinsClient):
@@ -12,12 +14,31 @@ class Wallet(BuyCoinsClient):
     supported_cryptocurrencies = ["bitcoin", "ethereum", "litecoin", "naira_token", "usd_coin", "usd_tether"]
     status = ["open", "completed"]
 
-    def buy_crypto(self, currency: str = "bitcoin", coin_amount: float = 0.01):
+    _fee_cache = None
+    _balance_cache = None
+
+    def __init__(self, *args, fee_cache=None, balance_cache=None, **kwargs):
+        """
+
+        Args:
+            fee_cache (FeeCache, optional): Cache serving `get_network_fee` for amounts close to recent estimates.
+            balance_cache (BalanceCache, optional): Cache serving `get_balances`, cleared by successful trades and
+                transfers.
+        """
+        super().__init__(*args, **kwargs)
+        self._fee_cache = fee_cache
+        self._balance_cache = balance_cache
+        self._quotes = {}
+
+    def buy_crypto(self, currency: str = "bitcoin", coin_amount: float = 0.01, quote: Quote = None, idempotency_key: str = None):
         """Buys a cryptocurrency, for the given amount passed.
 
         Args:
             currency (str): The cryptocurrency to be bought.
             coin_amount(float): Amount of currency to be bought.
+            quote (Quote, optional): A `buy` quote from `P2P.quote` to trade at. A fresh quote is fetched once it
+                expires, and when none is passed.
+            idempotency_key (str, optional): Key identifying this trade, allowing it to be retried safely.
 
         Returns:
             response: A JSON object containing response from the request.
@@ -27,35 +48,22 @@ class Wallet(BuyCoinsClient):
             if currency not in self.supported_cryptocurrencies:
                 raise WalletError("Invalid or unsupported cryptocurrency", 400)
 
-            p2p = P2P()
-            price_info = p2p.get_current_price(order_side="buy", currency=currency)
-            price_id = price_info[0]["id"]
-            self._query = """
-                mutation BuyCoin($price: ID!, $coin_amount: BigDecimal!, $currency: Cryptocurrency){
-                        buy(price: $price, coin_amount: $coin_amount, cryptocurrency: $currency) {
-                            id
-                            cryptocurrency
-                            status
-                            totalCoinAmount
-                            side
-                        }
-                    }
-                """
-
-            _variables = {"price": price_id, "coin_amount": coin_amount, "currency": currency}
-            response = self._execute_request(query=self._query, variables=_variables)
-            check_response(response, WalletError)
-        except (WalletError, ClientError, ServerError) as e:
-            return e.response
-        else:
-            return response["data"]["buy"]
+            if quote is not None and (quote.side != "buy" or quote.currency != currency):
+                raise WalletError("Quote does not match the order side or cryptocurrency", 400)
+        except WalletError as e:
+            return self._reject(e)
+
+        return self._changed_balances(self._trade(queries.BUY, "buy", currency, coin_amount, quote, idempotency_key))
 
-    def sell_crypto(self, currency: str = "bitcoin", coin_amount: float = 0.01):
+    def sell_crypto(self, currency: str = "bitcoin", coin_amount: float = 0.01, quote: Quote = None, idempotency_key: str = None):
         """Sells a cryptocurrency, for the given amount passed.
 
         Args:
             currency (str): The cryptocurrency to be sold.
             coin_amount(float): Amount of currency to be bought.
+            quote (Quote, optional): A `sell` quote from `P2P.quote` to trade at. A fresh quote is fetched once it
+                expires, and when none is passed.
+            idempotency_key (str, optional): Key identifying this trade, allowing it to be retried safely.
 
         Returns:
             response: A JSON object containing response from the request.
@@ -65,36 +73,41 @@ class Wallet(BuyCoinsClient):
             if currency not in self.supported_cryptocurrencies:
                 raise WalletError("Invalid or unsupported cryptocurrency", 400)
 
-            p2p = P2P()
-            price_info = p2p.get_current_price(order_side="sell", currency=currency)
-            price_id = price_info[0]["id"]
-            self._query = """
-                mutation SellCoin($price: ID!, $coin_amount: BigDecimal!, $currency: Cryptocurrency){
-                        sell(price: $price, coin_amount: $coin_amount, cryptocurrency: $currency) {
-                            id
-                            cryptocurrency
-                            status
-                            totalCoinAmount
-                            side
-                        }
-                    }
-                """
-
-            _variables = {"price": price_id, "coin_amount": coin_amount, "currency": currency}
-
-            response = self._execute_request(query=self._query, variables=_variables)
-            check_response(response, WalletError)
-        except (WalletError, ClientError, ServerError) as e:
-            return e.response
-        else:
-            return response["data"]["sell"]
+            if quote is not None and (quote.side != "sell" or quote.currency != currency):
+                raise WalletError("Quote does not match the order side or cryptocurrency", 400)
+        except WalletError as e:
+            return self._reject(e)
+
+        return self._changed_balances(self._trade(queries.SELL, "sell", currency, coin_amount, quote, idempotency_key))
+
+    def _trade(self, query: str, side: str, currency: str, coin_amount: float, quote: Quote = None, idempotency_key: str = None):
+        """Executes the buy or sell mutation against `quote`, or against the last unexpired quote for the trade."""
+        if quote is None or quote.expired():
+            quote = self._quotes.get((side, currency))
+            if quote is None or quote.expired():
+                quote = self._fetch_quote(side, currency)
+                if not isinstance(quote, Quote):
+                    return quote
+                self._quotes[(side, currency)] = quote
+
+        _variables = {"price": quote.id, "coin_amount": coin_amount, "currency": currency}
+
+        return self._perform(query, _variables, side, WalletError, idempotency_key)
 
-    def get_network_fee(self, currency: str = "bitcoin", coin_amount: float = 0.01):
+    def _fetch_quote(self, side: str, currency: str):
+        """Fetches the current `side` price as a quote, through this client like any other of its requests."""
+        _variables = {"side": side, "currency": currency}
+        response = self._perform(queries.GET_CURRENT_PRICE.document, _variables, "getPrices", P2PError)
+        return Quote._from_response(side, currency, response)
+
+    def get_network_fee(self, currency: str = "bitcoin", coin_amount: float = 0.01, fields: list = None):
         """Retrieves NetworkFee for the supplied cryptocurrency.
 
         Args:
             currency (str): The cryptocurrency whose network fee is been checked.
             coin_amount(float): Amount of currency.
+            fields (list, optional): Fee fields to retrieve, from `queries.NETWORK_FEE_FIELDS`. Defaults to all of
+                them.
 
         Returns:
             response: A JSON object containing response from the request.
@@ -104,23 +117,17 @@ class Wallet(BuyCoinsClient):
             if currency not in self.supported_cryptocurrencies:
                 raise WalletError("Invalid or unsupported cryptocurrency", 400)
 
-            self._query = """
-                query NetworkFee($currency: Cryptocurrency, $amount: BigDecimal!) {
-                    getEstimatedNetworkFee(cryptocurrency: $currency, amount: $amount) {
-                        estimatedFee
-                        total
-                    }
-                }
-            """
-
-            _variables = {"currency": currency, "amount": coin_amount}
-
-            response = self._execute_request(query=self._query, variables=_variables)
-            check_response(response, WalletError)
-        except (WalletError, ClientError, ServerError) as e:
-            return e.response
-        else:
-            return response["data"]["getEstimatedNetworkFee"]
+            queries.GET_NETWORK_FEE.validate(fields, WalletError)
+        except WalletError as e:
+            return self._reject(e)
+
+        _variables = {"currency": currency, "amount": coin_amount}
+
+        if self._fee_cache is None:
+            return self._perform(queries.GET_NETWORK_FEE.select(fields), _variables, "getEstimatedNetworkFee", WalletError)
+        # Cached estimates always include both fields, so the total can be recomputed for nearby amounts.
+        loader = partial(self._perform, queries.GET_NETWORK_FEE.document, _variables, "getEstimatedNetworkFee", WalletError)
+        return self._fee_cache.get(currency, coin_amount, loader, self._typed)
 
     def create_address(self, currency: str = "bitcoin"):
         """Creates a wallet address for the supplied cryptocurrency.
@@ -135,31 +142,20 @@ class Wallet(BuyCoinsClient):
         try:
             if currency not in self.supported_cryptocurrencies:
                 raise WalletError("Invalid or unsupported cryptocurrency", 400)
+        except WalletError as e:
+            return self._reject(e)
 
-            self._query = """
-                mutation CreateWalletAddress($currency: Cryptocurrency) {
-                    createAddress(cryptocurrency: $currency) {
-                        cryptocurrency
-                        address
-                    }
-                }
-            """
+        _variables = {"currency": currency}
 
-            _variables = {"currency": currency}
-
-            response = self._execute_request(query=self._query, variables=_variables)
-            check_response(response, WalletError)
-        except (WalletError, ClientError, ServerError) as e:
-            return e.response
-        else:
-            return response["data"]["createAddress"]
+        return self._perform(queries.CREATE_ADDRESS, _variables, "createAddress", WalletError)
 
-    def send_crypto(self, address: str, currency: str = "bitcoin", coin_amount: float = 0.01):
+    def send_crypto(self, address: str, currency: str = "bitcoin", coin_amount: float = 0.01, idempotency_key: str = None):
         """Sends a cryptocurrency, for the given amount passed.
 
         Args:
             currency (str): The cryptocurrency to be sold.
             coin_amount(float): Amount of currency to be bought.
+            idempotency_key (str, optional): Key identifying this transfer, allowing it to be retried safely.
 
         Returns:
             response: A JSON object containing response from the request.
@@ -171,70 +167,69 @@ class Wallet(BuyCoinsClient):
 
             if not address:
                 raise WalletError("Invalid address", 400)
+        except WalletError as e:
+            return self._reject(e)
 
-            self._query = """
-                mutation SendCrypto($amount: BigDecimal!, $currency: Cryptocurrency, $address: String!){
-                    send(cryptocurrency: $currency, amount: $amount, address: $address) {
-                        id
-                        address
-                        amount
-                        cryptocurrency
-                        fee
-                        status
-                        transaction {
-                            txhash
-                            id
-                        }
-                    }
-                }
-                """
-
-            _variables = {"address": address, "amount": coin_amount, "currency": currency}
-
-            response = self._execute_request(query=self._query, variables=_variables)
-            check_response(response, WalletError)
-        except (WalletError, ClientError, ServerError) as e:
-            return e.response
-        else:
-            return response["data"]["SendCoin"]
+        _variables = {"address": address, "amount": coin_amount, "currency": currency}
+
+        return self._changed_balances(self._perform(queries.SEND, _variables, "send", WalletError, idempotency_key), currency)
 
-    def get_balances(self, currency=None):
+    def send_payouts(self, payouts, journal: str = None, batch_size: int = 20, max_concurrency: int = 2, max_fee: dict = None):
+        """Sends many payouts concurrently, with fees estimated in batches, never sending a journaled payout twice.
+
+        Args:
+            payouts: Iterable of `(address, currency, amount)` tuples or `buycoins.payouts.Payout` objects, such as
+                `buycoins.payouts.read_payouts(path)` for a CSV file.
+            journal (str, optional): Path of the write-ahead journal payouts are recorded in, and read from to resume.
+            batch_size (int): Number of payouts validated and estimated per request.
+            max_concurrency (int): Number of transfers of each currency in flight at once.
+            max_fee (dict, optional): Highest estimated fee accepted for each currency.
+
+        Returns:
+            dict: The count of each result status, the seconds elapsed, the payouts sent per second and the mean and
+            maximum seconds spent sending one.
+        """
+        from buycoins.payouts import PayoutEngine
+
+        return PayoutEngine(self, journal, batch_size, max_concurrency, max_fee).run(payouts)
+
+    def get_balances(self, currency=None, fields: list = None, max_staleness: float = None, refresh: bool = False):
         """Retrieves user cryptocurrency balances
 
+        Args:
+            currency (str, optional): The cryptocurrency whose balance is retrieved. Defaults to all of them.
+            fields (list, optional): Balance fields to retrieve, from `queries.BALANCE_FIELDS`. Defaults to all of
+                them.
+            max_staleness (float, optional): Largest age in seconds of balances served from the balance cache.
+                Defaults to the cache's.
+            refresh (bool): Whether to fetch the balances even if they are in the balance cache.
+
         Returns:
             response: A JSON object containing the user cryptocurrency balances.
 
         """
-
         try:
-            if currency:
-                self._query = """
-                query($currency: Cryptocurrency) {
-                    getBalances(cryptocurrency: $currency) {
-                        id
-                        cryptocurrency
-                        confirmedBalance
-                    }
-                }
-            """
-
-                _variables = {"currency": currency}
-                response = self._execute_request(query=self._query, variables=_variables)
-                check_response(response, WalletError)
-
-            else:
-                self._query = """
-                    query {
-                        getBalances {
-                            id
-                            cryptocurrency
-                            confirmedBalance
-                        }
-                    }
-                """
-                response = self._execute_request(query=self._query)
-                check_response(response, WalletError)
-        except (WalletError, ClientError, ServerError) as e:
-            return e.response
+            queries.GET_BALANCES.validate(fields, WalletError)
+        except WalletError as e:
+            return self._reject(e)
+
+        if currency:
+            _variables = {"currency": currency}
+            loader = partial(self._perform, queries.GET_BALANCE.select(fields), _variables, "getBalances", WalletError)
         else:
-            return response["data"]["getBalances"]
+            loader = partial(self._perform, queries.GET_BALANCES.select(fields), {}, "getBalances", WalletError)
+
+        if self._balance_cache is None:
+            return loader()
+        key = (self._account(), currency or None, frozenset(fields) if fields is not None else None, self._typed)
+        return self._balance_cache.get(key, loader, max_staleness, refresh)
+
+    def _account(self):
+        """Returns the public key the account's balances are cached under."""
+        return self._credentials().split(":")[0]
+
+    def _changed_balances(self, result, currency: str = None):
+        """Drops the cached balances of the account, or of `currency` only, if `result` is a successful response."""
+        if self._balance_cache is not None and not (isinstance(result, dict) and result.get("status") == "error"):
+            self._balance_cache.invalidate(self._account(), currency)
+        return result
@@ -0,0 +1,11 @@
+from .webhook import Webhook
+from .dedup import Deduplicator
+
+
+def __getattr__(name):
+    # The server needs aiohttp, which is only imported once the server is used.
+    if name in ("WebhookServer", "serve"):
+        from . import server
+
+        return getattr(server, name)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
@@ -0,0 +1,142 @@
+import base64
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_WINDOW = 24 * 60 * 60
+DEFAULT_MAX_SIZE = 100000
+
+
+class _BloomFilter:
+    """A fixed-size Bloom filter over strings, using double hashing of one BLAKE2b digest."""
+
+    def __init__(self, capacity: int, error_rate: float, bits: bytes = None):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray(bits) if bits is not None else bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class Deduplicator:
+    """The Deduplicator class remembers the webhook events seen within a time window, to drop redelivered ones.
+
+    Keys are kept in insertion order with the time they were seen, so expiring old keys and checking new ones takes
+    constant time. At most `max_size` keys are held; with `bloom_capacity` set, keys evicted for room are added to a
+    Bloom filter instead of being forgotten, so duplicates are still caught, with rare false positives, at high
+    volume. The filter is replaced by a new one every `window` seconds, keeping the keys of the previous window.
+
+    With a `path`, the seen keys are loaded from that file on creation and written to it by `save`, so the window
+    survives restarts.
+    """
+
+    def __init__(self, window: float = DEFAULT_WINDOW, max_size: int = DEFAULT_MAX_SIZE, bloom_capacity: int = 0, error_rate: float = 0.001, path: str = None, key=None):
+        """
+
+        Args:
+            window (float): Seconds an event is remembered for.
+            max_size (int): Maximum number of keys remembered exactly.
+            bloom_capacity (int): Number of evicted keys the Bloom filter is sized for, or 0 for no filter.
+            error_rate (float): False positive rate of the Bloom filter at capacity.
+            path (str, optional): File the seen keys are saved to and loaded from.
+            key (optional): Function returning the key of a parsed event. Defaults to the request signature, which
+                is the same for every delivery of an event.
+        """
+        self.window = window
+        self.max_size = max_size
+        self.bloom_capacity = bloom_capacity
+        self.error_rate = error_rate
+        self.path = path
+        self.key = key
+        self.duplicates = 0
+        self._seen = OrderedDict()
+        self._blooms = []
+        self._rotated_at = time.time()
+        self._lock = threading.Lock()
+
+        if bloom_capacity:
+            self._blooms = [_BloomFilter(bloom_capacity, error_rate)]
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    def __len__(self):
+        return len(self._seen)
+
+    def key_of(self, event: dict, signature: str):
+        """Returns the key an event delivered with `signature` is remembered by."""
+        return self.key(event) if self.key is not None else signature
+
+    def seen(self, key: str, record: bool = True):
+        """Returns whether `key` was already seen within the window, recording it unless `record` is False."""
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            if key in self._seen or any(key in bloom for bloom in self._blooms):
+                self.duplicates += 1
+                return True
+            if not record:
+                return False
+
+            self._seen[key] = now
+            if len(self._seen) > self.max_size:
+                evicted, _ = self._seen.popitem(last=False)
+                if self._blooms:
+                    self._blooms[0].add(evicted)
+            return False
+
+    def _expire(self, now: float):
+        cutoff = now - self.window
+        while self._seen:
+            key, seen_at = next(iter(self._seen.items()))
+            if seen_at > cutoff:
+                break
+            del self._seen[key]
+
+        if self._blooms and now - self._rotated_at >= self.window:
+            self._blooms = [_BloomFilter(self.bloom_capacity, self.error_rate)] + self._blooms[:1]
+            self._rotated_at = now
+
+    def save(self, path: str = None):
+        """Writes the seen keys to `path`, defaulting to the path given on creation, replacing the file atomically."""
+        path = path or self.path
+        with self._lock:
+            self._expire(time.time())
+            state = {
+                "seen": list(self._seen.items()),
+                "blooms": [base64.b64encode(bytes(bloom.bits)).decode("ascii") for bloom in self._blooms],
+                "rotated_at": self._rotated_at,
+            }
+        temporary = "{}.{}.tmp".format(path, os.getpid())
+        with open(temporary, "w") as snapshot:
+            json.dump(state, snapshot)
+        os.replace(temporary, path)
+
+    def load(self, path: str = None):
+        """Adds the keys saved to `path`, defaulting to the path given on creation, that are still within the window."""
+        with open(path or self.path) as snapshot:
+            state = json.load(snapshot)
+        with self._lock:
+            for key, seen_at in state["seen"]:
+                self._seen[key] = seen_at
+            self._seen = OrderedDict(sorted(self._seen.items(), key=lambda item: item[1]))
+            while len(self._seen) > self.max_size:
+                self._seen.popitem(last=False)
+            blooms = [_BloomFilter(self.bloom_capacity, self.error_rate, base64.b64decode(bits)) for bits in state["blooms"]] if self._blooms else []
+            if blooms and all(len(bloom.bits) == len(self._blooms[0].bits) for bloom in blooms):
+                self._blooms = blooms
+                self._rotated_at = state["rotated_at"]
+            self._expire(time.time())
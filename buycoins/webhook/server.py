@@ -0,0 +1,180 @@
+import asyncio
+import json
+import logging
+import time
+
+try:
+    from aiohttp import web
+except ImportError:  # pragma: no cover
+    web = None
+
+from buycoins.webhook.webhook import Webhook
+
+DEFAULT_QUEUE_SIZE = 1000
+DEFAULT_WORKERS = 4
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookServer:
+    """The WebhookServer class receives BuyCoins webhook requests and hands their events to an async handler.
+
+    Each POST to `path` is verified with `Webhook`, parsed and put on a bounded queue, and answered with 200 before
+    the event is handled. Requests with an invalid signature get 401 and unparseable bodies 400. When the queue is
+    full, requests get 503 with a `Retry-After` header so BuyCoins delivers them again later. `workers` tasks take
+    events off the queue and await `handler(event)` for each of them.
+
+    With a `Deduplicator`, events already seen are answered with 200 but never queued, and its seen keys are saved
+    when the server stops if it has a path.
+    """
+
+    def __init__(self, token: str, handler, path: str = "/webhook", queue_size: int = DEFAULT_QUEUE_SIZE, workers: int = DEFAULT_WORKERS, retry_after: int = 1, header: str = "X-Webhook-Signature", dedup=None):
+        """
+
+        Args:
+            token (str): BuyCoins generated webhook token.
+            handler: Coroutine function called with every verified event, as a dict.
+            path (str): URL path BuyCoins posts to.
+            queue_size (int): Maximum number of events waiting to be handled.
+            workers (int): Number of events handled at once.
+            retry_after (int): Seconds BuyCoins is asked to wait when the queue is full.
+            header (str): Header holding the request signature.
+            dedup (Deduplicator, optional): Seen-set used to drop redelivered events.
+        """
+        if web is None:
+            raise ImportError("aiohttp is required for the webhook server: pip install buycoins-python[async]")
+
+        self.token = token
+        self.handler = handler
+        self.path = path
+        self.queue_size = queue_size
+        self.workers = workers
+        self.retry_after = retry_after
+        self.header = header
+        self.dedup = dedup
+        self.url = None
+        self._queue = None
+        self._tasks = []
+        self._runner = None
+        self._started_at = None
+        self._counters = dict.fromkeys(("received", "accepted", "rejected", "duplicates", "throttled", "handled", "failed"), 0)
+        self._latency = 0.0
+        self._max_latency = 0.0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8080):
+        """Starts listening on `host` and `port`, 0 picking a free port, and returns the server."""
+        self._queue = asyncio.Queue(self.queue_size)
+        self._tasks = [asyncio.ensure_future(self._work()) for _ in range(self.workers)]
+
+        app = web.Application()
+        app.router.add_post(self.path, self._receive)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        host, port = self._runner.addresses[0][:2]
+        self.url = "http://{}:{}{}".format(host, port, self.path)
+        self._started_at = time.monotonic()
+        return self
+
+    async def stop(self, drain: bool = True):
+        """Stops accepting requests and, once the queued events are handled if `drain` is True, stops the workers."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        if drain and self._queue is not None:
+            await self._queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.dedup is not None and self.dedup.path is not None:
+            self.dedup.save()
+
+    @property
+    def queue_depth(self):
+        """Number of events waiting to be handled."""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def stats(self):
+        """Returns the request and event counters, the events handled per second and handling latency in seconds.
+
+        Latency is measured from the moment a request is received to the end of its handler.
+        """
+        stats = dict(self._counters)
+        elapsed = time.monotonic() - self._started_at if self._started_at is not None else 0.0
+        completed = stats["handled"] + stats["failed"]
+        stats["queue_depth"] = self.queue_depth
+        stats["throughput"] = completed / elapsed if elapsed else 0.0
+        stats["mean_latency"] = self._latency / completed if completed else 0.0
+        stats["max_latency"] = self._max_latency
+        return stats
+
+    async def _receive(self, request):
+        received_at = time.monotonic()
+        self._counters["received"] += 1
+        body = await request.read()
+        signature = request.headers.get(self.header)
+
+        if not Webhook(body, self.token, signature).verify_request():
+            self._counters["rejected"] += 1
+            return web.Response(status=401)
+        try:
+            event = json.loads(body)
+        except ValueError:
+            self._counters["rejected"] += 1
+            return web.Response(status=400)
+        key = None
+        if self.dedup is not None:
+            key = self.dedup.key_of(event, signature.lower())
+            if self.dedup.seen(key, record=False):
+                self._counters["duplicates"] += 1
+                return web.Response(status=200)
+
+        try:
+            self._queue.put_nowait((event, received_at))
+        except asyncio.QueueFull:
+            self._counters["throttled"] += 1
+            return web.Response(status=503, headers={"Retry-After": str(self.retry_after)})
+        # Only queued events are recorded, so one refused with 503 is accepted when BuyCoins delivers it again.
+        if key is not None:
+            self.dedup.seen(key)
+
+        self._counters["accepted"] += 1
+        return web.Response(status=200)
+
+    async def _work(self):
+        while True:
+            event, received_at = await self._queue.get()
+            try:
+                await self.handler(event)
+                self._counters["handled"] += 1
+            except Exception:
+                self._counters["failed"] += 1
+                logger.exception("Webhook handler failed")
+            finally:
+                latency = time.monotonic() - received_at
+                self._latency += latency
+                self._max_latency = max(self._max_latency, latency)
+                self._queue.task_done()
+
+
+async def serve(token: str, handler, host: str = "127.0.0.1", port: int = 8080, **kwargs):
+    """Starts a `WebhookServer` passing verified events to `handler` and returns it.
+
+    Args:
+        token (str): BuyCoins generated webhook token.
+        handler: Coroutine function called with every verified event, as a dict.
+        host (str): Interface to listen on.
+        port (int): Port to listen on, 0 picking a free one.
+        **kwargs: Other `WebhookServer` arguments.
+
+    Returns:
+        WebhookServer: The running server, stopped with `await server.stop()`.
+    """
+    return await WebhookServer(token, handler, **kwargs).start(host, port)
@@ -0,0 +1,88 @@
+import hashlib
+import hmac
+from functools import lru_cache
+from itertools import islice
+
+
+@lru_cache(maxsize=32)
+def _keyed(token: str):
+    """Returns the HMAC-SHA1 state keyed with `token`, computed once and copied for every message."""
+    return hmac.new(token.encode("utf-8"), digestmod=hashlib.sha1)
+
+
+def _verify(keyed, body, signature):
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    if isinstance(signature, (bytes, bytearray, memoryview)):
+        signature = bytes(signature).decode("ascii", "replace")
+    if not isinstance(signature, str):
+        return False
+
+    digest = keyed.copy()
+    digest.update(body)
+    try:
+        return hmac.compare_digest(digest.hexdigest(), signature.lower())
+    except TypeError:
+        return False
+
+
+def _chunks(iterable, size: int):
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
+class Webhook:
+    """The Webhook class is responsible for verifying requests sent to your BuyCoins webhook URL."""
+
+    def __init__(self, body: bytes, token: str, header_signature: str = "X-Webhook-Signature"):
+        """
+
+        Args:
+            body (bytes): request body from BuyCoins, as `bytes`, `bytearray` or `memoryview`
+            token (str): BuyCoins generated webhook token
+            header_signature (str): value of the "X-Webhook-Signature" header
+        """
+        self.token = token
+        self.body = body
+        self.header_signature = header_signature
+
+    def verify_request(self):
+        """Verify the supplied request.
+
+        The signature is compared in constant time with the hex HMAC-SHA1 digest of the body.
+
+        Returns:
+            Bool: `True` if the request originated from BuyCoins or `False ` if the request didn't originate from BuyCoins
+        """
+        return _verify(_keyed(self.token), self.body, self.header_signature)
+
+    @classmethod
+    def verify_many(cls, token: str, bodies, signatures, max_workers: int = 0, chunk_size: int = 64):
+        """Verify a batch of requests signed with the same token.
+
+        Args:
+            token (str): BuyCoins generated webhook token
+            bodies: iterable of request bodies
+            signatures: iterable of the matching "X-Webhook-Signature" header values
+            max_workers (int): number of threads verifying chunks of the batch in parallel, or 0 to verify in the
+                calling thread. Threads only pay off for large bodies, as hashing releases the GIL above 2 KiB.
+            chunk_size (int): number of requests verified by each thread task
+
+        Returns:
+            list: `True` or `False` for each request, in order
+        """
+        keyed = _keyed(token)
+        pairs = zip(bodies, signatures)
+        if not max_workers:
+            return [_verify(keyed, body, signature) for body, signature in pairs]
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        def verify_chunk(chunk):
+            return [_verify(keyed, body, signature) for body, signature in chunk]
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="buycoins-webhook") as executor:
+            return [result for results in executor.map(verify_chunk, _chunks(pairs, chunk_size)) for result in results]
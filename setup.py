@@ -18,10 +18,10 @@ setup(
     classifiers=[
         "License :: OSI Approved :: MIT License",
         "Programming Language :: Python :: 3",
-        "Programming Language :: Python :: 3.6",
         "Programming Language :: Python :: 3.7",
     ],
-    install_requires=["python-graphql-client", "requests", "python-decouple"],
+    install_requires=["requests", "python-decouple"],
+    extras_require={"async": ["aiohttp"], "analytics": ["numpy"], "fast": ["orjson"]},
     packages=find_packages(),
-    python_requires=">=3.6"
+    python_requires=">=3.7"
 )
@@ -0,0 +1,28 @@
+import re
+
+
+class Rejected(Exception):
+    """Raised by a resolver to make the API fail one call of a batch with the exception's message."""
+
+
+def answer_batch(query: str, variables: dict, variable: str, resolve):
+    """Answers an aliased `Batch` document like the API does.
+
+    Args:
+        query (str): The batched document.
+        variables (dict): Its variables.
+        variable (str): The variable of each call passed to `resolve`, e.g. "currency".
+        resolve: Function returning the data of a call from its `variable`, or raising `Rejected`.
+
+    Returns:
+        response: The data of every call, keyed by alias, and the errors of those rejected.
+    """
+    data, errors = {}, []
+    # The aliases are declared in order in the document's variable definitions, before its first ")".
+    for alias in re.findall(r"\$(b\d+)_{}\b".format(variable), query.split(")", 1)[0]):
+        try:
+            data[alias] = resolve(variables["{}_{}".format(alias, variable)])
+        except Rejected as e:
+            data[alias] = None
+            errors.append({"message": str(e), "path": [alias]})
+    return {"data": data, "errors": errors} if errors else {"data": data}
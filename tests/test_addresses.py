@@ -0,0 +1,104 @@
+import itertools
+import time
+from unittest.mock import patch
+
+from buycoins import Wallet
+from buycoins.addresses import AddressPool
+from tests.fake_api import answer_batch
+
+
+def creator():
+    """Returns an `_execute_request` replacement creating numbered addresses, and the list of batch sizes sent."""
+    counter, sizes = itertools.count(), []
+
+    def create(currency):
+        return {"cryptocurrency": currency, "address": "{}-{}".format(currency, next(counter))}
+
+    def execute(client, query, variables=None, idempotency_key=None):
+        if not query.startswith("mutation Batch"):
+            return {"data": {"createAddress": create(variables["currency"])}}
+        response = answer_batch(query, variables, "currency", create)
+        sizes.append(len(response["data"]))
+        return response
+
+    return execute, sizes
+
+
+def wait_for(condition):
+    deadline = time.monotonic() + 2
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+
+
+def test_refill_creates_batches_up_to_target():
+    execute, sizes = creator()
+    with patch.object(Wallet, "_execute_request", autospec=True, side_effect=execute):
+        pool = AddressPool(Wallet(), currencies=["bitcoin", "ethereum"], target=7, batch_size=3, background=False)
+
+        assert pool.refill() == 14
+        assert sorted(sizes) == [1, 1, 3, 3, 3, 3]
+        assert pool.stock() == {"bitcoin": 7, "ethereum": 7}
+        assert pool.refill() == 0
+
+
+def test_addresses_are_handed_out_once_and_survive_restarts(tmp_path):
+    path = str(tmp_path / "addresses.db")
+    execute, _ = creator()
+    with patch.object(Wallet, "_execute_request", autospec=True, side_effect=execute) as request:
+        pool = AddressPool(Wallet(), path, currencies=["bitcoin"], target=4, background=False)
+        pool.refill()
+        first = pool.get("bitcoin")
+        pool.close()
+
+        pool = AddressPool(Wallet(), path, currencies=["bitcoin"], target=4, background=False)
+        second = pool.get("bitcoin")
+        assert request.call_count == 1
+
+    assert first == {"cryptocurrency": "bitcoin", "address": "bitcoin-0"}
+    assert second["address"] == "bitcoin-1"
+    assert pool.stock("bitcoin") == 2
+    assert pool.get("dogecoin")["message"] == "Invalid or unsupported cryptocurrency"
+
+
+def test_low_watermark_alerts_and_refills_in_background():
+    execute, _ = creator()
+    alerts = []
+    with patch.object(Wallet, "_execute_request", autospec=True, side_effect=execute):
+        with AddressPool(Wallet(), currencies=["bitcoin"], target=5, low_watermark=2, on_low=lambda *alert: alerts.append(alert)) as pool:
+            wait_for(lambda: pool.stock("bitcoin") == 5)
+            addresses = {pool.get("bitcoin")["address"] for _ in range(3)}
+
+            assert alerts == [("bitcoin", 2)]
+            wait_for(lambda: pool.stock("bitcoin") == 5)
+            assert pool.stock("bitcoin") == 5
+            stats = pool.stats()
+
+    assert len(addresses) == 3
+    assert stats["handed_out"] == 3
+    assert stats["created"] == 8
+    assert stats["alerts"] == 1
+
+
+def test_empty_stock_falls_back_to_the_api():
+    execute, _ = creator()
+    alerts = []
+    with patch.object(Wallet, "_execute_request", autospec=True, side_effect=execute) as request:
+        pool = AddressPool(Wallet(), currencies=["bitcoin"], background=False, on_low=lambda *alert: alerts.append(alert))
+        address = pool.get("bitcoin")
+
+    assert request.call_count == 1
+    assert address["address"] == "bitcoin-0"
+    assert pool.stats()["misses"] == 1
+    assert alerts == [("bitcoin", 0)]
+
+
+def test_failed_refills_are_counted():
+    def fail(client, query, variables=None, idempotency_key=None):
+        return {"data": {}, "errors": [{"message": "Service unavailable"}]}
+
+    with patch.object(Wallet, "_execute_request", autospec=True, side_effect=fail):
+        pool = AddressPool(Wallet(), currencies=["bitcoin"], target=3, background=False)
+        assert pool.refill() == 0
+
+    assert pool.stats()["failed"] == 3
+    assert pool.stock("bitcoin") == 0
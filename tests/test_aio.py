@@ -0,0 +1,139 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from aiohttp import web
+
+from buycoins import AsyncNGNT, AsyncP2P, AsyncWallet, P2P
+from tests.mock_responses import coin_price, getEstimatedNetworkFee
+from tests.test_pagination import page
+
+
+async def serve(handler):
+    app = web.Application()
+    app.router.add_post("/api/graphql", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, "http://127.0.0.1:{}/api/graphql".format(port)
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_async_methods_return_data():
+    async def handler(request):
+        body = await request.json()
+        if "getEstimatedNetworkFee" in body["query"]:
+            return web.json_response({"data": {"getEstimatedNetworkFee": getEstimatedNetworkFee}})
+        return web.json_response({"data": {"getPrices": [coin_price["getPrices"]]}})
+
+    async def main():
+        runner, endpoint = await serve(handler)
+        with patch("buycoins.client.ENDPOINT", endpoint):
+            async with AsyncP2P() as p2p, AsyncWallet() as wallet:
+                price, fee = await asyncio.gather(p2p.get_current_price("buy", "bitcoin"), wallet.get_network_fee("bitcoin", 0.01))
+        await runner.cleanup()
+        return price, fee
+
+    price, fee = run(main())
+    assert price[0]["buyPricePerCoin"] == "17164294"
+    assert fee["total"] == 0.01044
+
+
+def test_validation_matches_sync_client():
+    async def main():
+        async with AsyncP2P() as p2p:
+            return await p2p.get_current_price("hold", "bitcoin")
+
+    assert run(main()) == P2P().get_current_price("hold", "bitcoin")
+
+
+def test_error_mapping():
+    async def handler(request):
+        body = await request.json()
+        if body["variables"]["status"] == "open":
+            return web.json_response({"errors": [{"message": "Not allowed"}]})
+        return web.Response(status=502)
+
+    async def main():
+        runner, endpoint = await serve(handler)
+        with patch("buycoins.client.ENDPOINT", endpoint):
+            async with AsyncP2P() as p2p:
+                results = await p2p.get_orders("open"), await p2p.get_orders("completed")
+        await runner.cleanup()
+        return results
+
+    graphql_error, server_error = run(main())
+    assert graphql_error == {"status": "error", "name": "P2PError", "code": 404, "message": "Not allowed"}
+    assert server_error["name"] == "ServerError"
+    assert server_error["code"] == 502
+
+
+def test_connection_error():
+    async def main():
+        with patch("buycoins.client.ENDPOINT", "http://127.0.0.1:9/api/graphql"):
+            async with AsyncP2P() as p2p:
+                return await p2p.get_prices()
+
+    response = run(main())
+    assert response["name"] == "ServerError"
+    assert response["code"] == 503
+
+
+def test_concurrency_is_bounded():
+    in_flight = []
+    peak = []
+
+    async def handler(request):
+        in_flight.append(1)
+        peak.append(len(in_flight))
+        await asyncio.sleep(0.01)
+        in_flight.pop()
+        return web.json_response({"data": {"getPrices": []}})
+
+    async def main():
+        runner, endpoint = await serve(handler)
+        with patch("buycoins.client.ENDPOINT", endpoint):
+            async with AsyncP2P(max_concurrency=5) as p2p:
+                results = await asyncio.gather(*(p2p.get_prices() for _ in range(50)))
+        await runner.cleanup()
+        return results
+
+    assert run(main()) == [[]] * 50
+    assert max(peak) <= 5
+
+
+@pytest.mark.parametrize("prefetch", [False, True])
+def test_iter_orders_is_an_async_iterator(prefetch):
+    pages = {None: page("getOrders", ["1", "2"], "c1"), "c1": page("getOrders", ["3"])}
+    cursors = []
+
+    async def handler(request):
+        body = await request.json()
+        cursors.append(body["variables"]["after"])
+        return web.json_response(pages[body["variables"]["after"]])
+
+    async def main():
+        runner, endpoint = await serve(handler)
+        with patch("buycoins.client.ENDPOINT", endpoint):
+            async with AsyncP2P() as p2p:
+                orders = [order["id"] async for order in p2p.iter_orders("completed", page_size=2, prefetch=prefetch)]
+        await runner.cleanup()
+        return orders
+
+    assert run(main()) == ["1", "2", "3"]
+    assert cursors == [None, "c1"]
+
+
+def test_blocking_helpers_are_refused():
+    p2p, wallet, ngnt = AsyncP2P(), AsyncWallet(), AsyncNGNT()
+
+    calls = [p2p.batch, wallet.batch, p2p.stream_orders, p2p.stream_market_book]
+    calls += [lambda: ngnt.create_deposit_accounts(["Ada"]), lambda: wallet.send_payouts([])]
+    for call in calls:
+        with pytest.raises(NotImplementedError):
+            call()
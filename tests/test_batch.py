@@ -0,0 +1,94 @@
+from unittest.mock import patch
+
+import pytest
+
+from buycoins import BuyCoinsClient
+from buycoins.exceptions import QueryError
+from tests.mock_responses import getEstimatedNetworkFee, bitcoin_balance
+
+
+def test_batch_sends_one_aliased_document():
+    client = BuyCoinsClient()
+    response = {
+        "data": {
+            "b0": [{"id": "buy-price", "buyPricePerCoin": "17164294"}],
+            "b1": [{"id": "sell-price", "sellPricePerCoin": "16824359.1781"}],
+            "b2": getEstimatedNetworkFee,
+            "b3": bitcoin_balance["getBalances"],
+        }
+    }
+
+    with patch.object(client, "_execute_request", return_value=response) as execute:
+        with client.batch() as batch:
+            buy = batch.p2p.get_current_price("buy", "bitcoin")
+            sell = batch.p2p.get_current_price("sell", "bitcoin")
+            fee = batch.wallet.get_network_fee("bitcoin", 0.01)
+            balance = batch.wallet.get_balances("bitcoin")
+
+    assert execute.call_count == 1
+    document = execute.call_args[1]["query"]
+    variables = execute.call_args[1]["variables"]
+    assert document.startswith("query Batch($b0_side:OrderSide,$b0_currency:Cryptocurrency,$b1_side:")
+    assert "b0:getPrices(side:$b0_side,cryptocurrency:$b0_currency)" in document
+    assert "b2:getEstimatedNetworkFee(cryptocurrency:$b2_currency,amount:$b2_amount)" in document
+    assert variables == {
+        "b0_side": "buy",
+        "b0_currency": "bitcoin",
+        "b1_side": "sell",
+        "b1_currency": "bitcoin",
+        "b2_currency": "bitcoin",
+        "b2_amount": 0.01,
+        "b3_currency": "bitcoin",
+    }
+
+    assert buy.result()[0]["id"] == "buy-price"
+    assert sell.result()[0]["id"] == "sell-price"
+    assert fee.result()["total"] == 0.01044
+    assert balance.result()[0]["confirmedBalance"] == 0.009
+
+
+def test_batch_errors_are_mapped_per_call():
+    client = BuyCoinsClient()
+    response = {
+        "data": {"b0": None, "b1": {"estimatedFee": 0.00044, "total": 0.01044}},
+        "errors": [{"message": "Invalid status", "path": ["b0"]}],
+    }
+
+    with patch.object(client, "_execute_request", return_value=response):
+        batch = client.batch()
+        orders = batch.p2p.get_orders("open")
+        fee = batch.wallet.get_network_fee("bitcoin", 0.01)
+        invalid = batch.p2p.get_orders("pending")
+        results = batch.send()
+
+    assert orders.result() == {"status": "error", "name": "P2PError", "code": 404, "message": "Invalid status"}
+    assert fee.result()["total"] == 0.01044
+    assert invalid.result() == {"status": "error", "name": "P2PError", "code": 400, "message": "Invalid status passed"}
+    assert results == [orders.result(), fee.result(), invalid.result()]
+
+
+def test_batch_sends_mutations_separately():
+    client = BuyCoinsClient()
+    responses = [
+        {"data": {"b0": [{"id": "bitcoin-balance"}]}},
+        {"data": {"b0": {"cryptocurrency": "bitcoin", "address": "address"}}},
+    ]
+
+    with patch.object(client, "_execute_request", side_effect=responses) as execute:
+        with client.batch() as batch:
+            balances = batch.wallet.get_balances()
+            address = batch.wallet.create_address("bitcoin")
+
+    assert execute.call_count == 2
+    assert execute.call_args_list[0][1]["query"].startswith("query Batch{")
+    assert execute.call_args_list[1][1]["query"].startswith("mutation Batch(")
+    assert balances.result() == [{"id": "bitcoin-balance"}]
+    assert address.result()["address"] == "address"
+
+
+def test_result_before_send():
+    batch = BuyCoinsClient().batch()
+    prices = batch.p2p.get_prices()
+
+    with pytest.raises(QueryError):
+        prices.result()
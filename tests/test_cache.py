@@ -0,0 +1,308 @@
+import json
+import time
+from decimal import Decimal
+from unittest.mock import Mock, patch
+
+from buycoins import P2P, Wallet
+from buycoins.cache import BalanceCache, FeeCache, PriceCache
+from buycoins.models import Balance, NetworkFee, Price
+
+
+def price_response(expires_in: float, price_id: str = "price"):
+    return {"data": {"getPrices": [{"id": price_id, "cryptocurrency": "bitcoin", "expiresAt": time.time() + expires_in}]}}
+
+
+def test_price_cache_serves_until_expiry():
+    cache = PriceCache(margin=1, background=False)
+    p2p = P2P(price_cache=cache)
+
+    with patch.object(p2p, "_execute_request", return_value=price_response(30)) as execute:
+        first = p2p.get_current_price("buy", "bitcoin")
+        second = p2p.get_current_price("buy", "bitcoin")
+        p2p.get_current_price("sell", "bitcoin")
+
+    assert first is second
+    assert execute.call_count == 2
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_price_cache_keeps_typed_results_apart():
+    cache = PriceCache(background=False)
+    typed, untyped = P2P(price_cache=cache, typed=True), P2P(price_cache=cache)
+
+    with patch.object(P2P, "_execute_request", side_effect=lambda *args, **kwargs: price_response(30)) as execute:
+        assert isinstance(typed.get_current_price("buy", "bitcoin")[0], Price)
+        assert isinstance(untyped.get_current_price("buy", "bitcoin")[0], dict)
+        assert isinstance(typed.get_current_price("buy", "bitcoin")[0], Price)
+
+    assert execute.call_count == 2
+
+
+def test_price_cache_skips_expired_and_failed_prices():
+    cache = PriceCache(margin=1, background=False)
+    p2p = P2P(price_cache=cache)
+    responses = [price_response(0.5), {"errors": [{"message": "Unavailable"}]}, {"errors": [{"message": "Unavailable"}]}]
+
+    with patch.object(p2p, "_execute_request", side_effect=responses) as execute:
+        p2p.get_current_price("buy", "bitcoin")
+        error = p2p.get_current_price("buy", "bitcoin")
+        p2p.get_current_price("buy", "bitcoin")
+
+    assert error["name"] == "P2PError"
+    assert execute.call_count == 3
+    assert cache.hits == 0
+
+
+def test_price_cache_refreshes_read_entries():
+    cache = PriceCache(margin=0, refresh_ahead=10, background=False)
+    p2p = P2P(price_cache=cache)
+    responses = [price_response(5, "first"), price_response(60, "second"), price_response(60, "third")]
+
+    with patch.object(p2p, "_execute_request", side_effect=responses):
+        p2p.get_prices()
+        p2p.get_prices()
+        p2p.get_current_price("buy", "bitcoin")
+        cache.refresh()
+        assert cache.refreshes == 0
+        with patch("buycoins.cache.time.time", return_value=time.time() + 3):
+            cache.refresh()
+        refreshed = p2p.get_prices()
+
+    assert refreshed[0]["id"] == "third"
+    assert cache.refreshes == 1
+
+
+def test_price_cache_background_refresh():
+    cache = PriceCache(margin=0, refresh_ahead=0.9)
+    p2p = P2P(price_cache=cache)
+    responses = [price_response(1, "first")] + [price_response(60, "second")] * 5
+
+    with patch.object(p2p, "_execute_request", side_effect=responses) as execute:
+        p2p.get_prices()
+        p2p.get_prices()
+        deadline = time.time() + 2
+        while cache.refreshes == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        refreshed = p2p.get_prices()
+    cache.close()
+
+    assert refreshed[0]["id"] == "second"
+    assert execute.call_count == 2
+
+
+def test_price_cache_survives_failed_reloads():
+    cache = PriceCache(margin=0, refresh_ahead=0.9)
+    p2p = P2P(price_cache=cache)
+    responses = [price_response(1, "first"), ValueError("Bad response"), price_response(1, "second"), price_response(60, "third")]
+
+    with patch.object(p2p, "_execute_request", side_effect=responses) as execute:
+        p2p.get_prices()
+        p2p.get_prices()
+        deadline = time.time() + 2
+        while cache._entries and time.time() < deadline:
+            time.sleep(0.01)
+        assert p2p.get_prices()[0]["id"] == "second"
+        p2p.get_prices()
+        deadline = time.time() + 2
+        while cache.refreshes < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        refreshed = p2p.get_prices()
+    cache.close()
+
+    assert refreshed[0]["id"] == "third"
+    assert cache.refreshes == 2
+    assert execute.call_count == 4
+
+
+def fee_response(amount, fee="0.0002"):
+    return {"data": {"getEstimatedNetworkFee": {"estimatedFee": fee, "total": str(Decimal(str(amount)) + Decimal(fee))}}}
+
+
+def test_fee_cache_serves_amount_buckets():
+    cache = FeeCache(ttl=30, bucket_size={"bitcoin": 0.001})
+    wallet = Wallet(fee_cache=cache)
+
+    with patch.object(wallet, "_execute_request", side_effect=lambda query, variables, idempotency_key=None: fee_response(variables["amount"])) as execute:
+        first = wallet.get_network_fee("bitcoin", 0.0101)
+        nearby = wallet.get_network_fee("bitcoin", 0.0109)
+        wallet.get_network_fee("bitcoin", 0.0111)
+        wallet.get_network_fee("ethereum", 0.0101)
+        wallet.get_network_fee("bitcoin", 0.0101, fields=["estimatedFee"])
+
+    assert execute.call_count == 3
+    assert "total" in execute.call_args[1]["query"]
+    assert first == {"estimatedFee": "0.0002", "total": "0.0103"}
+    assert nearby == {"estimatedFee": "0.0002", "total": "0.0111"}
+    assert cache.stats() == {"hits": 2, "model_hits": 0, "misses": 3, "hit_rate": 0.4, "entries": 3}
+
+
+def test_fee_cache_keeps_typed_estimates_apart():
+    cache = FeeCache(ttl=30, model=True, min_observations=2)
+    typed, untyped = Wallet(fee_cache=cache, typed=True), Wallet(fee_cache=cache)
+
+    with patch.object(Wallet, "_execute_request", side_effect=lambda query, variables, idempotency_key=None: fee_response(variables["amount"])) as execute:
+        for amount in (0.01, 0.03):
+            assert isinstance(typed.get_network_fee("bitcoin", amount), NetworkFee)
+        assert isinstance(untyped.get_network_fee("bitcoin", 0.01), dict)
+        assert isinstance(untyped.get_network_fee("bitcoin", 0.02), dict)
+        assert isinstance(typed.get_network_fee("bitcoin", 0.02), NetworkFee)
+
+    assert execute.call_count == 4
+    assert cache.stats()["model_hits"] == 1
+
+
+def test_fee_cache_expires_and_invalidates():
+    cache = FeeCache(ttl=30)
+    wallet = Wallet(fee_cache=cache)
+    responses = [fee_response(0.01), {"errors": [{"message": "Unavailable"}]}, fee_response(0.01), fee_response(0.01)]
+
+    with patch.object(wallet, "_execute_request", side_effect=responses) as execute:
+        wallet.get_network_fee("bitcoin", 0.01)
+        cache.invalidate("bitcoin")
+        assert wallet.get_network_fee("bitcoin", 0.01)["name"] == "WalletError"
+        wallet.get_network_fee("bitcoin", 0.01)
+        with patch("buycoins.cache.time.monotonic", return_value=time.monotonic() + 31):
+            wallet.get_network_fee("bitcoin", 0.01)
+
+    assert execute.call_count == 4
+    assert cache.hits == 0
+
+
+def test_fee_cache_models_the_fee_curve():
+    cache = FeeCache(ttl=30, model=True, tolerance=0.01)
+    wallet = Wallet(fee_cache=cache, typed=True)
+
+    def linear(query, variables, idempotency_key=None):
+        amount = Decimal(str(variables["amount"]))
+        return fee_response(amount, str(Decimal("0.0001") + amount / 100))
+
+    with patch.object(wallet, "_execute_request", side_effect=linear) as execute:
+        for amount in (0.01, 0.05, 0.1):
+            wallet.get_network_fee("bitcoin", amount)
+        estimate = wallet.get_network_fee("bitcoin", 0.07)
+        wallet.get_network_fee("bitcoin", 0.2)
+
+    assert execute.call_count == 4
+    assert estimate.estimated_fee == Decimal("0.0008")
+    assert estimate.total == Decimal("0.0708")
+    assert cache.stats()["model_hits"] == 1
+
+
+def test_fee_cache_distrusts_curves_that_do_not_fit():
+    cache = FeeCache(ttl=30, model=True, tolerance=0.01)
+    fees = iter(["0.0001", "0.0009", "0.0002"])
+
+    for amount in (0.01, 0.05, 0.1):
+        cache.get("bitcoin", amount, lambda: {"estimatedFee": next(fees), "total": "0"})
+    loader = Mock(return_value={"estimatedFee": "0.0004", "total": "0.0704"})
+
+    assert cache.get("bitcoin", 0.07, loader)["estimatedFee"] == "0.0004"
+    assert loader.call_count == 1
+
+
+def balances_response(balance="1.5"):
+    return {"data": {"getBalances": [{"id": "balance", "cryptocurrency": "bitcoin", "confirmedBalance": balance}]}}
+
+
+def test_balance_cache_serves_reads_until_stale():
+    cache = BalanceCache(max_staleness=30)
+    wallet = Wallet(balance_cache=cache, auth_key="public:secret")
+    responses = [balances_response("1"), balances_response("2"), balances_response("3"), balances_response("4")]
+
+    with patch.object(wallet, "_execute_request", side_effect=responses) as execute:
+        assert wallet.get_balances("bitcoin")[0]["confirmedBalance"] == "1"
+        assert wallet.get_balances("bitcoin")[0]["confirmedBalance"] == "1"
+        assert wallet.get_balances("bitcoin", refresh=True)[0]["confirmedBalance"] == "2"
+        assert wallet.get_balances("bitcoin", max_staleness=0)[0]["confirmedBalance"] == "3"
+        assert wallet.get_balances()[0]["confirmedBalance"] == "4"
+
+    assert execute.call_count == 4
+    assert cache.stats() == {"hits": 1, "misses": 4, "hit_rate": 0.2, "entries": 2}
+
+
+def test_balance_cache_keeps_typed_balances_apart():
+    cache = BalanceCache()
+    typed = Wallet(balance_cache=cache, auth_key="public:secret", typed=True)
+    untyped = Wallet(balance_cache=cache, auth_key="public:secret")
+
+    with patch.object(Wallet, "_execute_request", side_effect=lambda *args, **kwargs: balances_response()) as execute:
+        assert isinstance(typed.get_balances("bitcoin")[0], Balance)
+        assert isinstance(untyped.get_balances("bitcoin")[0], dict)
+        assert isinstance(typed.get_balances("bitcoin")[0], Balance)
+
+    assert execute.call_count == 2
+
+
+def test_successful_transfers_invalidate_balances():
+    cache = BalanceCache()
+    wallet = Wallet(balance_cache=cache, auth_key="public:secret")
+    other = Wallet(balance_cache=cache, auth_key="other:secret")
+    responses = [
+        balances_response(), balances_response(), balances_response(),
+        {"errors": [{"message": "Insufficient balance"}]},
+        {"data": {"send": {"id": "send"}}},
+        balances_response(), balances_response(),
+    ]
+
+    with patch.object(Wallet, "_execute_request", side_effect=responses) as execute:
+        wallet.get_balances("bitcoin")
+        wallet.get_balances("ethereum")
+        other.get_balances("bitcoin")
+        wallet.send_crypto("address", "bitcoin", 0.01)
+        wallet.get_balances("bitcoin")
+        wallet.send_crypto("address", "bitcoin", 0.01)
+        wallet.get_balances("bitcoin")
+        wallet.get_balances("ethereum")
+        other.get_balances("bitcoin")
+
+    assert execute.call_count == 6
+    assert cache.hits == 3
+
+
+def test_balance_cache_ignores_balances_loaded_during_invalidation():
+    cache = BalanceCache()
+
+    def loader():
+        cache.invalidate("public")
+        return [{"confirmedBalance": "1"}]
+
+    cache.get(("public", None), loader)
+    assert cache.stats()["entries"] == 0
+
+
+def test_verified_webhook_events_invalidate_balances():
+    from buycoins.webhook import Webhook
+    from tests.test_webhook import TOKEN, sign
+
+    cache = BalanceCache()
+    load = Mock(return_value=[{"confirmedBalance": "1"}])
+    deposit = json.dumps({"hook_id": 1, "payload": {"event": "coins.incoming", "data": {"cryptocurrency": "bitcoin"}}}).encode()
+    other = json.dumps({"hook_id": 2, "payload": {"event": "deposit_account.created"}}).encode()
+
+    for currency in ("bitcoin", "ethereum"):
+        cache.get(("public", currency), load)
+    assert not cache.handle_webhook(Webhook(deposit, TOKEN, sign(deposit, "other-token")), "public")
+    assert cache.handle_webhook(Webhook(other, TOKEN, sign(other)), "public")
+    assert cache.stats()["entries"] == 2
+
+    assert cache.handle_webhook(Webhook(deposit, TOKEN, sign(deposit)), "public")
+    assert cache.stats()["entries"] == 1
+    assert cache.invalidate_event(json.loads(deposit))
+    assert cache.stats()["entries"] == 0
+
+
+def test_price_cache_serves_short_lived_prices_in_background_mode():
+    cache = PriceCache()
+    p2p = P2P(price_cache=cache)
+
+    try:
+        with patch.object(p2p, "_execute_request", side_effect=lambda *args, **kwargs: price_response(5)) as execute:
+            for _ in range(20):
+                p2p.get_current_price("buy", "bitcoin")
+                time.sleep(0.005)
+    finally:
+        cache.close()
+
+    assert cache.misses == 1
+    assert cache.hits == 19
+    assert execute.call_count <= 2
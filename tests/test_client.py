@@ -0,0 +1,44 @@
+import json
+from unittest.mock import Mock, patch
+
+from buycoins import BuyCoinsClient, P2P, Wallet
+from buycoins import client as client_module
+
+
+def test_clients_share_session():
+    p2p, wallet = P2P(), Wallet()
+
+    assert p2p._initiate_client() is wallet._initiate_client()
+
+    p2p.close()
+    wallet.close()
+
+
+def test_session_closed_after_last_client():
+    with BuyCoinsClient() as first:
+        first._initiate_client()
+        with BuyCoinsClient() as second:
+            second._initiate_client()
+        assert client_module.auth_key in client_module._sessions
+
+    assert client_module.auth_key not in client_module._sessions
+
+
+def test_execute_request_uses_pooled_session():
+    response = Mock(content=b'{"data": {"getPrices": []}}')
+
+    with BuyCoinsClient() as client:
+        with patch.object(client._initiate_client(), "post", return_value=response) as post:
+            assert client._execute_request("query { getPrices { id } }") == {"data": {"getPrices": []}}
+            client._execute_request("query { getPrices { id } }")
+
+    assert post.call_count == 2
+    assert json.loads(post.call_args[1]["data"]) == {"query": "query { getPrices { id } }"}
+
+
+def test_warm_up_opens_connections():
+    with BuyCoinsClient(pool_size=4) as client:
+        with patch.object(client._initiate_client(), "head") as head:
+            client.warm_up(8)
+
+    assert head.call_count == 4
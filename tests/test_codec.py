@@ -0,0 +1,108 @@
+import json
+from unittest.mock import Mock, patch
+
+import pytest
+
+from buycoins import P2P
+from buycoins.codec import CODECS, NodeStream, get_codec
+from buycoins.exceptions import P2PError, QueryError
+from buycoins.models import Order
+
+
+def market_book(count: int):
+    nodes = [
+        {"id": "order-{}".format(i), "side": "buy", "cryptocurrency": "bitcoin", "pricePerCoin": str(100 + i), "note": 'a "{quoted}" [value]\\'}
+        for i in range(count)
+    ]
+    document = {
+        "data": {
+            "getMarketBook": {
+                "dynamicPriceExpiry": 1612100000,
+                "orders": {"pageInfo": {"hasNextPage": False}, "edges": [{"node": node} for node in nodes]},
+            }
+        }
+    }
+    return nodes, json.dumps(document, indent=2).encode()
+
+
+def chunked(body: bytes, size: int):
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+
+def test_get_codec():
+    assert get_codec().name == ("orjson" if "orjson" in CODECS else "json")
+    assert get_codec("json") is CODECS["json"]
+    with pytest.raises(QueryError):
+        get_codec("simplejson")
+
+
+def test_codecs_round_trip():
+    value = {"query": "query{getPrices{id}}", "variables": {"amount": 0.01, "name": "Ada"}}
+
+    for codec in CODECS.values():
+        assert b" " not in codec.dumps(value).replace(b"Ada", b"")
+        assert codec.loads(codec.dumps(value)) == value
+
+
+@pytest.mark.parametrize("size", [1, 7, 4096])
+def test_node_stream_yields_nodes_as_they_arrive(size):
+    nodes, body = market_book(20)
+    chunks = chunked(body, size)
+    received = []
+
+    def arriving():
+        for chunk in chunks:
+            received.append(chunk)
+            yield chunk
+
+    stream = NodeStream(arriving(), get_codec("json"))
+    iter_stream = iter(stream)
+    first = next(iter_stream)
+    assert first == nodes[0]
+    assert len(received) < len(chunks)
+
+    assert [first] + list(iter_stream) == nodes
+    assert stream.document["data"]["getMarketBook"]["orders"] == {"pageInfo": {"hasNextPage": False}, "edges": []}
+    assert stream.document["data"]["getMarketBook"]["dynamicPriceExpiry"] == 1612100000
+
+
+def test_node_stream_without_edges():
+    stream = NodeStream(chunked(b'{"errors": [{"message": "Unauthorized"}]}', 5))
+
+    assert list(stream) == []
+    assert stream.document == {"errors": [{"message": "Unauthorized"}]}
+
+
+def test_stream_market_book():
+    nodes, body = market_book(3)
+    response = Mock(iter_content=Mock(return_value=chunked(body, 16)))
+    p2p = P2P(typed=True)
+
+    with patch.object(p2p._initiate_client(), "post", return_value=response) as post:
+        orders = list(p2p.stream_market_book(fields=["id", "pricePerCoin"]))
+
+    assert post.call_args[1]["stream"] is True
+    assert [order.id for order in orders] == ["order-0", "order-1", "order-2"]
+    assert isinstance(orders[0], Order)
+    assert response.close.call_count == 1
+
+    response = Mock(iter_content=Mock(return_value=[b'{"errors": [{"message": "Not allowed"}]}']))
+    with patch.object(p2p._initiate_client(), "post", return_value=response):
+        with pytest.raises(P2PError):
+            list(p2p.stream_orders("open"))
+    p2p.close()
+
+
+def test_streams_closed_early_release_their_response():
+    _, body = market_book(3)
+    response = Mock(iter_content=Mock(return_value=chunked(body, 16)))
+    p2p = P2P()
+
+    with patch.object(p2p._initiate_client(), "post", return_value=response):
+        orders = p2p.stream_market_book()
+        assert next(orders)["id"] == "order-0"
+        assert response.close.call_count == 0
+        orders.close()
+
+    assert response.close.call_count == 1
+    p2p.close()
@@ -0,0 +1,61 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import buycoins
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_TIME = """
+import json, sys, time
+started = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"elapsed": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+
+def fresh_import(statement: str):
+    """Runs `statement` in a new interpreter without the `auth_key` setting, returning its duration and modules."""
+    env = {key: value for key, value in os.environ.items() if key != "auth_key"}
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_TIME.format(statement=statement)],
+        cwd=ROOT, env=env, stdout=subprocess.PIPE, check=True,
+    ).stdout
+    return json.loads(output)
+
+
+def test_import_is_lazy():
+    result = fresh_import("import buycoins")
+
+    for module in ("requests", "aiohttp", "numpy", "decouple", "buycoins.client"):
+        assert module not in result["modules"]
+    # Timed against loading a client in the same conditions, so a slow machine doesn't fail the test.
+    eager = fresh_import("import buycoins; buycoins.P2P")
+    assert "requests" in eager["modules"]
+    assert result["elapsed"] < eager["elapsed"]
+
+
+def test_webhook_needs_neither_requests_nor_credentials():
+    result = fresh_import("from buycoins import Webhook; Webhook(b'{}', 'token', '').verify_request()")
+
+    assert "requests" not in result["modules"]
+    assert "aiohttp" not in result["modules"]
+
+
+def test_exports():
+    assert all(getattr(buycoins, name) for name in buycoins.__all__)
+    with pytest.raises(AttributeError):
+        buycoins.Missing
+    assert buycoins.queries.GET_PRICES.document.startswith("query{")
+    assert "P2P" in dir(buycoins)
+
+
+def test_auth_key_can_be_passed():
+    from buycoins import P2P
+
+    with P2P(auth_key="public:secret") as p2p:
+        assert p2p._initiate_client().auth.username == "public"
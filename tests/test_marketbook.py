@@ -0,0 +1,77 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from buycoins.marketbook import MarketBook
+from buycoins.models import Orders
+from tests.mock_responses import get_market_book
+
+
+def order(order_id, side, price, amount, currency="bitcoin"):
+    return {
+        "id": order_id,
+        "cryptocurrency": currency,
+        "coinAmount": str(amount),
+        "side": side,
+        "status": "active",
+        "createdAt": 1612308511,
+        "pricePerCoin": str(price),
+    }
+
+
+@pytest.fixture
+def book():
+    return MarketBook.from_orders(
+        [
+            order("1", "buy", 100, 1),
+            order("2", "buy", 99, 2),
+            order("3", "buy", 100, 0.5),
+            order("4", "sell", 101, 1),
+            order("5", "sell", 103, 2),
+            order("6", "sell", 50, 10, currency="ethereum"),
+        ]
+    )
+
+
+def test_from_response():
+    book = MarketBook.from_response(get_market_book)
+    typed = MarketBook.from_response(Orders.from_dict(get_market_book))
+
+    assert len(book) == len(typed) == 1
+    assert book.price[0] == typed.price[0] == 1650000000
+    assert book.currencies == ("bitcoin",)
+
+
+def test_filter(book):
+    assert len(book.filter(currency="ethereum")) == 1
+    assert len(book.filter(currency="bitcoin", side="buy")) == 3
+    assert len(book.filter(currency="litecoin")) == 0
+
+
+def test_best_prices(book):
+    bitcoin = book.filter(currency="bitcoin")
+
+    assert bitcoin.best_bid() == 100
+    assert bitcoin.best_ask() == 101
+    assert bitcoin.spread() == 1
+    assert bitcoin.filter(side="buy").best_ask() is None
+
+
+def test_depth(book):
+    depth = book.filter(currency="bitcoin").depth(levels=1)
+    cumulative = book.filter(currency="bitcoin").cumulative_depth()
+
+    assert depth["buy"][0].tolist() == [100]
+    assert depth["buy"][1].tolist() == [1.5]
+    assert cumulative["buy"][1].tolist() == [1.5, 3.5]
+    assert cumulative["sell"][0].tolist() == [101, 103]
+    assert cumulative["sell"][1].tolist() == [1, 3]
+
+
+def test_vwap(book):
+    bitcoin = book.filter(currency="bitcoin")
+
+    assert bitcoin.vwap(1) == 101
+    assert bitcoin.vwap(2) == pytest.approx((101 + 103) / 2)
+    assert bitcoin.vwap(2, side="sell") == pytest.approx((1.5 * 100 + 0.5 * 99) / 2)
+    assert bitcoin.vwap(10) is None
@@ -0,0 +1,63 @@
+from decimal import Decimal
+from unittest.mock import patch
+
+from buycoins import P2P, Wallet
+from buycoins.models import Balance, NetworkFee, Order, Orders, Price, SendResult
+from tests.mock_responses import all_coins_balances, coin_price, get_market_book, getEstimatedNetworkFee, send
+
+
+def test_typed_prices():
+    p2p = P2P(typed=True)
+
+    with patch.object(p2p, "_execute_request", return_value={"data": {"getPrices": [coin_price["getPrices"]]}}):
+        prices = p2p.get_current_price("buy", "bitcoin")
+
+    assert prices == [Price.from_dict(coin_price["getPrices"])]
+    assert prices[0].buy_price_per_coin == Decimal("17164294")
+    assert prices[0].sell_price_per_coin == Decimal("16824359.1781")
+    assert prices[0].expires_at is None
+
+
+def test_typed_market_book():
+    p2p = P2P(typed=True)
+
+    with patch.object(p2p, "_execute_request", return_value={"data": {"getMarketBook": get_market_book}}):
+        book = p2p.get_market_book()
+
+    assert isinstance(book, Orders)
+    assert book.dynamic_price_expiry == 1612309392
+    assert isinstance(book.orders[0], Order)
+    assert book.orders[0].coin_amount == Decimal("0.003196")
+    assert book.orders[0].dynamic_exchange_rate is None
+
+
+def test_typed_wallet():
+    wallet = Wallet(typed=True)
+    responses = [
+        {"data": {"getBalances": all_coins_balances["getBalances"]}},
+        {"data": {"getEstimatedNetworkFee": getEstimatedNetworkFee}},
+    ]
+
+    with patch.object(wallet, "_execute_request", side_effect=responses):
+        balances = wallet.get_balances()
+        fee = wallet.get_network_fee("bitcoin", 0.01)
+
+    assert all(isinstance(balance, Balance) for balance in balances)
+    assert balances[2].confirmed_balance == Decimal("0.009")
+    assert fee == NetworkFee.from_dict(getEstimatedNetworkFee)
+    assert fee.total == Decimal("0.01044")
+
+
+def test_errors_are_not_typed():
+    p2p = P2P(typed=True)
+
+    with patch.object(p2p, "_execute_request", return_value={"errors": [{"message": "Unavailable"}]}):
+        assert p2p.get_prices()["name"] == "P2PError"
+
+
+def test_models_use_slots():
+    result = SendResult.from_dict(send)
+
+    assert not hasattr(result, "__dict__")
+    assert result.transaction.txhash == "hybuojpkllmjvvcdersxkjijmkllbvdsabl"
+    assert result.amount == Decimal("0.02")
@@ -0,0 +1,67 @@
+from buycoins.models import Order, Orders
+from buycoins.orderbook import LocalOrderBook
+from tests.mock_responses import get_market_book
+
+
+def order(order_id, side, price, amount="1", currency="bitcoin"):
+    return {"id": order_id, "cryptocurrency": currency, "side": side, "pricePerCoin": price, "coinAmount": amount}
+
+
+def test_apply_computes_delta():
+    book = LocalOrderBook()
+    deltas = []
+    book.subscribe(deltas.append)
+
+    first = book.apply([order("1", "buy", "100"), order("2", "sell", "101"), order("3", "sell", "105")])
+    second = book.apply([order("1", "buy", "100"), order("2", "sell", "101", amount="0.5"), order("4", "buy", "102")])
+    third = book.apply([order("1", "buy", "100"), order("2", "sell", "101", amount="0.5"), order("4", "buy", "102")])
+
+    assert [o["id"] for o in first.added] == ["1", "2", "3"]
+    assert [o["id"] for o in second.added] == ["4"]
+    assert [o["id"] for o in second.removed] == ["3"]
+    assert [o["id"] for o in second.changed] == ["2"]
+    assert third == ([], [], [])
+    assert deltas == [first, second]
+    assert len(book) == 3 and "3" not in book
+
+
+def test_best_prices():
+    book = LocalOrderBook()
+    book.apply(
+        [
+            order("1", "buy", "100"),
+            order("2", "buy", "99.5"),
+            order("3", "sell", "101"),
+            order("4", "sell", "100.5"),
+            order("5", "sell", "10", currency="ethereum"),
+        ]
+    )
+
+    assert book.best_bid("bitcoin")["id"] == "1"
+    assert book.best_ask("bitcoin")["id"] == "4"
+    assert book.best_bid("ethereum") is None
+    assert [o["id"] for o in book.orders("bitcoin", "sell")] == ["4", "3"]
+
+    book.apply([order("2", "buy", "99.5"), order("3", "sell", "98")])
+    assert book.best_bid("bitcoin")["id"] == "2"
+    assert book.best_ask("bitcoin")["id"] == "3"
+
+
+def test_apply_responses():
+    book = LocalOrderBook()
+
+    assert len(book.apply(get_market_book).added) == 1
+    delta = book.apply(Orders.from_dict(get_market_book))
+
+    assert isinstance(delta.changed[0], Order)
+    assert book.best_bid("bitcoin").price_per_coin == 1650000000
+
+
+def test_unsubscribe():
+    book = LocalOrderBook()
+    deltas = []
+    unsubscribe = book.subscribe(deltas.append)
+    unsubscribe()
+
+    book.apply([order("1", "buy", "100")])
+    assert deltas == []
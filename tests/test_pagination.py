@@ -0,0 +1,63 @@
+from unittest.mock import patch
+
+import pytest
+
+from buycoins import P2P
+from buycoins.exceptions import P2PError, ServerError
+
+
+def page(field: str, ids: list, cursor: str = None):
+    return {
+        "data": {
+            field: {
+                "orders": {
+                    "pageInfo": {"hasNextPage": cursor is not None, "endCursor": cursor},
+                    "edges": [{"node": {"id": order_id}} for order_id in ids],
+                }
+            }
+        }
+    }
+
+
+@pytest.mark.parametrize("prefetch", [False, True])
+def test_iter_orders_follows_cursors(prefetch):
+    p2p = P2P()
+    pages = [page("getOrders", ["1", "2"], "c1"), page("getOrders", ["3", "4"], "c2"), page("getOrders", ["5"])]
+
+    with patch.object(p2p, "_execute_request", side_effect=pages) as execute:
+        orders = [order["id"] for order in p2p.iter_orders("completed", page_size=2, prefetch=prefetch)]
+
+    assert orders == ["1", "2", "3", "4", "5"]
+    assert [call[1]["variables"] for call in execute.call_args_list] == [
+        {"status": "completed", "first": 2, "after": None},
+        {"status": "completed", "first": 2, "after": "c1"},
+        {"status": "completed", "first": 2, "after": "c2"},
+    ]
+
+
+def test_iter_market_book_is_lazy():
+    p2p = P2P()
+    pages = [page("getMarketBook", ["1", "2"], "c1"), page("getMarketBook", ["3"])]
+
+    with patch.object(p2p, "_execute_request", side_effect=pages) as execute:
+        orders = p2p.iter_market_book(page_size=2)
+        assert next(orders)["id"] == "1"
+        assert execute.call_count == 1
+        assert [order["id"] for order in orders] == ["2", "3"]
+
+    assert execute.call_count == 2
+
+
+def test_iter_orders_errors():
+    p2p = P2P()
+
+    with pytest.raises(P2PError):
+        p2p.iter_orders("pending")
+
+    with patch.object(p2p, "_execute_request", return_value={"errors": [{"message": "Unavailable"}]}):
+        with pytest.raises(P2PError):
+            list(p2p.iter_orders())
+
+    with patch.object(p2p, "_execute_request", side_effect=[page("getMarketBook", ["1"], "c1"), ServerError("Unavailable", 502)]):
+        with pytest.raises(ServerError):
+            list(p2p.iter_market_book(prefetch=True))
@@ -0,0 +1,159 @@
+import json
+import threading
+from decimal import Decimal
+from unittest.mock import patch
+
+from requests.exceptions import ConnectionError
+
+from buycoins import Wallet
+from buycoins.payouts import FAILED, IN_DOUBT, SENT, SKIPPED, Payout, PayoutEngine, read_payouts
+from buycoins.retry import RetryPolicy
+from tests.fake_api import answer_batch
+
+
+class API:
+    """Stands in for `Wallet._execute_request`, estimating fees in batches and recording transfers."""
+
+    def __init__(self, fail=()):
+        self.fail = fail
+        self.estimates = []
+        self.sent = []
+        self.lock = threading.Lock()
+
+    def __call__(self, client, query, variables=None, idempotency_key=None):
+        if query.startswith("query Batch"):
+            response = answer_batch(query, variables, "currency", lambda currency: {"estimatedFee": "0.0001", "total": "0.0101"})
+            self.estimates.append(len(response["data"]))
+            return response
+
+        with self.lock:
+            self.sent.append((variables["address"], idempotency_key))
+        if variables["address"] in self.fail:
+            return self.fail[variables["address"]]
+        return {"data": {"send": {"id": "send-" + variables["address"], "status": "pending"}}}
+
+
+def test_payouts_are_estimated_in_batches_and_sent():
+    api = API()
+    payouts = [("address-{}".format(index), "bitcoin", "0.01") for index in range(5)]
+    payouts += [("address-5", "ethereum", 0.5), ("", "bitcoin", 1), ("address-7", "dogecoin", 1), ("address-8", "bitcoin", "-1")]
+
+    with patch.object(Wallet, "_execute_request", autospec=True, side_effect=api):
+        engine = PayoutEngine(Wallet(), batch_size=4)
+        results = {result.payout.address: result for result in engine.process(payouts)}
+
+    assert api.estimates == [1, 2]
+    assert len(api.sent) == 6
+    assert results["address-5"].status == SENT
+    assert results["address-5"].response == {"id": "send-address-5", "status": "pending"}
+    assert results["address-5"].fee == "0.0001"
+    assert results[""].response["message"] == "Invalid address"
+    assert results["address-8"].response["message"] == "Invalid amount"
+
+    stats = engine.stats()
+    assert (stats[SENT], stats[FAILED]) == (6, 3)
+    assert stats["throughput"] > 0
+    assert stats["max_latency"] >= stats["mean_latency"] > 0
+
+
+def test_journal_prevents_sending_twice(tmp_path):
+    journal = str(tmp_path / "payouts.jsonl")
+    api = API(fail={
+        "rejected": {"errors": [{"message": "Insufficient balance"}]},
+        "lost": ConnectionError(),
+    })
+    payouts = [("paid", "bitcoin", "0.01"), ("paid", "bitcoin", "0.01"), ("rejected", "bitcoin", "0.01"), ("lost", "bitcoin", "0.01")]
+
+    with patch.object(Wallet, "_execute_request", autospec=True, side_effect=api):
+        first = {(result.payout.address, result.payout.id): result.status for result in PayoutEngine(Wallet(), journal).process(payouts)}
+        assert sorted(first.values()) == [FAILED, IN_DOUBT, SENT, SENT]
+
+        api.sent.clear()
+        stats = Wallet().send_payouts(payouts, journal=journal)
+
+    assert [address for address, _ in api.sent] == ["rejected"]
+    assert (stats[SKIPPED], stats[FAILED]) == (3, 1)
+
+    records = [json.loads(line) for line in open(journal)]
+    assert [record["state"] for record in records if record["address"] == "lost"] == ["sending", IN_DOUBT]
+    paid_ids = {payout_id for address, payout_id in first if address == "paid"}
+    assert len(paid_ids) == 2
+
+
+def test_payouts_interrupted_while_sending_are_not_resent(tmp_path):
+    journal = tmp_path / "payouts.jsonl"
+    payout = Payout("address", "bitcoin", "0.01", id="payout-1")
+    journal.write_text('{"id":"payout-1","state":"sending"}\n{"id":"payout-2","sta')
+    api = API()
+
+    with patch.object(Wallet, "_execute_request", autospec=True, side_effect=api):
+        engine = PayoutEngine(Wallet(), str(journal))
+        results = list(engine.process([payout, Payout("address", "bitcoin", "0.01", id="payout-2")]))
+
+    assert [(result.payout.id, result.status) for result in results] == [("payout-1", SKIPPED), ("payout-2", SENT)]
+    assert len(api.sent) == 1
+    assert json.loads(journal.read_text().splitlines()[-1])["state"] == SENT
+
+
+def test_fee_limit_and_concurrency():
+    running, peak = [0], [0]
+    lock = threading.Lock()
+    api = API()
+
+    def slow(client, query, variables=None, idempotency_key=None):
+        if not query.startswith("query Batch"):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            threading.Event().wait(0.01)
+            with lock:
+                running[0] -= 1
+        return api(client, query, variables, idempotency_key)
+
+    payouts = [("address-{}".format(index), "bitcoin", "0.01") for index in range(12)] + [("costly", "litecoin", "1")]
+    with patch.object(Wallet, "_execute_request", autospec=True, side_effect=slow):
+        engine = PayoutEngine(Wallet(), max_concurrency=3, max_fee={"litecoin": "0.00001"})
+        results = list(engine.process(payouts))
+
+    assert peak[0] <= 3
+    assert [result.status for result in results if result.payout.address == "costly"] == [FAILED]
+    assert engine.stats()[SENT] == 12
+
+
+def test_transfers_are_not_retried_without_idempotency_keys(tmp_path):
+    journal = str(tmp_path / "payouts.jsonl")
+    api = API(fail={"lost": ConnectionError()})
+    wallet = Wallet(retry=RetryPolicy(max_attempts=3, backoff=0))
+
+    with patch.object(Wallet, "_send", autospec=True, side_effect=lambda client, body, headers=None: api(client, body["query"], body.get("variables"), (headers or {}).get("Idempotency-Key"))):
+        results = list(PayoutEngine(wallet, journal, estimate_fees=False).process([("lost", "bitcoin", "0.01")]))
+        assert api.sent == [("lost", None)]
+        assert results[0].status == IN_DOUBT
+
+        api.sent.clear()
+        list(PayoutEngine(wallet, idempotency_keys=True, estimate_fees=False).process([Payout("lost", "bitcoin", "0.01", id="payout-1")]))
+        assert api.sent == [("lost", "payout-1")] * 3
+
+
+def test_decimal_amounts_are_sent():
+    api = API()
+
+    def send(client, body, headers=None):
+        # Goes through the codec, as the request body would.
+        body = client._codec.loads(client._codec.dumps(body))
+        return api(client, body["query"], body.get("variables"), (headers or {}).get("Idempotency-Key"))
+
+    with patch.object(Wallet, "_send", autospec=True, side_effect=send):
+        stats = PayoutEngine(Wallet()).run([("address", "bitcoin", Decimal("0.01"))])
+
+    assert stats[SENT] == 1
+    assert api.estimates == [1]
+
+
+def test_read_payouts(tmp_path):
+    path = tmp_path / "payouts.csv"
+    path.write_text("address,currency,amount\n 1Fz ,bitcoin,0.01\n0xab,ethereum,0.5\n")
+
+    assert [(payout.address, payout.currency, payout.amount) for payout in read_payouts(str(path))] == [
+        ("1Fz", "bitcoin", "0.01"), ("0xab", "ethereum", "0.5"),
+    ]
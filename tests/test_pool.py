@@ -0,0 +1,119 @@
+import asyncio
+import threading
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+
+from buycoins.aio import AsyncWallet
+from buycoins.pool import ClientPool
+from buycoins.wallet import Wallet
+
+ACCOUNTS = {"ops": "ops-public:ops-secret", "treasury": "treasury-public:treasury-secret"}
+
+
+def balances(client, body, headers=None):
+    return {"data": {"getBalances": [{"id": client._credentials()}]}}
+
+
+def test_map_returns_results_keyed_by_account():
+    with ClientPool(ACCOUNTS) as pool, patch.object(Wallet, "_send", autospec=True, side_effect=balances):
+        results = pool.map(lambda account: account.wallet.get_balances())
+
+        assert results == {"ops": [{"id": "ops-public:ops-secret"}], "treasury": [{"id": "treasury-public:treasury-secret"}]}
+        assert pool["ops"].wallet._initiate_client() is not pool["treasury"].wallet._initiate_client()
+        assert pool["ops"].wallet is pool["ops"].wallet
+
+
+def test_accounts_can_be_named_by_public_key():
+    pool = ClientPool(ACCOUNTS.values())
+
+    assert "ops-public" in pool
+    assert [account.name for account in pool] == ["ops-public", "treasury-public"]
+
+
+def test_each_account_has_its_own_budget():
+    pool = ClientPool(ACCOUNTS, rate=50, capacity=5)
+
+    assert pool["ops"].scheduler is not pool["treasury"].scheduler
+    assert pool["ops"].scheduler.bucket.capacity == 5
+    assert ClientPool(ACCOUNTS)["ops"].scheduler is None
+
+
+def test_concurrency_is_capped_per_account():
+    pool = ClientPool(ACCOUNTS, max_concurrency=2)
+    running, peak = {"ops": 0, "treasury": 0}, {"ops": 0, "treasury": 0}
+    lock = threading.Lock()
+
+    def call(account):
+        with lock:
+            running[account.name] += 1
+            peak[account.name] = max(peak[account.name], running[account.name])
+        time.sleep(0.01)
+        with lock:
+            running[account.name] -= 1
+
+    threads = [threading.Thread(target=pool.map, args=(call,)) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert peak == {"ops": 2, "treasury": 2}
+
+
+def test_requests_are_capped_per_account():
+    pool = ClientPool(ACCOUNTS, max_concurrency=2)
+    running, peak = [0], [0]
+    lock = threading.Lock()
+
+    def post(*args, **kwargs):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.01)
+        with lock:
+            running[0] -= 1
+        return Mock(content=b'{"data": {"getBalances": [], "getPrices": []}}')
+
+    account = pool["ops"]
+    with patch.object(account.wallet._initiate_client(), "post", side_effect=post):
+        threads = [threading.Thread(target=call) for call in [account.wallet.get_balances, account.p2p.get_prices] * 4]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    pool.close()
+
+    assert peak[0] == 2
+
+
+def test_map_exceptions():
+    pool = ClientPool(ACCOUNTS)
+
+    def call(account):
+        if account.name == "ops":
+            raise ValueError(account.name)
+        return account.name
+
+    results = pool.map(call, return_exceptions=True)
+    assert isinstance(results["ops"], ValueError)
+    assert results["treasury"] == "treasury"
+    assert pool.map(call, accounts=["treasury"]) == {"treasury": "treasury"}
+    with pytest.raises(ValueError):
+        pool.map(call)
+
+
+def test_amap_uses_async_clients_and_budgets():
+    async def send(client, body, headers=None):
+        return balances(client, body, headers)
+
+    async def main():
+        async with ClientPool(ACCOUNTS, rate=1000) as pool:
+            with patch.object(AsyncWallet, "_send", autospec=True, side_effect=send):
+                results = await pool.amap(lambda account: account.async_wallet.get_balances())
+            return results, pool["ops"].scheduler.stats()
+
+    results, stats = asyncio.run(main())
+    assert results["treasury"] == [{"id": "treasury-public:treasury-secret"}]
+    assert stats["polling"]["requests"] == 1
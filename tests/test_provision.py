@@ -0,0 +1,115 @@
+import json
+import threading
+from unittest.mock import patch
+
+from requests.exceptions import ConnectionError
+
+from buycoins import NGNT
+from buycoins.provision import IN_DOUBT, Provisioner, read_names
+from tests.fake_api import Rejected, answer_batch
+
+
+def create(name):
+    if name == "bad":
+        raise Rejected("Account name is taken")
+    return {"accountName": name, "accountNumber": "0123456789"}
+
+
+def respond(client, query, variables=None, idempotency_key=None):
+    """Creates every account of a batched document, except those named "bad"."""
+    return answer_batch(query, variables, "accountName", create)
+
+
+def test_accounts_are_created_in_batches(tmp_path):
+    checkpoint = tmp_path / "checkpoint.jsonl"
+    names = ["name-{}".format(index) for index in range(25)] + ["bad", "name-0"]
+    reports = []
+
+    with patch.object(NGNT, "_execute_request", autospec=True, side_effect=respond) as execute:
+        provisioner = Provisioner(NGNT(), str(checkpoint), batch_size=10, max_workers=2, report_interval=0, progress=reports.append)
+        results = dict(provisioner.provision(iter(names)))
+
+    assert execute.call_count == 3
+    assert all(call[1]["query"].startswith("mutation Batch(") for call in execute.call_args_list)
+    assert results["name-3"] == {"accountName": "name-3", "accountNumber": "0123456789"}
+    assert results["bad"]["message"] == "Account name is taken"
+
+    stats = provisioner.stats()
+    assert (stats["created"], stats["failed"], stats["skipped"]) == (25, 1, 1)
+    assert stats["throughput"] > 0
+    assert reports[-1]["created"] == 25
+
+    records = [json.loads(line) for line in checkpoint.read_text().splitlines()]
+    assert [record["state"] for record in records[:10]] == ["pending"] * 10
+    results = [record for record in records if record["state"] != "pending"]
+    assert len(results) == 26
+    assert {record["name"] for record in results if not record["created"]} == {"bad"}
+
+
+def test_resuming_skips_created_names(tmp_path):
+    checkpoint = tmp_path / "checkpoint.jsonl"
+    checkpoint.write_text(
+        '{"name":"done","created":true,"response":{}}\n'
+        '{"name":"retry","created":false,"response":{"status":"error"}}\n'
+        '{"name":"cut sh'
+    )
+
+    with patch.object(NGNT, "_execute_request", autospec=True, side_effect=respond) as execute:
+        stats = NGNT().create_deposit_accounts(["done", "retry", "new"], checkpoint=str(checkpoint))
+
+    assert execute.call_count == 1
+    assert execute.call_args[1]["variables"] == {"b0_accountName": "retry", "b1_accountName": "new"}
+    assert (stats["created"], stats["skipped"]) == (2, 1)
+    assert Provisioner(NGNT(), str(checkpoint)).completed("retry")
+
+
+def test_names_that_may_have_been_created_are_not_sent_again(tmp_path):
+    checkpoint = tmp_path / "checkpoint.jsonl"
+    checkpoint.write_text('{"name":"interrupted","state":"pending"}\n')
+
+    def unavailable(client, query, variables=None, idempotency_key=None):
+        if "lost" in variables.values():
+            return ConnectionError()
+        return respond(client, query, variables)
+
+    with patch.object(NGNT, "_execute_request", autospec=True, side_effect=unavailable) as execute:
+        provisioner = Provisioner(NGNT(), str(checkpoint), batch_size=1)
+        stats = provisioner.run(["interrupted", "lost", "new"])
+        assert execute.call_count == 2
+        assert (stats["created"], stats["in_doubt"], stats["skipped"]) == (1, 1, 1)
+        assert provisioner.state("lost") == IN_DOUBT
+
+        execute.reset_mock()
+        stats = Provisioner(NGNT(), str(checkpoint)).run(["interrupted", "lost", "new"])
+        assert execute.call_count == 0
+        assert stats["skipped"] == 3
+
+
+def test_requests_in_flight_are_bounded():
+    running, peak = [0], [0]
+    lock = threading.Lock()
+
+    def slow(client, query, variables=None, idempotency_key=None):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        threading.Event().wait(0.01)
+        with lock:
+            running[0] -= 1
+        return respond(client, query, variables)
+
+    with patch.object(NGNT, "_execute_request", autospec=True, side_effect=slow):
+        stats = Provisioner(NGNT(), batch_size=2, max_workers=3).run("name-{}".format(index) for index in range(40))
+
+    assert stats["created"] == 40
+    assert peak[0] <= 3
+
+
+def test_read_names(tmp_path):
+    plain = tmp_path / "plain.csv"
+    plain.write_text("Ada Obi,extra\n\n Bola Ade \n")
+    with_header = tmp_path / "header.csv"
+    with_header.write_text("id,name\n1,Ada Obi\n2,\n3,Bola Ade\n")
+
+    assert list(read_names(str(plain))) == ["Ada Obi", "Bola Ade"]
+    assert list(read_names(str(with_header), column="name")) == ["Ada Obi", "Bola Ade"]
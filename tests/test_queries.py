@@ -0,0 +1,131 @@
+import asyncio
+import hashlib
+import time
+from unittest.mock import patch
+
+from aiohttp import web
+
+from buycoins import AsyncP2P, P2P, PriceCache, Wallet, queries
+from tests.test_aio import serve
+
+NOT_FOUND = {"errors": [{"message": "PersistedQueryNotFound", "extensions": {"code": "PERSISTED_QUERY_NOT_FOUND"}}]}
+NOT_SUPPORTED = {"errors": [{"message": "PersistedQueryNotSupported"}]}
+
+
+def test_minify():
+    document = """
+        query GetOrders($status: GetOrdersStatus!, $first: Int) {
+            getOrders(status: $status) {
+                orders(first: $first) { edges { node { id side } } }
+            }
+        }
+    """
+
+    assert queries.minify(document) == (
+        "query GetOrders($status:GetOrdersStatus!,$first:Int){getOrders(status:$status){orders(first:$first){edges{node{id side}}}}}"
+    )
+
+
+def test_documents_are_registered_once():
+    assert queries.GET_BALANCE.document == "query($currency:Cryptocurrency){getBalances(cryptocurrency:$currency){id cryptocurrency confirmedBalance}}"
+    document = queries.GET_BALANCE.document
+    assert queries.sha256(document) == hashlib.sha256(document.encode()).hexdigest()
+    assert queries.sha256(queries.SEND) is queries.sha256(queries.SEND)
+
+    wallet = Wallet()
+    with patch.object(wallet, "_execute_request", return_value={"data": {"getBalances": []}}) as execute:
+        wallet.get_balances("bitcoin")
+        wallet.get_balances("bitcoin")
+
+    assert execute.call_args_list[0][1]["query"] is document
+    assert execute.call_args_list[1][1]["query"] is document
+    assert not hasattr(wallet, "_query")
+
+
+def test_persisted_queries_send_the_hash_first():
+    p2p = P2P(persisted_queries=True)
+    extensions = {"persistedQuery": {"version": 1, "sha256Hash": queries.sha256(queries.GET_PRICES.document)}}
+
+    with patch.object(p2p, "_send", side_effect=[NOT_FOUND, {"data": {"getPrices": []}}, {"data": {"getPrices": []}}]) as send:
+        assert p2p.get_prices() == []
+        assert p2p.get_prices() == []
+
+    bodies = [call[0][0] for call in send.call_args_list]
+    assert bodies == [
+        {"extensions": extensions},
+        {"query": queries.GET_PRICES.document, "extensions": extensions},
+        {"extensions": extensions},
+    ]
+
+
+def test_persisted_queries_are_disabled_if_unsupported():
+    p2p = P2P(persisted_queries=True)
+
+    with patch.object(p2p, "_send", side_effect=[NOT_SUPPORTED, {"data": {"getPrices": []}}, {"data": {"getPrices": []}}]) as send:
+        p2p.get_prices()
+        p2p.get_prices()
+
+    assert [("query" in call[0][0]) for call in send.call_args_list] == [False, True, True]
+    assert "extensions" not in send.call_args_list[2][0][0]
+
+
+def test_async_persisted_queries():
+    bodies = []
+
+    async def handler(request):
+        body = await request.json()
+        bodies.append(body)
+        if "query" not in body:
+            return web.json_response(NOT_FOUND)
+        return web.json_response({"data": {"getPrices": []}})
+
+    async def main():
+        runner, endpoint = await serve(handler)
+        with patch("buycoins.client.ENDPOINT", endpoint):
+            async with AsyncP2P(persisted_queries=True) as p2p:
+                prices = await p2p.get_current_price("buy", "bitcoin")
+        await runner.cleanup()
+        return prices
+
+    assert asyncio.run(main()) == []
+    assert ["query" in body for body in bodies] == [False, True]
+    assert bodies[0]["variables"] == {"side": "buy", "currency": "bitcoin"}
+
+
+def test_fields_narrow_the_selection():
+    p2p = P2P()
+
+    with patch.object(p2p, "_execute_request", return_value={"data": {"getOrders": {"orders": {"edges": []}}}}) as execute:
+        p2p.get_orders("open", fields=["pricePerCoin", "id"])
+        p2p.get_orders("completed", fields=("id", "pricePerCoin"))
+        p2p.get_orders("open")
+
+    documents = [call[1]["query"] for call in execute.call_args_list]
+    assert "node{id pricePerCoin}" in documents[0]
+    assert documents[0] is documents[1]
+    assert documents[2] is queries.GET_ORDERS.document
+    assert queries.sha256(documents[0]) == hashlib.sha256(documents[0].encode()).hexdigest()
+
+
+def test_fields_are_validated():
+    p2p, wallet = P2P(), Wallet()
+
+    with patch.object(P2P, "_execute_request") as execute:
+        assert p2p.get_current_price("buy", "bitcoin", fields=["id", "price"])["message"] == "Invalid fields passed: price"
+        assert p2p.get_market_book(fields=[])["code"] == 400
+        assert wallet.get_balances(fields="confirmedBalance")["message"] == "Invalid fields passed"
+    execute.assert_not_called()
+
+
+def test_cached_prices_keep_their_expiry():
+    cache = PriceCache(background=False)
+    p2p = P2P(price_cache=cache)
+    price = {"data": {"getPrices": [{"id": "price", "buyPricePerCoin": "1", "expiresAt": time.time() + 30}]}}
+
+    with patch.object(p2p, "_execute_request", return_value=price) as execute:
+        p2p.get_current_price("buy", "bitcoin", fields=["buyPricePerCoin"])
+        p2p.get_current_price("buy", "bitcoin", fields=["buyPricePerCoin"])
+        p2p.get_current_price("buy", "bitcoin")
+
+    assert execute.call_count == 2
+    assert "getPrices(side:$side,cryptocurrency:$currency){buyPricePerCoin expiresAt}" in execute.call_args_list[0][1]["query"]
@@ -0,0 +1,93 @@
+import time
+from unittest.mock import patch
+
+from buycoins import P2P, Quote, Wallet
+from buycoins.client import BuyCoinsClient
+from buycoins.ratelimit import RequestScheduler, TokenBucket
+from tests.mock_responses import buy, coin_price
+
+
+def price_response(expires_in: float, price_id: str = "price"):
+    price = dict(coin_price["getPrices"], id=price_id, expiresAt=time.time() + expires_in)
+    return {"data": {"getPrices": [price]}}
+
+
+def test_quote():
+    p2p = P2P()
+
+    with patch.object(p2p, "_execute_request", return_value=price_response(30)):
+        quote = p2p.quote("sell", "bitcoin")
+
+    assert isinstance(quote, Quote)
+    assert quote.id == "price"
+    assert quote.price_per_coin == "16824359.1781"
+    assert not quote.expired()
+
+
+def test_quote_error():
+    p2p = P2P()
+
+    with patch.object(p2p, "_execute_request", return_value={"errors": [{"message": "Unavailable"}]}):
+        quote = p2p.quote("buy", "bitcoin")
+
+    assert quote == {"status": "error", "name": "P2PError", "code": 404, "message": "Unavailable"}
+
+
+def test_trades_reuse_quote_until_expiry():
+    wallet = Wallet()
+    quote = Quote("buy", "bitcoin", price_response(30)["data"]["getPrices"][0])
+
+    with patch.object(BuyCoinsClient, "_execute_request", return_value={"data": {"buy": buy}}) as execute:
+        for _ in range(3):
+            assert wallet.buy_crypto("bitcoin", 0.01, quote=quote) == buy
+
+    assert execute.call_count == 3
+    assert all(call[1]["variables"]["price"] == "price" for call in execute.call_args_list)
+
+
+def test_trades_refresh_expired_quote():
+    wallet = Wallet()
+    stale = Quote("sell", "bitcoin", price_response(-5, "stale")["data"]["getPrices"][0])
+    responses = [price_response(30, "fresh"), {"data": {"sell": buy}}, {"data": {"sell": buy}}]
+
+    with patch.object(BuyCoinsClient, "_execute_request", side_effect=responses) as execute:
+        wallet.sell_crypto("bitcoin", 0.01, quote=stale)
+        wallet.sell_crypto("bitcoin", 0.01)
+
+    assert execute.call_count == 3
+    assert [call[1]["variables"].get("price") for call in execute.call_args_list] == [None, "fresh", "fresh"]
+
+
+def test_trade_rejects_mismatched_quote():
+    quote = Quote("sell", "bitcoin", price_response(30)["data"]["getPrices"][0])
+
+    response = Wallet().buy_crypto("bitcoin", 0.01, quote=quote)
+    assert response["name"] == "WalletError"
+    assert response["code"] == 400
+
+
+def test_trade_quotes_use_the_wallet_transport():
+    scheduler = RequestScheduler(TokenBucket(rate=1000))
+    wallet = Wallet(scheduler=scheduler, typed=True)
+    responses = [price_response(30, "fresh"), {"data": {"buy": buy}}]
+
+    with patch.object(wallet, "_send", side_effect=responses) as send:
+        trade = wallet.buy_crypto("bitcoin", 0.01)
+
+    assert send.call_count == 2
+    assert send.call_args[0][0]["variables"]["price"] == "fresh"
+    assert trade.id == buy["id"]
+    assert scheduler.stats()["polling"]["requests"] == 1
+    assert scheduler.stats()["trading"]["requests"] == 1
+
+
+def test_batched_trades_fetch_their_quote_first():
+    wallet = Wallet()
+    responses = [price_response(30, "fresh"), {"data": {"b0": buy}}]
+
+    with patch.object(wallet, "_execute_request", side_effect=responses) as execute:
+        with wallet.batch() as batch:
+            trade = batch.wallet.buy_crypto("bitcoin", 0.01)
+
+    assert trade.result() == buy
+    assert execute.call_args_list[1][1]["variables"]["b0_price"] == "fresh"
@@ -0,0 +1,170 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+
+from buycoins import Wallet
+from buycoins.ratelimit import (
+    ANALYTICS, POLLING, TRADING, FileTokenBucket, RedisTokenBucket, RequestScheduler, TokenBucket, classify,
+)
+
+
+class ManualBucket:
+    """Bucket handing out tokens only when the test releases them."""
+
+    def __init__(self):
+        self.tokens = 0
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        with self.lock:
+            if self.tokens:
+                self.tokens -= 1
+                return 0.0
+            return 0.005
+
+
+def wait_for(condition):
+    deadline = time.monotonic() + 2
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+
+def test_classify():
+    assert classify("mutation SendCrypto { send { id } }") == TRADING
+    assert classify("mutation Batch($b0_price: ID!) { b0: buy(price: $b0_price) { id } }") == TRADING
+    assert classify("mutation CreateWalletAddress { createAddress(cryptocurrency: bitcoin) { address } }") == ANALYTICS
+    assert classify("mutation Batch($b0_accountName: String!) { b0: createDepositAccount(accountName: $b0_accountName) { accountNumber } }") == ANALYTICS
+    assert classify("query { getBalances { id } }") == POLLING
+    assert classify("query { getMarketBook { dynamicPriceExpiry } }") == ANALYTICS
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=10, capacity=2)
+
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert 0 < bucket.reserve() <= 0.1
+
+
+def test_scheduler_serves_by_priority():
+    bucket = ManualBucket()
+    scheduler = RequestScheduler(bucket)
+    served = []
+
+    def request(priority):
+        scheduler.acquire(priority)
+        served.append(priority)
+
+    threads = []
+    for priority in (ANALYTICS, POLLING, TRADING):
+        threads.append(threading.Thread(target=request, args=(priority,)))
+        threads[-1].start()
+        wait_for(lambda: scheduler.queue_depth == len(threads))
+
+    for count in range(1, 4):
+        bucket.tokens = 1
+        wait_for(lambda: len(served) == count)
+    for thread in threads:
+        thread.join()
+
+    assert served == [TRADING, POLLING, ANALYTICS]
+    stats = scheduler.stats()
+    assert stats["queue_depth"] == 0
+    assert stats["trading"]["requests"] == 1
+    assert stats["analytics"]["max_wait_time"] >= stats["trading"]["max_wait_time"]
+
+
+def test_client_requests_wait_on_scheduler():
+    scheduler = RequestScheduler(TokenBucket(rate=1000))
+    wallet = Wallet(scheduler=scheduler)
+
+    with patch.object(wallet, "_send", return_value={"data": {"getBalances": [], "createAddress": {}}}):
+        wallet.get_balances()
+        wallet.create_address("bitcoin")
+
+    stats = scheduler.stats()
+    assert stats["polling"]["requests"] == 1
+    assert stats["analytics"]["requests"] == 1
+
+
+def drain(path, granted):
+    bucket = FileTokenBucket(path, rate=0.001, capacity=10)
+    granted.put(sum(bucket.reserve() == 0 for _ in range(10)))
+
+
+def test_file_token_bucket_is_shared_by_processes(tmp_path):
+    path = str(tmp_path / "bucket")
+    context = multiprocessing.get_context("fork")
+    granted = context.Queue()
+    processes = [context.Process(target=drain, args=(path, granted)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    assert sum(granted.get() for _ in processes) == 10
+    assert FileTokenBucket(path, rate=0.001, capacity=10).reserve() > 0
+
+
+def test_file_token_bucket_reopens_after_fork(tmp_path):
+    bucket = FileTokenBucket(str(tmp_path / "bucket"), rate=0.001, capacity=2)
+    assert bucket.reserve() == 0
+
+    context = multiprocessing.get_context("fork")
+    granted = context.Queue()
+    process = context.Process(target=lambda: granted.put((bucket.reserve(), bucket._pid == os.getpid())))
+    process.start()
+    process.join()
+
+    assert granted.get() == (0, True)
+    assert bucket.reserve() > 0
+    bucket.close()
+
+
+def test_redis_token_bucket():
+    client = Mock()
+    client.eval.side_effect = [b"0", b"0.25"]
+    bucket = RedisTokenBucket(client, "buycoins:budget", rate=4)
+
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0.25
+    client.eval.assert_called_with(RedisTokenBucket.SCRIPT, 1, "buycoins:budget", 4, 4)
+
+
+def test_scheduler_with_shared_bucket(tmp_path):
+    scheduler = RequestScheduler(FileTokenBucket(str(tmp_path / "bucket"), rate=1000))
+
+    assert scheduler.acquire(TRADING) < 1
+    assert scheduler.stats()["trading"]["requests"] == 1
+
+
+def test_acquire_async_shares_the_queue():
+    scheduler = RequestScheduler(TokenBucket(rate=1000, capacity=1))
+
+    async def main():
+        return await asyncio.gather(*(scheduler.acquire_async(TRADING) for _ in range(3)))
+
+    waited = asyncio.run(main())
+    assert len(waited) == 3
+    assert max(waited) > 0
+    assert scheduler.stats()["trading"]["requests"] == 3
+    assert not scheduler._waiting
+
+
+def test_failed_acquire_leaves_the_queue():
+    bucket = Mock(reserve=Mock(side_effect=[ConnectionError("Bucket unreachable"), 0.0]))
+    scheduler = RequestScheduler(bucket)
+
+    with pytest.raises(ConnectionError):
+        scheduler.acquire(TRADING)
+    thread = threading.Thread(target=scheduler.acquire, args=(POLLING,), daemon=True)
+    thread.start()
+    thread.join(2)
+
+    assert not thread.is_alive()
+    assert scheduler.queue_depth == 0
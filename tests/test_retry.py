@@ -0,0 +1,147 @@
+from unittest.mock import Mock, patch
+
+import pytest
+from requests.exceptions import ChunkedEncodingError, HTTPError, ConnectionError, ReadTimeout
+
+from buycoins import P2P, Wallet
+from buycoins.retry import CircuitBreaker, RetryPolicy
+
+
+def http_error(status_code: int, headers: dict = None):
+    return HTTPError(response=Mock(status_code=status_code, headers=headers or {}))
+
+
+def returning(*results):
+    """Returns a side effect returning `results` in turn, exceptions included."""
+    results = iter(results)
+    return lambda *args, **kwargs: next(results)
+
+
+@pytest.fixture(autouse=True)
+def sleep():
+    with patch("buycoins.client.time.sleep") as sleep:
+        yield sleep
+
+
+def test_queries_are_retried(sleep):
+    p2p = P2P(retry=RetryPolicy(max_attempts=3, backoff=1, jitter=False))
+    results = returning(ConnectionError(), http_error(502), {"data": {"getPrices": []}})
+
+    with patch.object(p2p, "_send", side_effect=results) as send:
+        assert p2p.get_prices() == []
+
+    assert send.call_count == 3
+    assert [call[0][0] for call in sleep.call_args_list] == [1, 2]
+
+
+def test_retries_give_up(sleep):
+    p2p = P2P(retry=RetryPolicy(max_attempts=2))
+
+    with patch.object(p2p, "_send", return_value=http_error(503)) as send:
+        response = p2p.get_prices()
+
+    assert send.call_count == 2
+    assert response["name"] == "ServerError"
+    assert response["code"] == 503
+
+
+def test_client_errors_are_not_retried():
+    p2p = P2P(retry=RetryPolicy())
+
+    with patch.object(p2p, "_send", return_value=http_error(400)) as send:
+        p2p._execute_request("query { getPrices { id } }")
+
+    assert send.call_count == 1
+
+
+def test_retry_after_is_honored(sleep):
+    p2p = P2P(retry=RetryPolicy(max_backoff=60))
+
+    with patch.object(p2p, "_send", side_effect=returning(http_error(429, {"Retry-After": "7"}), {"data": {"getPrices": []}})):
+        p2p.get_prices()
+
+    sleep.assert_called_once_with(7.0)
+
+
+def test_mutations_need_an_idempotency_key():
+    wallet = Wallet(retry=RetryPolicy())
+    sent = {"data": {"send": {"id": "send"}}}
+
+    with patch.object(wallet, "_send", side_effect=returning(ConnectionError(), sent)) as send:
+        assert wallet.send_crypto("address", "bitcoin", 0.01)["code"] == 503
+    assert send.call_count == 1
+
+    with patch.object(wallet, "_send", side_effect=returning(ConnectionError(), sent)) as send:
+        assert wallet.send_crypto("address", "bitcoin", 0.01, idempotency_key="payout-1") == {"id": "send"}
+    assert send.call_count == 2
+    assert send.call_args[0][1] == {"Idempotency-Key": "payout-1"}
+
+
+def test_circuit_breaker():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    p2p = P2P(circuit_breaker=breaker)
+
+    with patch.object(p2p, "_send", return_value=http_error(502)) as send:
+        p2p.get_prices()
+        p2p.get_prices()
+        response = p2p.get_prices()
+
+    assert send.call_count == 2
+    assert breaker.state == CircuitBreaker.OPEN
+    assert response["code"] == 503
+
+    with patch("buycoins.retry.time.monotonic", return_value=breaker._opened_at + 31):
+        with patch.object(p2p, "_send", return_value={"data": {"getPrices": []}}):
+            assert p2p.get_prices() == []
+
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_breaker_recovers_from_unexpected_errors():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    p2p = P2P(circuit_breaker=breaker)
+
+    with patch.object(p2p, "_send", return_value=http_error(502)):
+        p2p.get_prices()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    with patch.object(p2p, "_send", side_effect=ChunkedEncodingError()):
+        with pytest.raises(ChunkedEncodingError):
+            p2p.get_prices()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    with patch.object(p2p, "_send", return_value={"data": {"getPrices": []}}):
+        assert p2p.get_prices() == []
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_failed_scheduling_does_not_take_the_breaker_trial():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    scheduler = Mock(acquire=Mock(side_effect=[None, RuntimeError("Bucket unreachable"), RuntimeError("Bucket unreachable"), None]))
+    p2p = P2P(circuit_breaker=breaker, scheduler=scheduler)
+
+    with patch.object(p2p, "_send", return_value=http_error(502)):
+        p2p.get_prices()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    with pytest.raises(RuntimeError):
+        p2p.get_prices()
+    with pytest.raises(RuntimeError):
+        list(p2p.stream_orders())
+
+    with patch.object(p2p, "_send", return_value={"data": {"getPrices": []}}):
+        assert p2p.get_prices() == []
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_timeouts_are_retried_and_trip_the_breaker(sleep):
+    breaker = CircuitBreaker(failure_threshold=2)
+    p2p = P2P(retry=RetryPolicy(max_attempts=2), circuit_breaker=breaker, timeout=5)
+
+    with patch.object(p2p._initiate_client(), "post", side_effect=ReadTimeout()) as post:
+        response = p2p.get_prices()
+
+    assert post.call_count == 2
+    assert post.call_args[1]["timeout"] == 5
+    assert response["code"] == 504
+    assert breaker.state == CircuitBreaker.OPEN
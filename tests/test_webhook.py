@@ -0,0 +1,39 @@
+import hashlib
+import hmac
+
+from buycoins import Webhook
+
+TOKEN = "webhook-token"
+
+
+def sign(body: bytes, token: str = TOKEN):
+    return hmac.new(token.encode("utf-8"), body, hashlib.sha1).hexdigest()
+
+
+def test_verify_request():
+    body = b'{"hook_id": 1, "payload": {"event": "coins.incoming"}}'
+
+    assert Webhook(body, TOKEN, sign(body)).verify_request()
+    assert Webhook(body, TOKEN, sign(body).upper()).verify_request()
+    assert not Webhook(body, TOKEN, sign(body, "other-token")).verify_request()
+    assert not Webhook(body + b" ", TOKEN, sign(body)).verify_request()
+    assert not Webhook(body, TOKEN).verify_request()
+
+
+def test_verify_request_accepts_buffers():
+    body = b'{"hook_id": 2}'
+
+    assert Webhook(memoryview(body), TOKEN, sign(body)).verify_request()
+    assert Webhook(bytearray(body), TOKEN, sign(body).encode()).verify_request()
+    assert not Webhook(body, TOKEN, "sígnature").verify_request()
+    assert not Webhook(body, TOKEN, None).verify_request()
+
+
+def test_verify_many():
+    bodies = [b'{"hook_id": %d}' % i for i in range(200)]
+    signatures = [sign(body) for body in bodies]
+    signatures[3] = signatures[4]
+    expected = [i != 3 for i in range(200)]
+
+    assert Webhook.verify_many(TOKEN, bodies, signatures) == expected
+    assert Webhook.verify_many(TOKEN, iter(bodies), iter(signatures), max_workers=4, chunk_size=16) == expected
@@ -0,0 +1,110 @@
+import asyncio
+from unittest.mock import patch
+
+import aiohttp
+
+from buycoins.webhook import Deduplicator, serve
+from tests.test_webhook import TOKEN, sign
+from tests.test_webhook_server import event, post
+
+
+def test_duplicates_are_detected_within_the_window():
+    dedup = Deduplicator(window=60)
+
+    with patch("buycoins.webhook.dedup.time.time", return_value=1000):
+        assert not dedup.seen("a")
+        assert dedup.seen("a")
+        assert not dedup.seen("b")
+    with patch("buycoins.webhook.dedup.time.time", return_value=1061):
+        assert not dedup.seen("a")
+        assert len(dedup) == 1
+
+    assert dedup.duplicates == 1
+
+
+def test_evicted_keys_fall_back_to_the_bloom_filter():
+    exact = Deduplicator(max_size=10)
+    bloom = Deduplicator(max_size=10, bloom_capacity=1000)
+
+    for i in range(100):
+        exact.seen(str(i))
+        bloom.seen(str(i))
+
+    assert len(bloom) == 10
+    assert not exact.seen("0")
+    assert all(bloom.seen(str(i)) for i in range(100))
+    assert sum(bloom.seen("new-{}".format(i)) for i in range(1000)) < 20
+
+
+def test_snapshot_survives_restarts(tmp_path):
+    path = str(tmp_path / "seen.json")
+    dedup = Deduplicator(max_size=2, bloom_capacity=100, path=path)
+    for key in ("a", "b", "c"):
+        dedup.seen(key)
+    dedup.save()
+
+    restored = Deduplicator(max_size=2, bloom_capacity=100, path=path)
+    assert len(restored) == 2
+    assert restored.seen("a") and restored.seen("b") and restored.seen("c")
+    assert not restored.seen("d")
+
+    with patch("buycoins.webhook.dedup.time.time", return_value=dedup._rotated_at + 3 * dedup.window):
+        assert len(Deduplicator(path=path)) == 0
+
+
+def test_server_drops_redelivered_events(tmp_path):
+    handled = []
+
+    async def handler(event):
+        handled.append(event["hook_id"])
+
+    async def main():
+        dedup = Deduplicator(path=str(tmp_path / "seen.json"))
+        server = await serve(TOKEN, handler, port=0, dedup=dedup)
+        async with aiohttp.ClientSession() as session:
+            statuses = [await post(session, server.url, event(i)) for i in (0, 1, 0, 0)]
+        await server.stop()
+        return statuses, server.stats()
+
+    statuses, stats = asyncio.run(main())
+    assert statuses == [(200, None)] * 4
+    assert handled == [0, 1]
+    assert (stats["accepted"], stats["duplicates"]) == (2, 2)
+    assert Deduplicator(path=str(tmp_path / "seen.json")).seen(sign(event(1)))
+
+
+def test_events_refused_with_503_are_handled_when_redelivered():
+    handled = []
+
+    async def main():
+        release = asyncio.Event()
+
+        async def handler(event):
+            await release.wait()
+            handled.append(event["hook_id"])
+
+        server = await serve(TOKEN, handler, port=0, queue_size=1, workers=1, dedup=Deduplicator())
+        async with aiohttp.ClientSession() as session:
+            responses = [await post(session, server.url, event(0))]
+            while server.queue_depth:
+                await asyncio.sleep(0.001)
+            responses += [await post(session, server.url, event(i)) for i in (1, 2)]
+            release.set()
+            while server.queue_depth:
+                await asyncio.sleep(0.001)
+            responses.append(await post(session, server.url, event(2)))
+            responses.append(await post(session, server.url, event(2)))
+        await server.stop()
+        return [status for status, _ in responses]
+
+    assert asyncio.run(main()) == [200, 200, 503, 200, 200]
+    assert handled == [0, 1, 2]
+
+
+def test_seen_can_check_without_recording():
+    dedup = Deduplicator()
+
+    assert not dedup.seen("a", record=False)
+    assert not dedup.seen("a")
+    assert dedup.seen("a", record=False)
+    assert dedup.duplicates == 1
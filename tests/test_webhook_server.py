@@ -0,0 +1,81 @@
+import asyncio
+import json
+
+import aiohttp
+
+from buycoins.webhook import serve
+from tests.test_webhook import TOKEN, sign
+
+
+def event(hook_id: int):
+    return json.dumps({"hook_id": hook_id, "payload": {"event": "coins.incoming"}}).encode()
+
+
+async def post(session, url, body, signature=None):
+    headers = {"X-Webhook-Signature": signature if signature is not None else sign(body)}
+    async with session.post(url, data=body, headers=headers) as response:
+        return response.status, response.headers.get("Retry-After")
+
+
+def test_events_are_verified_and_handled():
+    handled = []
+
+    async def handler(event):
+        handled.append(event["hook_id"])
+
+    async def main():
+        server = await serve(TOKEN, handler, port=0)
+        async with aiohttp.ClientSession() as session:
+            statuses = await asyncio.gather(*(post(session, server.url, event(i)) for i in range(5)))
+            invalid = await post(session, server.url, event(5), sign(event(5), "other-token"))
+            unparseable = await post(session, server.url, b"not json")
+        await server.stop()
+        return statuses, invalid, unparseable, server.stats()
+
+    statuses, invalid, unparseable, stats = asyncio.run(main())
+    assert statuses == [(200, None)] * 5
+    assert invalid[0] == 401
+    assert unparseable[0] == 400
+    assert sorted(handled) == [0, 1, 2, 3, 4]
+    assert (stats["received"], stats["accepted"], stats["rejected"], stats["handled"]) == (7, 5, 2, 5)
+    assert stats["queue_depth"] == 0
+    assert stats["throughput"] > 0
+    assert stats["max_latency"] >= stats["mean_latency"] > 0
+
+
+def test_full_queue_applies_backpressure():
+    async def main():
+        release = asyncio.Event()
+
+        async def handler(event):
+            await release.wait()
+
+        server = await serve(TOKEN, handler, port=0, queue_size=1, workers=1, retry_after=5)
+        async with aiohttp.ClientSession() as session:
+            first = await post(session, server.url, event(0))
+            while server.queue_depth:
+                await asyncio.sleep(0.001)
+            second = await post(session, server.url, event(1))
+            third = await post(session, server.url, event(2))
+        release.set()
+        await server.stop()
+        return [first, second, third], server.stats()
+
+    responses, stats = asyncio.run(main())
+    assert responses == [(200, None), (200, None), (503, "5")]
+    assert (stats["accepted"], stats["throttled"], stats["handled"]) == (2, 1, 2)
+
+
+def test_handler_failures_are_counted():
+    async def handler(event):
+        raise ValueError("boom")
+
+    async def main():
+        async with await serve(TOKEN, handler, port=0) as server:
+            async with aiohttp.ClientSession() as session:
+                status = await post(session, server.url, event(0))
+        return status, server.stats()
+
+    status, stats = asyncio.run(main())
+    assert status == (200, None)
+    assert (stats["handled"], stats["failed"]) == (0, 1)